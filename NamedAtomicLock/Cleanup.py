@@ -0,0 +1,156 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    Cleanup - Process-wide registry of held NamedAtomicLocks, so they can be released when the process exits or is killed by a signal,
+      instead of staying held until maxLockAge (or forever).
+
+      A LockSet registers itself as one entry while it holds any of its locks. StripedNamedAtomicLock stripes are NamedAtomicLocks,
+        and so are registered individually.
+
+      Registered objects provide "name", "held", "release()", and "_forgetHeld()" ( called in a forked child ).
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+import atexit
+import os
+import signal
+import sys
+import threading
+
+__all__ = ('getHeldLocks', 'releaseAllHeldLocks', 'setExitCleanup', 'enableSignalCleanup')
+
+
+# Locks currently held by this process, id(lock) -> lock
+_heldLocks = {}
+
+# Reentrant, because the signal handler runs in the main thread between bytecodes, possibly while that thread is inside
+#  _registerHeldLock or _unregisterHeldLock, and must not deadlock taking it again.
+_heldLocksLock = threading.RLock()
+
+# The pid which owns the registry. A forked child must not release its parent's locks.
+_registryPid = os.getpid()
+
+_exitCleanupEnabled = True
+
+# signum -> the handler we replaced, for signals we handle
+_previousSignalHandlers = {}
+
+
+def _registerHeldLock(lockObj):
+    with _heldLocksLock:
+        _heldLocks[id(lockObj)] = lockObj
+
+def _unregisterHeldLock(lockObj):
+    with _heldLocksLock:
+        _heldLocks.pop(id(lockObj), None)
+
+
+def getHeldLocks():
+    '''
+        getHeldLocks - Get the locks this process currently holds (or believes it holds)
+
+        @return list<NamedAtomicLock> - The held locks
+    '''
+    with _heldLocksLock:
+        return [ lockObj for lockObj in _heldLocks.values() if lockObj.held ]
+
+
+def releaseAllHeldLocks():
+    '''
+        releaseAllHeldLocks - Release every lock this process holds.
+
+            Called automatically at exit ( see setExitCleanup ) and on signals ( see enableSignalCleanup ).
+
+        @return <int> - The number of locks released
+    '''
+    if os.getpid() != _registryPid:
+        # We are a forked child (on a python without os.register_at_fork), these are our parent's locks.
+        return 0
+
+    numReleased = 0
+    for lockObj in getHeldLocks():
+        try:
+            if lockObj.release():
+                numReleased += 1
+        except Exception as e:
+            sys.stderr.write('Error releasing lock "%s" during cleanup. %s:  %s\n' %(lockObj.name, type(e).__name__, str(e)))
+
+    return numReleased
+
+
+def setExitCleanup(enabled):
+    '''
+        setExitCleanup - Set whether held locks are released at normal interpreter exit (atexit). Default is enabled.
+
+        @param enabled <bool> - True to release held locks at exit, False to leave them held
+    '''
+    global _exitCleanupEnabled
+    _exitCleanupEnabled = bool(enabled)
+
+
+def _atexitCleanup():
+    if _exitCleanupEnabled:
+        releaseAllHeldLocks()
+
+
+def _signalCleanupHandler(signum, frame):
+    '''
+        _signalCleanupHandler - Release held locks, then chain to the handler we replaced
+    '''
+    releaseAllHeldLocks()
+
+    previousHandler = _previousSignalHandlers.get(signum, signal.SIG_DFL)
+    if callable(previousHandler):
+        return previousHandler(signum, frame)
+
+    if previousHandler == signal.SIG_IGN:
+        return
+
+    # SIG_DFL, or a handler not installed from python. Restore the default and re-send, so we die as we would have.
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+
+def enableSignalCleanup(signals=(signal.SIGTERM, signal.SIGINT)):
+    '''
+        enableSignalCleanup - Install handlers which release all held locks when the process gets one of #signals,
+            then chain to whatever handler was installed before (or the default action, like terminating).
+
+            Must be called from the main thread. Calling again for the same signal does nothing.
+
+        @param signals list<int> - The signals to handle. Default SIGTERM and SIGINT
+    '''
+    for signum in signals:
+        if signum in _previousSignalHandlers:
+            continue
+        _previousSignalHandlers[signum] = signal.signal(signum, _signalCleanupHandler)
+
+
+def _afterForkInChild():
+    '''
+        _afterForkInChild - In a forked child, forget every lock. The parent still holds them, the child does not.
+    '''
+    global _registryPid, _heldLocksLock
+
+    # The lock may have been held by another thread in the parent at the time of fork
+    _heldLocksLock = threading.RLock()
+
+    for lockObj in list(_heldLocks.values()):
+        lockObj._forgetHeld()
+
+    _heldLocks.clear()
+    _registryPid = os.getpid()
+
+
+atexit.register(_atexitCleanup)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_afterForkInChild)
+
+
+# vim: set ts=4 sw=4 expandtab :
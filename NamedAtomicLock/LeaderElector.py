@@ -0,0 +1,248 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    LeaderElector - Leader election ("only one active instance") built on NamedAtomicLock, with lease renewal
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+import sys
+import threading
+import traceback
+
+from . import NamedAtomicLock, _monotonic
+
+__all__ = ('LeaderElector', 'DEFAULT_LEASE_TIME')
+
+# Default number of seconds a leader's lease lasts without renewal
+DEFAULT_LEASE_TIME = 10.0
+
+
+class LeaderElector(object):
+    '''
+        LeaderElector - Campaigns in a background thread to be the single leader for a name.
+
+            The leader holds a NamedAtomicLock with maxLockAge=#leaseTime, and renews it (see NamedAtomicLock.refresh) every #renewInterval.
+              If the leader dies or stalls, its lease expires and a standby takes over.
+
+            Standbys try to take the lock every #checkInterval seconds, so failover after a leader dies takes at most
+              leaseTime + checkInterval seconds ( see "failoverTime" ).
+
+            The leader checks that it still holds the lock every #checkInterval seconds, and "isLeader" checks on every access,
+              so lost leadership is noticed promptly.
+
+            Errors in the background thread ( like OSError from a full lockDir ) are written to stderr, and campaigning continues.
+              A leader which cannot renew is demoted once its lease may have run out.
+
+            onElected and onDemoted are called in order, in the thread which noticed the change ( usually the background thread ),
+              without holding any lock. Callbacks should return quickly: while one runs in the background thread, the lease is not renewed,
+              so a callback taking longer than leaseTime - renewInterval loses leadership. Hand long work to another thread.
+    '''
+
+    def __init__(self, name, leaseTime=DEFAULT_LEASE_TIME, lockDir=None, onElected=None, onDemoted=None, renewInterval=None, checkInterval=None, **kwargs):
+        '''
+            __init__ - Create a LeaderElector. Call "start" to begin campaigning.
+
+            @param name <str> - The lock name to elect a leader on
+
+            @param leaseTime <float> - Number of seconds a leader's lease lasts without renewal ( the maxLockAge of the lock )
+
+            @param lockDir <None/str> - Directory in which to store locks ( see NamedAtomicLock )
+
+            @param onElected <None/function> - Called as onElected(elector) when we become the leader. Should return quickly.
+
+            @param onDemoted <None/function> - Called as onDemoted(elector) when we stop being the leader (lost the lease, or stopped).
+                Should return quickly.
+
+            @param renewInterval <None/float> - Number of seconds between lease renewals. Default is leaseTime / 3
+
+            @param checkInterval <None/float> - Number of seconds between campaigning attempts (as standby) and lock checks (as leader).
+                Default is leaseTime / 10
+
+            Any other keyword arguments (like useFilesystemClock) are passed through to NamedAtomicLock
+        '''
+        if not leaseTime or leaseTime <= 0:
+            raise ValueError('leaseTime must be greater than 0')
+
+        if renewInterval is None:
+            renewInterval = leaseTime / 3.0
+        if checkInterval is None:
+            checkInterval = leaseTime / 10.0
+
+        if renewInterval >= leaseTime:
+            raise ValueError('renewInterval must be less than leaseTime, or the lease will expire between renewals.')
+
+        self.lock = NamedAtomicLock(name, lockDir=lockDir, maxLockAge=leaseTime, **kwargs)
+
+        self.name = name
+        self.leaseTime = leaseTime
+        self.renewInterval = renewInterval
+        self.checkInterval = min(checkInterval, renewInterval)
+
+        self.onElected = onElected
+        self.onDemoted = onDemoted
+
+        self._isLeader = False
+        self._lastRenewed = None
+
+        # Guards the lock object and leadership transitions, which happen from both the campaign thread and callers of isLeader
+        self._stateLock = threading.RLock()
+
+        # onElected/onDemoted callbacks queued by transitions, and run in order after _stateLock is released ( see _runPendingCallbacks )
+        self._pendingCallbacks = []
+        self._callbackLock = threading.Lock()
+        self._electedEvent = threading.Event()
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+    @property
+    def failoverTime(self):
+        '''
+            failoverTime - The maximum number of seconds after a leader dies before a standby takes over
+        '''
+        return self.leaseTime + self.checkInterval
+
+    @property
+    def isLeader(self):
+        '''
+            isLeader - True if we are currently the leader, otherwise False.
+        '''
+        with self._stateLock:
+            if self._isLeader and not self.lock.hasLock:
+                self._demote()
+            isLeader = self._isLeader
+
+        self._runPendingCallbacks()
+        return isLeader
+
+    def start(self):
+        '''
+            start - Start campaigning in a background thread
+        '''
+        if self._thread is not None:
+            raise ValueError('LeaderElector "%s" is already started.' %(self.name, ))
+
+        self._stopEvent.clear()
+        self._thread = threading.Thread(target=self._campaign, name='LeaderElector-' + self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        '''
+            stop - Stop campaigning, and step down (releasing the lock) if we are the leader.
+
+            @param timeout <None/float> - Max number of seconds to wait for the background thread to exit
+        '''
+        self._stopEvent.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+        with self._stateLock:
+            if self._isLeader:
+                self.lock.release()
+                self._demote()
+
+        self._runPendingCallbacks()
+
+    def waitUntilElected(self, timeout=None):
+        '''
+            waitUntilElected - Block until we are the leader
+
+            @param timeout <None/float> - Max number of seconds to wait, or None to wait forever
+
+            @return <bool> - True if we are the leader, otherwise False
+        '''
+        self._electedEvent.wait(timeout)
+        return self.isLeader
+
+    def _runCallback(self, callback):
+        if callback is None:
+            return
+        try:
+            callback(self)
+        except Exception:
+            sys.stderr.write('LeaderElector "%s": Exception in callback %s:\n%s\n' %(self.name, getattr(callback, '__name__', repr(callback)), traceback.format_exc()))
+
+    def _runPendingCallbacks(self):
+        '''
+            _runPendingCallbacks - Run callbacks queued by _elect and _demote, in order. Must be called without _stateLock held,
+                so a slow callback does not hold up isLeader or the campaign thread's state changes.
+
+                If another thread is already running callbacks, returns at once. That thread runs ours too, as it only stops
+                  ( under _stateLock ) once the queue is empty.
+        '''
+        if not self._callbackLock.acquire(False):
+            return
+
+        try:
+            while True:
+                with self._stateLock:
+                    if not self._pendingCallbacks:
+                        self._callbackLock.release()
+                        return
+                    callback = self._pendingCallbacks.pop(0)
+
+                self._runCallback(callback)
+        except:
+            self._callbackLock.release()
+            raise
+
+    def _elect(self):
+        self._isLeader = True
+        self._lastRenewed = _monotonic()
+        self._electedEvent.set()
+        if self.onElected is not None:
+            self._pendingCallbacks.append(self.onElected)
+
+    def _demote(self):
+        if not self._isLeader:
+            return
+        self._isLeader = False
+        self._lastRenewed = None
+        self._electedEvent.clear()
+        if self.onDemoted is not None:
+            self._pendingCallbacks.append(self.onDemoted)
+
+    def _campaign(self):
+        '''
+            _campaign - Background thread. Campaign as a standby, and renew the lease as leader.
+        '''
+        while not self._stopEvent.is_set():
+            with self._stateLock:
+                try:
+                    if self._isLeader:
+                        if not self.lock.hasLock:
+                            self._demote()
+                        elif _monotonic() - self._lastRenewed >= self.renewInterval:
+                            if self.lock.refresh():
+                                self._lastRenewed = _monotonic()
+                            else:
+                                self._demote()
+
+                    if not self._isLeader:
+                        if self.lock.acquire(timeout=0):
+                            self._elect()
+                except Exception:
+                    # Like a full lockDir. Keep campaigning, so we recover when the error clears.
+                    sys.stderr.write('LeaderElector "%s": Exception campaigning:\n%s\n' %(self.name, traceback.format_exc()))
+
+                    if self._isLeader and _monotonic() - self._lastRenewed >= self.leaseTime:
+                        # Our lease may have run out, so we can no longer claim to lead. Give up the lock too, so the next
+                        #  acquire does not mistake it for still ours.
+                        try:
+                            self.lock.release()
+                        except Exception:
+                            self.lock._forgetHeld()
+                        self._demote()
+
+            self._runPendingCallbacks()
+
+            self._stopEvent.wait(self.checkInterval)
+
+
+# vim: set ts=4 sw=4 expandtab :
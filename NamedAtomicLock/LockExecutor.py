@@ -0,0 +1,263 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    LockExecutor - An executor wrapper which only dispatches a task once the named locks it needs are acquired,
+      so workers are never stuck waiting in NamedAtomicLock.acquire
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+import threading
+
+try:
+    from concurrent.futures import Future, CancelledError
+except ImportError:
+    # Python 2 requires the "futures" backport
+    Future = CancelledError = None
+
+from . import NamedAtomicLock, DEFAULT_POLL_TIME
+
+__all__ = ('NamedLockExecutor', )
+
+
+class _PendingTask(object):
+    '''
+        _PendingTask - A submitted task which has not yet been dispatched
+    '''
+
+    __slots__ = ('lockNames', 'func', 'args', 'kwargs', 'future')
+
+    def __init__(self, lockNames, func, args, kwargs, future):
+        self.lockNames = lockNames
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+
+
+class NamedLockExecutor(object):
+    '''
+        NamedLockExecutor - Wraps a concurrent.futures executor (like ThreadPoolExecutor or ProcessPoolExecutor) to run tasks which each need
+          one or more NamedAtomicLocks.
+
+            A task is only handed to the wrapped executor after all of its locks have been acquired (non-blocking), and its locks are released
+              when it completes. Tasks whose locks are busy stay queued, while tasks behind them which can run are dispatched.
+
+            Blocked tasks are re-checked whenever one of our own tasks completes, and every #pollInterval seconds (for locks held by other processes).
+
+            Locks are acquired and released in this process, so the functions passed to a ProcessPoolExecutor do not need to know about them.
+    '''
+
+    def __init__(self, executor, lockDir=None, maxLockAge=None, pollInterval=DEFAULT_POLL_TIME, **kwargs):
+        '''
+            __init__ - Create a NamedLockExecutor
+
+            @param executor <concurrent.futures.Executor> - The executor to run tasks on
+
+            @param lockDir <None/str> - Directory in which to store locks ( see NamedAtomicLock )
+
+            @param maxLockAge <None/float> - maxLockAge of the task locks ( see NamedAtomicLock ). Should be longer than any task takes.
+
+            @param pollInterval <float> - Number of seconds between re-checking blocked tasks for locks held by other processes
+
+            Any other keyword arguments (like shardLevels) are passed through to each NamedAtomicLock
+        '''
+        if Future is None:
+            raise ImportError('NamedLockExecutor requires concurrent.futures ( on python2, install the "futures" package ).')
+
+        self.executor = executor
+        self.pollInterval = pollInterval
+
+        self._lockArgs = dict(kwargs, lockDir=lockDir, maxLockAge=maxLockAge)
+
+        # Lock objects by name. A name in _heldNames is owned by a running task, otherwise only the dispatcher touches it.
+        self._locks = {}
+        self._heldNames = set()
+
+        self._pending = []
+        self._condition = threading.Condition()
+        self._isShutdown = False
+
+        self._dispatcher = threading.Thread(target=self._dispatchLoop, name='NamedLockExecutor')
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+
+    def submit(self, lockNames, func, *args, **kwargs):
+        '''
+            submit - Submit a task which needs the locks #lockNames, to run as func(*args, **kwargs)
+
+            @param lockNames list<str> - Names of the locks the task needs. A single str is a single lock name.
+
+            @param func - The function to run
+
+            @return <concurrent.futures.Future> - The result of the task
+
+            @raises RuntimeError - If we have been shut down, or the dispatcher thread has stopped
+        '''
+        if isinstance(lockNames, str):
+            lockNames = [lockNames]
+
+        future = Future()
+
+        with self._condition:
+            if self._isShutdown:
+                raise RuntimeError('Cannot submit after shutdown')
+
+            if not self._dispatcher.is_alive():
+                raise RuntimeError('Cannot submit, the dispatcher thread has stopped')
+
+            # Sorted, so we always acquire in the same order
+            self._pending.append( _PendingTask(sorted(set(lockNames)), func, args, kwargs, future) )
+            self._condition.notify()
+
+        return future
+
+    def shutdown(self, wait=True):
+        '''
+            shutdown - Stop accepting tasks. Pending tasks are still run.
+
+            @param wait <bool> default True - If True, wait for all pending tasks to be dispatched and the wrapped executor to finish.
+        '''
+        with self._condition:
+            self._isShutdown = True
+            self._condition.notify()
+
+        if wait:
+            self._dispatcher.join()
+            self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, excTraceback):
+        self.shutdown(wait=True)
+        return False
+
+    def _getLock(self, lockName):
+        lockObj = self._locks.get(lockName, None)
+        if lockObj is None:
+            lockObj = self._locks[lockName] = NamedAtomicLock(lockName, **self._lockArgs)
+        return lockObj
+
+    def _tryLockAll(self, lockNames):
+        '''
+            _tryLockAll - Try to acquire all of #lockNames without blocking
+
+            @return <None/list<NamedAtomicLock>> - The acquired locks, or None if any were busy (in which case none are held)
+
+            @raises Exception - From acquire ( like OSError for a full lockDir ), in which case none are held
+        '''
+        for lockName in lockNames:
+            # Held by one of our own running tasks, don't bother asking the filesystem
+            if lockName in self._heldNames:
+                return None
+
+        acquiredLocks = []
+        try:
+            for lockName in lockNames:
+                lockObj = self._getLock(lockName)
+                if not lockObj.acquire(timeout=0):
+                    for acquiredLock in acquiredLocks:
+                        acquiredLock.release()
+                    return None
+                acquiredLocks.append(lockObj)
+        except:
+            for acquiredLock in acquiredLocks:
+                acquiredLock.release()
+            raise
+
+        return acquiredLocks
+
+    def _dispatchLoop(self):
+        '''
+            _dispatchLoop - Background thread. Dispatch pending tasks whose locks are free.
+        '''
+        with self._condition:
+            try:
+                while True:
+                    stillPending = []
+                    for task in self._pending:
+                        if task.future.cancelled():
+                            continue
+
+                        try:
+                            acquiredLocks = self._tryLockAll(task.lockNames)
+                        except Exception as e:
+                            # Like a full lockDir. Fail this task, and keep dispatching the others.
+                            if task.future.set_running_or_notify_cancel():
+                                task.future.set_exception(e)
+                            continue
+
+                        if acquiredLocks is None:
+                            stillPending.append(task)
+                            continue
+
+                        self._dispatch(task, acquiredLocks)
+
+                    self._pending = stillPending
+
+                    if not self._pending:
+                        if self._isShutdown:
+                            return
+                        self._condition.wait()
+                    else:
+                        self._condition.wait(self.pollInterval)
+            except BaseException as e:
+                # Should not happen, but don't leave callers waiting forever on tasks which will never be dispatched
+                for task in self._pending:
+                    if not task.future.done() and not task.future.running() and task.future.set_running_or_notify_cancel():
+                        task.future.set_exception(e)
+                self._pending = []
+                raise
+
+    def _dispatch(self, task, acquiredLocks):
+        '''
+            _dispatch - Hand a task whose locks are held to the wrapped executor. Called with _condition held.
+        '''
+        if not task.future.set_running_or_notify_cancel():
+            # Cancelled between our check and now
+            for acquiredLock in acquiredLocks:
+                acquiredLock.release()
+            return
+
+        self._heldNames.update(task.lockNames)
+
+        try:
+            innerFuture = self.executor.submit(task.func, *task.args, **task.kwargs)
+        except Exception as e:
+            self._releaseTaskLocks(task, acquiredLocks)
+            task.future.set_exception(e)
+            return
+
+        innerFuture.add_done_callback(lambda innerFuture : self._onTaskDone(task, acquiredLocks, innerFuture))
+
+    def _releaseTaskLocks(self, task, acquiredLocks):
+        for acquiredLock in acquiredLocks:
+            acquiredLock.release()
+        self._heldNames.difference_update(task.lockNames)
+
+    def _onTaskDone(self, task, acquiredLocks, innerFuture):
+        '''
+            _onTaskDone - Release a completed task's locks, pass along its result, and wake the dispatcher to re-check blocked tasks
+        '''
+        with self._condition:
+            self._releaseTaskLocks(task, acquiredLocks)
+            self._condition.notify()
+
+        if innerFuture.cancelled():
+            # Our future is already running, so cannot be cancelled itself
+            task.future.set_exception(CancelledError())
+            return
+
+        exc = innerFuture.exception()
+        if exc is not None:
+            task.future.set_exception(exc)
+        else:
+            task.future.set_result(innerFuture.result())
+
+
+# vim: set ts=4 sw=4 expandtab :
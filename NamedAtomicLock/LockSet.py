@@ -0,0 +1,379 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    LockSet - A compact container for managing a very large number of named locks in one process
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+import os
+import time
+
+from array import array
+
+from . import DEFAULT_POLL_TIME, getShardDir, _ensureShardDir, _monotonic, _resolveLockDir, _tryMakeLockDir
+from .Cleanup import _registerHeldLock, _unregisterHeldLock
+
+__all__ = ('LockSet', 'LockSetEntry')
+
+
+class LockSetEntry(object):
+    '''
+        LockSetEntry - A lightweight view of one lock within a LockSet, with the same interface as NamedAtomicLock
+           ( name, lockPath, held, acquiredAt, maxLockAge, acquire, release, isHeld, hasLock )
+
+            Views hold no state of their own, so they can be created and thrown away freely.
+    '''
+
+    __slots__ = ('lockSet', 'index')
+
+    def __init__(self, lockSet, index):
+        self.lockSet = lockSet
+        self.index = index
+
+    @property
+    def name(self):
+        return self.lockSet.names[self.index]
+
+    @property
+    def lockDir(self):
+        return self.lockSet.lockDir
+
+    @property
+    def lockPath(self):
+        return self.lockSet.getLockPath(self.index)
+
+    @property
+    def maxLockAge(self):
+        return self.lockSet.maxLockAge
+
+    @property
+    def held(self):
+        return bool(self.lockSet._held[self.index])
+
+    @property
+    def acquiredAt(self):
+        if not self.lockSet._held[self.index]:
+            return None
+        return self.lockSet._acquiredAt[self.index]
+
+    def acquire(self, timeout=None):
+        '''
+            acquire - Acquire this lock ( see NamedAtomicLock.acquire )
+        '''
+        return bool(self.lockSet.acquire( [self.name], timeout=timeout ))
+
+    def release(self, forceRelease=False):
+        '''
+            release - Release this lock ( see NamedAtomicLock.release )
+        '''
+        return self.lockSet._releaseIndex(self.index, forceRelease)
+
+    @property
+    def isHeld(self):
+        return self.lockSet._isHeldIndex(self.index)
+
+    @property
+    def hasLock(self):
+        return self.lockSet._hasLockIndex(self.index)
+
+    def __repr__(self):
+        return '%s(%r, held=%r)' %(self.__class__.__name__, self.name, self.held)
+
+
+class LockSet(object):
+    '''
+        LockSet - A set of named locks sharing one lockDir (and maxLockAge), for a process which holds a very large number of them.
+
+            Compared to one NamedAtomicLock object per name, a LockSet stores held flags and acquire timestamps in compact arrays,
+              stores lockDir once rather than a full path string per lock, and hands out __slots__-based LockSetEntry views on demand.
+
+            It also supports bulk acquire, release and expiry checks over the whole set (or any subset of names).
+
+            While it holds any lock, the LockSet is registered for cleanup ( see releaseAllHeldLocks ), so its locks are released at exit
+              and forgotten in a forked child, like those of NamedAtomicLock objects.
+
+            Locks taken through a LockSet are ordinary NamedAtomicLock locks, and interoperate with NamedAtomicLock objects using
+              the same name, lockDir and shardLevels.
+    '''
+
+    def __init__(self, names=None, lockDir=None, maxLockAge=None, shardLevels=0):
+        '''
+            __init__ - Create a LockSet
+
+            @param names <None/list<str>> - Initial lock names. More can be added with "add"
+
+            @param lockDir <None/str> - Directory in which to store locks ( see NamedAtomicLock )
+
+            @param maxLockAge <None/float> - Maximum age of each lock ( see NamedAtomicLock )
+
+            @param shardLevels <int> default 0 - Sharded layout of lockDir ( see NamedAtomicLock )
+        '''
+        self.lockDir = _resolveLockDir(lockDir)
+        self.maxLockAge = maxLockAge
+        self.shardLevels = shardLevels
+
+        self.names = []
+        self._indexes = {}
+        self._held = array('b')
+        self._acquiredAt = array('d')
+
+        if names:
+            for name in names:
+                self.add(name)
+
+    def add(self, name):
+        '''
+            add - Add a lock name to the set. Adding a name already in the set does nothing.
+
+            @param name <str> - The lock name, Cannot contain directory seperator (like '/')
+
+            @return <LockSetEntry> - View of the lock
+        '''
+        index = self._indexes.get(name, None)
+        if index is None:
+            if os.sep in name:
+                raise ValueError('Name cannot contain "%s"' %(os.sep,))
+
+            index = self._indexes[name] = len(self.names)
+            self.names.append(name)
+            self._held.append(0)
+            self._acquiredAt.append(0.0)
+
+        return LockSetEntry(self, index)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._indexes
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __getitem__(self, name):
+        '''
+            [name] - Get a LockSetEntry view of a lock in the set
+        '''
+        return LockSetEntry(self, self._indexes[name])
+
+    def getLockPath(self, index):
+        '''
+            getLockPath - Get the lock path for the lock at #index. Paths are built on demand rather than stored.
+
+            @param index <int> - Index of the lock
+
+            @return <str> - The lock path
+        '''
+        name = self.names[index]
+        return getShardDir(name, self.lockDir, self.shardLevels) + os.sep + name
+
+    def _getIndexes(self, names):
+        if names is None:
+            return range(len(self.names))
+        return [ self._indexes[name] for name in names ]
+
+    def _isExpiredMtime(self, mtime, now):
+        return bool(self.maxLockAge and mtime < now - self.maxLockAge)
+
+    def _tryAcquireIndex(self, index):
+        '''
+            _tryAcquireIndex - A single non-blocking attempt to acquire the lock at #index, taking it over if it has expired
+
+            @return <bool> - True if we now hold it
+
+            @raises OSError - If lockDir is out of space or inodes ( see NamedAtomicLock._tryAcquire )
+        '''
+        if self._held[index]:
+            lockPath = self.getLockPath(index)
+            if os.path.exists(lockPath):
+                return True
+            # Someone removed our lock
+            self._held[index] = 0
+
+        name = self.names[index]
+        shardDir = getShardDir(name, self.lockDir, self.shardLevels)
+        lockPath = shardDir + os.sep + name
+
+        if self.shardLevels:
+            _ensureShardDir(shardDir)
+
+        def isExpired():
+            if not self.maxLockAge:
+                return False
+            try:
+                mtime = os.stat(lockPath).st_mtime
+            except OSError:
+                return False
+            return self._isExpiredMtime(mtime, time.time())
+
+        if not _tryMakeLockDir(lockPath, shardDir, self.shardLevels, isExpired):
+            return False
+
+        self._held[index] = 1
+        self._acquiredAt[index] = time.time()
+        _registerHeldLock(self)
+        return True
+
+    @property
+    def held(self):
+        '''
+            held - True if we hold ( or believe we hold ) any lock in the set
+        '''
+        return 1 in self._held
+
+    def _forgetHeld(self):
+        '''
+            _forgetHeld - Forget every lock we hold, without releasing them ( like in a forked child, where the parent still holds them )
+        '''
+        for index in range(len(self._held)):
+            self._held[index] = 0
+
+    def acquire(self, names=None, timeout=None):
+        '''
+            acquire - Acquire many locks at once. Each lock is attempted without blocking, and the ones that were busy are retried
+               until they are all acquired or the timeout passes. Locks which were acquired are kept even if others were not.
+
+            @param names <None/list<str>> - Names of locks to acquire, or None for every lock in the set
+
+            @param timeout <None/float> - Max number of seconds to wait for all of them, or None to block until we get all of them.
+                0 makes a single non-blocking attempt at each.
+
+            @return list<str> - Names of the locks which are now held (of those requested)
+
+            @raises OSError - If lockDir is out of space or inodes ( ENOSPC / EDQUOT ), as NamedAtomicLock.acquire does.
+                Locks acquired before the error are kept.
+        '''
+        indexes = self._getIndexes(names)
+
+        if timeout is not None:
+            endTime = _monotonic() + timeout
+            if timeout / 5.0 < DEFAULT_POLL_TIME:
+                pollTime = max(timeout, 0) / 10.0
+            else:
+                pollTime = DEFAULT_POLL_TIME
+        else:
+            endTime = None
+            pollTime = DEFAULT_POLL_TIME
+
+        acquiredIndexes = []
+        pendingIndexes = indexes
+        while True:
+            stillPending = []
+            for index in pendingIndexes:
+                if self._tryAcquireIndex(index):
+                    acquiredIndexes.append(index)
+                else:
+                    stillPending.append(index)
+            pendingIndexes = stillPending
+
+            if not pendingIndexes:
+                break
+
+            if endTime is None:
+                time.sleep(pollTime)
+                continue
+
+            remaining = endTime - _monotonic()
+            if remaining <= 0:
+                break
+
+            time.sleep(min(pollTime, remaining))
+
+        return [ self.names[index] for index in sorted(acquiredIndexes) ]
+
+    def _releaseIndex(self, index, forceRelease=False):
+        '''
+            _releaseIndex - Release the lock at #index, with the same semantics as NamedAtomicLock.release
+        '''
+        if not self._held[index] and forceRelease is False:
+            return False
+
+        lockPath = self.getLockPath(index)
+        if not os.path.exists(lockPath):
+            self._held[index] = 0
+            return True
+
+        if forceRelease is False:
+            # We waited too long and lost the lock
+            if self.maxLockAge and time.time() > self._acquiredAt[index] + self.maxLockAge:
+                self._held[index] = 0
+                return False
+
+        self._held[index] = 0
+        try:
+            os.rmdir(lockPath)
+            return True
+        except OSError:
+            return False
+
+    def release(self, names=None, forceRelease=False):
+        '''
+            release - Release many locks at once
+
+            @param names <None/list<str>> - Names of locks to release, or None for every lock in the set
+
+            @param forceRelease <bool> default False - If True, release the locks even if we don't hold them
+
+            @return list<str> - Names of the locks which were released
+        '''
+        released = [ self.names[index] for index in self._getIndexes(names) if self._releaseIndex(index, forceRelease) ]
+
+        if not self.held:
+            _unregisterHeldLock(self)
+
+        return released
+
+    def _isHeldIndex(self, index):
+        try:
+            mtime = os.stat(self.getLockPath(index)).st_mtime
+        except OSError:
+            return False
+
+        return not self._isExpiredMtime(mtime, time.time())
+
+    def _hasLockIndex(self, index):
+        if not self._held[index]:
+            return False
+
+        if not self._isHeldIndex(index) or self._isExpiredMtime(self._acquiredAt[index], time.time()):
+            self._held[index] = 0
+            return False
+
+        return True
+
+    def getHeld(self):
+        '''
+            getHeld - Get the names of all locks in the set which we think we hold, without touching the filesystem
+
+            @return list<str> - Names
+        '''
+        return [ self.names[index] for (index, isHeld) in enumerate(self._held) if isHeld ]
+
+    def getExpired(self, now=None):
+        '''
+            getExpired - Get the names of locks we acquired, which have now passed maxLockAge (and so may be taken by others).
+                This only checks our recorded acquire times, without touching the filesystem.
+
+            @param now <None/float> - The current time, default time.time()
+
+            @return list<str> - Names of expired locks
+        '''
+        if not self.maxLockAge:
+            return []
+
+        if now is None:
+            now = time.time()
+
+        cutoff = now - self.maxLockAge
+
+        held = self._held
+        acquiredAt = self._acquiredAt
+        return [ self.names[index] for index in range(len(held)) if held[index] and acquiredAt[index] < cutoff ]
+
+
+# vim: set ts=4 sw=4 expandtab :
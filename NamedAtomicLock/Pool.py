@@ -0,0 +1,175 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    Pool - Acquire whichever NamedAtomicLock of a group is free
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+import random
+import time
+
+from . import NamedAtomicLock, DEFAULT_POLL_TIME, _monotonic
+
+__all__ = ('acquireAny', 'NamedLockPool', 'ORDER_RANDOM', 'ORDER_LRU', 'ORDER_GIVEN')
+
+# Try candidates in a random order, spreading load across the pool
+ORDER_RANDOM = 'random'
+
+# Try candidates least-recently-acquired (by this process) first
+ORDER_LRU = 'lru'
+
+# Try candidates in the order given
+ORDER_GIVEN = 'given'
+
+
+def _getPollTime(timeout):
+    # Same as NamedAtomicLock.acquire: If we aren't going to poll at least 5 times, give us a smaller interval
+    if timeout is not None and timeout / 5.0 < DEFAULT_POLL_TIME:
+        return max(timeout, 0) / 10.0
+    return DEFAULT_POLL_TIME
+
+
+def acquireAny(locks, timeout=None, order=ORDER_RANDOM):
+    '''
+        acquireAny - Acquire whichever of #locks is free first.
+
+            Every candidate we don't already hold is tried without blocking, and if all are busy we sleep and try them all again,
+              until one is acquired or the single overall #timeout passes.
+
+        @param locks list<NamedAtomicLock> - The candidate locks
+
+        @param timeout <None/float> - Max number of seconds to wait for any of them, or None to block. 0 tries each once.
+
+        @param order <str> - ORDER_RANDOM (default) to try candidates in a random order, or ORDER_GIVEN to try them in the order given
+
+        @return <None/NamedAtomicLock> - The lock we acquired, or None if none could be acquired before the timeout
+    '''
+    locks = list(locks)
+    if not locks:
+        raise ValueError('acquireAny requires at least one lock')
+
+    if timeout is not None:
+        endTime = _monotonic() + timeout
+    else:
+        endTime = None
+
+    pollTime = _getPollTime(timeout)
+
+    while True:
+        if order == ORDER_RANDOM:
+            random.shuffle(locks)
+
+        for lockObj in locks:
+            # One we already hold is not free
+            if lockObj.held and lockObj.hasLock:
+                continue
+
+            if lockObj.acquire(timeout=0):
+                return lockObj
+
+        if endTime is None:
+            time.sleep(pollTime)
+            continue
+
+        remaining = endTime - _monotonic()
+        if remaining <= 0:
+            return None
+
+        time.sleep(min(pollTime, remaining))
+
+
+class NamedLockPool(object):
+    '''
+        NamedLockPool - A pool of identical resources (like render slots or database shards), each protected by its own NamedAtomicLock.
+
+            "acquire" grabs whichever one is free, and returns the lock it won.
+
+            Like NamedAtomicLock, an object should not be shared between threads. Each thread should create its own.
+    '''
+
+    def __init__(self, names, lockDir=None, maxLockAge=None, order=ORDER_RANDOM, **kwargs):
+        '''
+            __init__ - Create a NamedLockPool
+
+            @param names list<str> - Lock names of the pool members
+
+            @param lockDir <None/str> - Directory in which to store locks ( see NamedAtomicLock )
+
+            @param maxLockAge <None/float> - Maximum age of each member lock ( see NamedAtomicLock )
+
+            @param order <str> - Order candidates are tried in. ORDER_RANDOM (default), ORDER_LRU (least recently acquired by this object first),
+                or ORDER_GIVEN
+
+            Any other keyword arguments (like shardLevels) are passed through to each NamedAtomicLock
+        '''
+        if not names:
+            raise ValueError('NamedLockPool requires at least one name')
+
+        if order not in (ORDER_RANDOM, ORDER_LRU, ORDER_GIVEN):
+            raise ValueError('Unknown order: %s' %(repr(order), ))
+
+        self.locks = [ NamedAtomicLock(name, lockDir=lockDir, maxLockAge=maxLockAge, **kwargs) for name in names ]
+        self.order = order
+
+        # Position in self.locks -> last time (monotonic) this object acquired it. Never acquired sorts first.
+        self._lastAcquired = [0.0] * len(self.locks)
+
+    def _getCandidates(self):
+        if self.order == ORDER_LRU:
+            return [ self.locks[index] for index in sorted(range(len(self.locks)), key=lambda index : self._lastAcquired[index]) ]
+        return self.locks
+
+    def acquire(self, timeout=None):
+        '''
+            acquire - Acquire whichever pool member is free first ( see acquireAny )
+
+            @param timeout <None/float> - Max number of seconds to wait for any member, or None to block
+
+            @return <None/NamedAtomicLock> - The member lock we acquired, or None on timeout
+        '''
+        if self.order == ORDER_RANDOM:
+            wonLock = acquireAny(self.locks, timeout=timeout, order=ORDER_RANDOM)
+        else:
+            wonLock = acquireAny(self._getCandidates(), timeout=timeout, order=ORDER_GIVEN)
+
+        if wonLock is not None:
+            self._lastAcquired[self.locks.index(wonLock)] = _monotonic()
+
+        return wonLock
+
+    def release(self, lockObj=None, forceRelease=False):
+        '''
+            release - Release a pool member
+
+            @param lockObj <None/NamedAtomicLock> - The member to release (as returned by acquire), or None to release every member we hold
+
+            @param forceRelease <bool> default False - If True, release even if we don't hold it
+
+            @return <bool> - True if released, otherwise False
+        '''
+        if lockObj is not None:
+            return lockObj.release(forceRelease=forceRelease)
+
+        allReleased = True
+        for memberLock in self.locks:
+            if memberLock.held or forceRelease:
+                if not memberLock.release(forceRelease=forceRelease):
+                    allReleased = False
+
+        return allReleased
+
+    def getHeld(self):
+        '''
+            getHeld - Get the pool members this object holds
+
+            @return list<NamedAtomicLock> - Held members
+        '''
+        return [ memberLock for memberLock in self.locks if memberLock.hasLock ]
+
+
+# vim: set ts=4 sw=4 expandtab :
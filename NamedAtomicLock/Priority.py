@@ -0,0 +1,154 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    Priority - The per-lock wait area used by priority-aware acquisition ( NamedAtomicLock.acquire with a priority )
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+import errno
+import os
+import threading
+
+from . import _isPidAlive
+
+__all__ = ('PriorityWaiter', )
+
+
+class PriorityWaiter(object):
+    '''
+        PriorityWaiter - One waiter's registration in a lock's wait area.
+
+            The wait area is a directory beside the lock. Each registered waiter has an empty file in it named:
+
+                <priority>_<pid>_<threadIdent>
+
+            and registration time is the file's mtime.
+
+            A waiter yields (skips its attempt to take the lock) while any other live waiter has a greater effective priority, where
+
+                effective priority = priority + ( seconds spent waiting * agingRate )
+
+            so low priority waiters still make progress eventually.
+    '''
+
+    def __init__(self, waitDir, priority, agingRate, getNow):
+        '''
+            __init__ - Create a PriorityWaiter. Nothing is written until "register" is called.
+
+            @param waitDir <str> - The wait area directory for the lock
+
+            @param priority <float> - Our priority. Higher goes first.
+
+            @param agingRate <float> - Effective priority gained per second of waiting
+
+            @param getNow <function> - Returns the current time, on the same clock as the filesystem mtimes
+        '''
+        self.waitDir = waitDir
+        self.priority = priority
+        self.agingRate = agingRate
+        self.getNow = getNow
+
+        self.entryName = '%r_%d_%d' %(priority, os.getpid(), threading.current_thread().ident)
+        self.registeredAt = None
+
+    @property
+    def isRegistered(self):
+        return self.registeredAt is not None
+
+    def register(self):
+        '''
+            register - Add ourselves to the wait area
+        '''
+        entryPath = self.waitDir + os.sep + self.entryName
+        while True:
+            try:
+                os.close( os.open(entryPath, os.O_WRONLY | os.O_CREAT, 0o666) )
+                break
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+            try:
+                os.mkdir(self.waitDir)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+        self.registeredAt = os.stat(entryPath).st_mtime
+
+    def unregister(self):
+        '''
+            unregister - Remove ourselves from the wait area, and remove the wait area if it is now empty
+        '''
+        if self.registeredAt is None:
+            return
+
+        self.registeredAt = None
+        try:
+            os.remove(self.waitDir + os.sep + self.entryName)
+        except OSError:
+            pass
+
+        try:
+            os.rmdir(self.waitDir)
+        except OSError:
+            # Not empty, someone else is still waiting
+            pass
+
+    def getEffectivePriority(self, priority, registeredAt, now):
+        return priority + ( max(now - registeredAt, 0) * self.agingRate )
+
+    def shouldYield(self):
+        '''
+            shouldYield - Check if another live waiter has a greater effective priority than us
+
+            @return <bool> - True if we should not try to take the lock right now
+        '''
+        try:
+            entryNames = os.listdir(self.waitDir)
+        except OSError:
+            return False
+
+        now = self.getNow()
+        if self.registeredAt is not None:
+            myPriority = self.getEffectivePriority(self.priority, self.registeredAt, now)
+        else:
+            myPriority = self.priority
+
+        for entryName in entryNames:
+            if entryName == self.entryName:
+                continue
+
+            try:
+                (priority, pid, threadIdent) = entryName.rsplit('_', 2)
+                priority = float(priority)
+                pid = int(pid)
+            except ValueError:
+                continue
+
+            entryPath = self.waitDir + os.sep + entryName
+            if not _isPidAlive(pid):
+                # Left behind by a dead waiter
+                try:
+                    os.remove(entryPath)
+                except OSError:
+                    pass
+                continue
+
+            try:
+                registeredAt = os.stat(entryPath).st_mtime
+            except OSError:
+                continue
+
+            if self.getEffectivePriority(priority, registeredAt, now) > myPriority:
+                return True
+
+        return False
+
+
+# vim: set ts=4 sw=4 expandtab :
@@ -0,0 +1,190 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    Query - Check the status of many lock names at once, without creating a NamedAtomicLock for each
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+import os
+import time
+
+from collections import namedtuple
+
+from . import getShardDir, getFilesystemClock, _resolveLockDir
+
+__all__ = ('queryLocks', 'LockStatus', 'QUERY_SCAN_RATIO', 'QUERY_PARALLEL_MIN', 'QUERY_THREADS')
+
+# Scan a whole directory ( rather than stat each name ) when at least 1 / QUERY_SCAN_RATIO of its entries are being queried
+QUERY_SCAN_RATIO = 8
+
+# Stat names from a thread pool when at least this many are stat'd in one directory
+QUERY_PARALLEL_MIN = 64
+
+# Size of that thread pool
+QUERY_THREADS = 8
+
+_scandir = getattr(os, 'scandir', None)
+
+
+class LockStatus(namedtuple('LockStatus', ('name', 'held', 'expired', 'age'))):
+    '''
+        LockStatus - Status of one lock name, as returned by queryLocks
+
+            name <str> - The lock name
+
+            held <bool> - True if the lock exists and has not expired ( same as NamedAtomicLock.isHeld )
+
+            expired <bool> - True if the lock exists, but is past maxLockAge ( so the next acquire will take it over )
+
+            age <None/float> - Seconds since the lock was acquired ( or last refreshed ), or None if it does not exist
+    '''
+
+    __slots__ = ()
+
+
+def _statMtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _scanMtimes(directory, names):
+    '''
+        _scanMtimes - Get mtimes of #names in #directory with one directory listing, stat'ing only the names present
+
+        @return dict - name -> mtime, for names which exist
+    '''
+    mtimes = {}
+    wanted = set(names)
+
+    try:
+        if _scandir is not None:
+            for entry in _scandir(directory):
+                if entry.name in wanted:
+                    try:
+                        mtimes[entry.name] = entry.stat().st_mtime
+                    except OSError:
+                        # Released during the scan
+                        pass
+        else:
+            for name in os.listdir(directory):
+                if name in wanted:
+                    mtime = _statMtime(directory + os.sep + name)
+                    if mtime is not None:
+                        mtimes[name] = mtime
+    except OSError:
+        # Directory does not exist ( like a shard directory never used ), so none of these are held
+        pass
+
+    return mtimes
+
+
+def _statMtimes(directory, names, numThreads):
+    '''
+        _statMtimes - Get mtimes of #names in #directory by stat'ing each, from a thread pool if there are many
+
+        @return dict - name -> mtime, for names which exist
+    '''
+    paths = [ directory + os.sep + name for name in names ]
+
+    if numThreads > 1 and len(paths) >= QUERY_PARALLEL_MIN:
+        from multiprocessing.pool import ThreadPool
+
+        pool = ThreadPool(numThreads)
+        try:
+            results = pool.map(_statMtime, paths, chunksize=max(1, len(paths) // (numThreads * 4)))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [ _statMtime(path) for path in paths ]
+
+    return dict( [ (name, mtime) for (name, mtime) in zip(names, results) if mtime is not None ] )
+
+
+def _shouldScan(directory, numNames):
+    '''
+        _shouldScan - Decide whether listing #directory is cheaper than stat'ing #numNames names in it.
+
+            Locks are directories, so a directory's link count ( 2 + number of subdirectories, on most filesystems )
+              estimates how many entries a scan would read.
+    '''
+    try:
+        numLinks = os.stat(directory).st_nlink
+    except OSError:
+        # Missing directory, nothing is held. Either way costs one failed syscall.
+        return True
+
+    if numLinks < 2:
+        # Filesystem does not count subdirectory links ( like btrfs ), so we can't tell how big the directory is
+        return False
+
+    return bool(numNames * QUERY_SCAN_RATIO >= numLinks - 2)
+
+
+def queryLocks(names, lockDir=None, maxLockAge=None, shardLevels=0, useFilesystemClock=False, numThreads=QUERY_THREADS):
+    '''
+        queryLocks - Get the status of many locks at once. Nothing is acquired or changed.
+
+            Much cheaper than NamedAtomicLock(name).isHeld for each name, which costs object construction
+              ( an isdir and access check on lockDir ), plus an exists and a stat.
+
+            Names are grouped by the directory holding them ( see shardLevels ). For each directory, if a large share
+              of its entries are being queried, it is listed once and only the names present are stat'd.
+              Otherwise, each name is stat'd directly, from a pool of #numThreads threads when there are many.
+
+        @param names list<str> - Lock names to check
+
+        @param lockDir <None/str> - Directory in which the locks are stored ( see NamedAtomicLock )
+
+        @param maxLockAge <None/float> - maxLockAge used by the locks, to decide "expired"
+
+        @param shardLevels <int> default 0 - Sharded layout of lockDir ( see NamedAtomicLock )
+
+        @param useFilesystemClock <bool> default False - Use the filesystem's clock for age and expiry ( see NamedAtomicLock )
+
+        @param numThreads <int> default QUERY_THREADS - Threads for parallel stats. 1 to always stat in this thread
+
+        @return list<LockStatus> - Status of each name, in the same order as #names
+    '''
+    # Only reading, so the directory needn't be writable by us
+    lockDir = _resolveLockDir(lockDir, mustBeWritable=False)
+
+    namesByDir = {}
+    for name in names:
+        directory = getShardDir(name, lockDir, shardLevels)
+        namesByDir.setdefault(directory, []).append(name)
+
+    mtimes = {}
+    for (directory, dirNames) in namesByDir.items():
+        if _shouldScan(directory, len(dirNames)):
+            mtimes.update( _scanMtimes(directory, dirNames) )
+        else:
+            mtimes.update( _statMtimes(directory, dirNames, numThreads) )
+
+    if useFilesystemClock:
+        now = getFilesystemClock(lockDir).now()
+    else:
+        now = time.time()
+
+    statuses = []
+    for name in names:
+        mtime = mtimes.get(name, None)
+        if mtime is None:
+            statuses.append( LockStatus(name, False, False, None) )
+            continue
+
+        age = now - mtime
+        expired = bool(maxLockAge and age > maxLockAge)
+        statuses.append( LockStatus(name, not expired, expired, age) )
+
+    return statuses
+
+
+# vim: set ts=4 sw=4 expandtab :
@@ -0,0 +1,228 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    RateLimiter - A cross-process token-bucket rate limiter, with its bucket in a small mmap'd file guarded by a NamedAtomicLock
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+import mmap
+import os
+import struct
+import time
+
+from . import NamedAtomicLock, _monotonic, _resolveLockDir
+
+__all__ = ('NamedRateLimiter', )
+
+# Bucket file layout: tokens <double>, time of last refill <double>
+BUCKET_STRUCT = struct.Struct('<dd')
+
+# maxLockAge of the lock guarding the bucket. It is only ever held for a few memory reads and writes.
+BUCKET_LOCK_AGE = 10.0
+
+# Poll interval while waiting for the bucket lock
+BUCKET_LOCK_POLL = .001
+
+
+class NamedRateLimiter(object):
+    '''
+        NamedRateLimiter - A token bucket shared by every process using the same name (and lockDir).
+
+            Tokens refill continuously at #rate per second, up to #capacity. Each call takes tokens, or waits until enough are available.
+
+            The bucket state lives in #lockDir/#name.bucket , which is mmap'd, so reading and updating it under the lock is just memory access.
+
+            With #batchSize > 1, each time we take the lock we reserve up to #batchSize tokens into a local reserve, and later calls
+              are served from that reserve without touching the lock at all. This trades a little fairness between processes for far fewer
+              lock round trips.
+
+            Like NamedAtomicLock, an object should not be shared between threads. Each thread should create its own.
+    '''
+
+    def __init__(self, name, rate, capacity=None, lockDir=None, batchSize=1):
+        '''
+            __init__ - Create a NamedRateLimiter
+
+            @param name <str> - The limiter name, Cannot contain directory seperator (like '/')
+
+            @param rate <float> - Tokens added per second
+
+            @param capacity <None/float> - Max tokens the bucket holds (the allowed burst). Default is #rate ( one second's worth )
+
+            @param lockDir <None/str> - Directory in which to store the bucket ( see NamedAtomicLock )
+
+            @param batchSize <int> - Number of tokens to reserve locally per lock acquisition. Default 1 (no batching)
+        '''
+        if rate <= 0:
+            raise ValueError('rate must be greater than 0')
+
+        if capacity is None:
+            capacity = rate
+
+        if batchSize < 1 or batchSize > capacity:
+            raise ValueError('batchSize must be between 1 and capacity')
+
+        lockDir = _resolveLockDir(lockDir)
+
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.lockDir = lockDir
+        self.batchSize = batchSize
+
+        # Tokens we have taken from the shared bucket, but not yet handed out
+        self.reserved = 0
+
+        self.bucketPath = lockDir + os.sep + name + '.bucket'
+        self._bucketLock = NamedAtomicLock(name + '.bucket.lock', lockDir=lockDir, maxLockAge=BUCKET_LOCK_AGE)
+
+        self._fd = None
+        self._map = None
+        self._openBucket()
+
+    def _lockBucket(self):
+        while not self._bucketLock.acquire(timeout=BUCKET_LOCK_POLL * 10):
+            pass
+
+    def _openBucket(self):
+        self._lockBucket()
+        try:
+            fd = os.open(self.bucketPath, os.O_RDWR | os.O_CREAT, 0o666)
+            if os.fstat(fd).st_size < BUCKET_STRUCT.size:
+                # New bucket, starts full
+                os.ftruncate(fd, BUCKET_STRUCT.size)
+                os.write(fd, BUCKET_STRUCT.pack(self.capacity, time.time()))
+
+            self._fd = fd
+            self._map = mmap.mmap(fd, BUCKET_STRUCT.size)
+        finally:
+            self._bucketLock.release()
+
+    def close(self):
+        '''
+            close - Unmap the bucket file. Any tokens in our local reserve are discarded.
+        '''
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self.reserved = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, excTraceback):
+        self.close()
+        return False
+
+    def _takeFromBucket(self, count):
+        '''
+            _takeFromBucket - Refill the shared bucket and take #count tokens (plus up to batchSize for the reserve) if available.
+
+            @return <float> - 0 if the tokens were taken, otherwise the number of seconds until #count would be available
+        '''
+        self._lockBucket()
+        try:
+            (tokens, lastRefill) = BUCKET_STRUCT.unpack(self._map[:BUCKET_STRUCT.size])
+
+            now = time.time()
+            if now > lastRefill:
+                tokens = min(self.capacity, tokens + (now - lastRefill) * self.rate)
+                lastRefill = now
+
+            if tokens < count:
+                waitTime = (count - tokens) / self.rate
+            else:
+                taking = max(count, min(self.batchSize, int(tokens)))
+                tokens -= taking
+                self.reserved += taking - count
+                waitTime = 0
+
+            self._map[:BUCKET_STRUCT.size] = BUCKET_STRUCT.pack(tokens, lastRefill)
+        finally:
+            self._bucketLock.release()
+
+        return waitTime
+
+    def tryTake(self, count=1):
+        '''
+            tryTake - Take #count tokens if they are available now, without waiting
+
+            @param count <int> - Number of tokens
+
+            @return <bool> - True if taken, otherwise False
+        '''
+        return bool(self._tryTake(count) == 0)
+
+    def _tryTake(self, count):
+        if count > self.capacity:
+            raise ValueError('Cannot take %s tokens from a bucket with capacity %s' %(str(count), str(self.capacity)))
+
+        if self.reserved >= count:
+            self.reserved -= count
+            return 0
+
+        # Use up what we have in reserve first
+        fromReserve = self.reserved
+        self.reserved = 0
+
+        waitTime = self._takeFromBucket(count - fromReserve)
+        if waitTime:
+            self.reserved = fromReserve
+        return waitTime
+
+    def take(self, count=1, timeout=None):
+        '''
+            take - Take #count tokens, sleeping exactly as long as needed for them to refill if they are not available
+
+            @param count <int> - Number of tokens
+
+            @param timeout <None/float> - Max number of seconds to wait, or None to wait as long as needed. 0 does not wait.
+
+            @return <bool> - True if taken, False on timeout
+        '''
+        if timeout is not None:
+            endTime = _monotonic() + timeout
+
+        while True:
+            waitTime = self._tryTake(count)
+            if waitTime == 0:
+                return True
+
+            if timeout is not None:
+                remaining = endTime - _monotonic()
+                if remaining < waitTime:
+                    # Won't refill in time, don't bother sleeping
+                    return False
+
+            time.sleep(waitTime)
+
+    def timeUntilAvailable(self, count=1):
+        '''
+            timeUntilAvailable - Get how long until #count tokens would be available. Nothing is taken.
+
+                This reads the bucket without taking the lock, so it is an estimate. Other processes may take the tokens first.
+
+            @param count <int> - Number of tokens
+
+            @return <float> - Seconds until available, 0 if available now
+        '''
+        if self.reserved >= count:
+            return 0.0
+
+        (tokens, lastRefill) = BUCKET_STRUCT.unpack(self._map[:BUCKET_STRUCT.size])
+        tokens = min(self.capacity, tokens + max(time.time() - lastRefill, 0) * self.rate) + self.reserved
+
+        if tokens >= count:
+            return 0.0
+        return (count - tokens) / self.rate
+
+
+# vim: set ts=4 sw=4 expandtab :
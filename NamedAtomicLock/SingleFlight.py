@@ -0,0 +1,251 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    SingleFlight - A cross-process "single-flight" result cache built on NamedAtomicLock.
+
+      The first process to miss on a key computes the result while holding a lock for that key,
+        and every other process waiting on that key gets the stored result instead of recomputing it.
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+import errno
+import functools
+import os
+import pickle
+import tempfile
+import time
+
+from . import NamedAtomicLock, _nameDigest, _resolveLockDir
+
+__all__ = ('SingleFlightCache', 'singleFlight')
+
+
+# Prefix of in-progress result files within the result store. These are never read as results.
+TEMP_RESULT_PREFIX = '.tmp_'
+
+
+class SingleFlightCache(object):
+    '''
+        SingleFlightCache - A result cache shared between processes, where only one process computes the result for any given key.
+
+            Results are pickled into a result store directory next to the locks ( #lockDir/#name.results ), written atomically (via rename).
+    '''
+
+    def __init__(self, name, lockDir=None, ttl=None, maxEntries=None, maxLockAge=None, timeout=None):
+        '''
+            __init__ - Create a SingleFlightCache
+
+            @param name <str> - The name of this cache. All processes using the same name (and lockDir) share results.
+                Cannot contain directory seperator (like '/')
+
+            @param lockDir <None/str> - Directory in which to store locks and the result store. Defaults to tempdir.
+                May be FASTEST_LOCK_DIR ( see NamedAtomicLock )
+
+            @param ttl <None/float> - If provided, a stored result older than this many seconds is recomputed.
+
+            @param maxEntries <None/int> - If provided, the least recently used results are evicted to keep at most this many stored.
+
+            @param maxLockAge <None/float> - maxLockAge for the per-key locks ( see NamedAtomicLock ). Should be longer than a computation takes.
+
+            @param timeout <None/float> - Max number of seconds to wait for another process computing the same key.
+                If this passes, we compute the result ourselves (without storing it). None waits forever.
+        '''
+        if os.sep in name:
+            raise ValueError('Name cannot contain "%s"' %(os.sep,))
+
+        lockDir = _resolveLockDir(lockDir)
+
+        self.name = name
+        self.lockDir = lockDir
+        self.ttl = ttl
+        self.maxEntries = maxEntries
+        self.maxLockAge = maxLockAge
+        self.timeout = timeout
+
+        self.storeDir = lockDir + os.sep + name + '.results'
+
+        try:
+            os.mkdir(self.storeDir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise ValueError('Cannot create result store %s: %s' %(self.storeDir, str(e)))
+
+    def _getEntryPath(self, digest):
+        return self.storeDir + os.sep + digest
+
+    def _load(self, digest):
+        '''
+            _load - Load a stored result
+
+            @param digest <str> - Digest of the key
+
+            @return tuple( <bool>, <object> ) - (True, result) if there was a valid, unexpired stored result, otherwise (False, None)
+        '''
+        entryPath = self._getEntryPath(digest)
+        try:
+            with open(entryPath, 'rb') as f:
+                (createdAt, result) = pickle.load(f)
+        except Exception:
+            # Missing, or otherwise unreadable. Either way, a miss.
+            return (False, None)
+
+        if self.ttl is not None and time.time() - createdAt > self.ttl:
+            return (False, None)
+
+        if self.maxEntries:
+            # The mtime is used as the "last used" time for LRU eviction
+            try:
+                os.utime(entryPath, None)
+            except OSError:
+                pass
+
+        return (True, result)
+
+    def _store(self, digest, result):
+        '''
+            _store - Atomically store a result, and evict old results if necessary
+
+            @param digest <str> - Digest of the key
+
+            @param result <object> - The result, must be picklable
+        '''
+        (fd, tempPath) = tempfile.mkstemp(prefix=TEMP_RESULT_PREFIX, dir=self.storeDir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump( (time.time(), result), f, pickle.HIGHEST_PROTOCOL)
+
+            os.rename(tempPath, self._getEntryPath(digest))
+        except:
+            try:
+                os.remove(tempPath)
+            except OSError:
+                pass
+            raise
+
+        if self.maxEntries or self.ttl is not None:
+            self.evict()
+
+    def evict(self):
+        '''
+            evict - Remove expired results (past ttl), and the least recently used results beyond maxEntries.
+
+                This is called automatically after storing a result.
+        '''
+        now = time.time()
+
+        entries = []
+        for entryName in os.listdir(self.storeDir):
+            if entryName.startswith(TEMP_RESULT_PREFIX):
+                continue
+
+            entryPath = self.storeDir + os.sep + entryName
+            try:
+                mtime = os.stat(entryPath).st_mtime
+            except OSError:
+                continue
+
+            # mtime is the last time the result was used, so if that is past ttl the result is certainly expired.
+            if self.ttl is not None and now - mtime > self.ttl:
+                self._removeEntry(entryPath)
+                continue
+
+            entries.append( (mtime, entryPath) )
+
+        if self.maxEntries and len(entries) > self.maxEntries:
+            entries.sort()
+            for (mtime, entryPath) in entries[ : len(entries) - self.maxEntries ]:
+                self._removeEntry(entryPath)
+
+    @staticmethod
+    def _removeEntry(entryPath):
+        try:
+            os.remove(entryPath)
+        except OSError:
+            pass
+
+    def get(self, key, func, *args, **kwargs):
+        '''
+            get - Get the result for #key, computing it with #func if it is not stored.
+
+                If another process is already computing #key, this waits for it and returns its result.
+
+            @param key <str> - The key. Non-str keys are converted with str()
+
+            @param func - Function to compute the result. Called as func(*args, **kwargs). Result must be picklable.
+
+            @return <object> - The result
+        '''
+        digest = _nameDigest(key)
+
+        (found, result) = self._load(digest)
+        if found:
+            return result
+
+        keyLock = NamedAtomicLock(self.name + '.' + digest, lockDir=self.lockDir, maxLockAge=self.maxLockAge)
+        if not keyLock.acquire(timeout=self.timeout):
+            # Whoever is computing is taking too long, do it ourselves.
+            return func(*args, **kwargs)
+
+        try:
+            # Someone else may have computed it while we waited on the lock
+            (found, result) = self._load(digest)
+            if found:
+                return result
+
+            result = func(*args, **kwargs)
+            self._store(digest, result)
+            return result
+        finally:
+            keyLock.release()
+
+    def invalidate(self, key):
+        '''
+            invalidate - Remove the stored result for #key, if any
+
+            @param key <str> - The key
+        '''
+        self._removeEntry(self._getEntryPath(_nameDigest(key)))
+
+    def clear(self):
+        '''
+            clear - Remove all stored results
+        '''
+        for entryName in os.listdir(self.storeDir):
+            if not entryName.startswith(TEMP_RESULT_PREFIX):
+                self._removeEntry(self.storeDir + os.sep + entryName)
+
+
+def singleFlight(name, lockDir=None, ttl=None, maxEntries=None, maxLockAge=None, timeout=None, keyFunc=None):
+    '''
+        singleFlight - Decorator which makes a function share its results across processes via a SingleFlightCache.
+
+            Arguments other than #keyFunc are as SingleFlightCache. The cache is available as the "cache" attribute of the decorated function.
+
+        @param keyFunc <None/function> - Called with the same arguments as the decorated function to get the key.
+            Default uses the repr of the arguments.
+    '''
+    cache = SingleFlightCache(name, lockDir=lockDir, ttl=ttl, maxEntries=maxEntries, maxLockAge=maxLockAge, timeout=timeout)
+
+    def _decorator(func):
+
+        @functools.wraps(func)
+        def _singleFlightWrapper(*args, **kwargs):
+            if keyFunc is not None:
+                key = keyFunc(*args, **kwargs)
+            else:
+                key = repr( (args, sorted(kwargs.items())) )
+
+            return cache.get(key, func, *args, **kwargs)
+
+        _singleFlightWrapper.cache = cache
+        return _singleFlightWrapper
+
+    return _decorator
+
+
+# vim: set ts=4 sw=4 expandtab :
@@ -0,0 +1,201 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    Striped - Lock striping, mapping an unbounded key space onto a fixed pool of NamedAtomicLocks
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+from . import NamedAtomicLock, _nameDigest, _monotonic
+
+__all__ = ('StripedNamedAtomicLock', 'DEFAULT_NUM_STRIPES')
+
+# Default number of stripes for StripedNamedAtomicLock
+DEFAULT_NUM_STRIPES = 64
+
+
+class StripedNamedAtomicLock(object):
+    '''
+        StripedNamedAtomicLock - Locks arbitrary keys (like customer ids) by hashing each key onto one of a fixed number of NamedAtomicLock "stripes".
+
+            This bounds the number of distinct lock names (and so the size of lockDir) no matter how many keys there are,
+              at the cost of unrelated keys which hash to the same stripe sharing a lock.
+
+            The hash is stable across processes, so every process using the same name and numStripes maps a key to the same stripe.
+
+            Holds are counted per stripe, so acquiring two keys which land on the same stripe, then releasing one, keeps the stripe held
+              until the other is released too.
+
+            Like NamedAtomicLock, an object should not be shared between threads. Each thread should create its own.
+    '''
+
+    def __init__(self, name, numStripes=DEFAULT_NUM_STRIPES, lockDir=None, maxLockAge=None, **kwargs):
+        '''
+            __init__ - Create a StripedNamedAtomicLock
+
+            @param name <str> - Base name of the stripes. Stripe #i uses the lock name "#name.stripe#i"
+
+            @param numStripes <int> - Number of stripes. All users of #name must use the same number.
+
+            @param lockDir <None/str> - Directory in which to store locks ( see NamedAtomicLock )
+
+            @param maxLockAge <None/float> - Maximum age of a stripe lock ( see NamedAtomicLock )
+
+            Any other keyword arguments (like shardLevels) are passed through to each NamedAtomicLock
+        '''
+        if numStripes < 1:
+            raise ValueError('numStripes must be at least 1')
+
+        self.name = name
+        self.numStripes = numStripes
+
+        # Stripe objects are created lazily, we may only ever touch a few of them
+        self._stripeArgs = dict(kwargs, lockDir=lockDir, maxLockAge=maxLockAge)
+        self._stripes = [None] * numStripes
+        self._holdCounts = [0] * numStripes
+
+        # Validate arguments (like lockDir) up front
+        self.getStripe(0)
+
+    def getStripeIndex(self, key):
+        '''
+            getStripeIndex - Get the index of the stripe which protects #key
+
+            @param key <str> - The key. Non-str keys are converted with str()
+
+            @return <int> - Stripe index
+        '''
+        return int(_nameDigest(key), 16) % self.numStripes
+
+    def getStripe(self, index):
+        '''
+            getStripe - Get the NamedAtomicLock for a stripe index
+
+            @param index <int> - The stripe index
+
+            @return <NamedAtomicLock> - The stripe lock
+        '''
+        stripe = self._stripes[index]
+        if stripe is None:
+            stripe = self._stripes[index] = NamedAtomicLock('%s.stripe%d' %(self.name, index), **self._stripeArgs)
+        return stripe
+
+    def getLock(self, key):
+        '''
+            getLock - Get the NamedAtomicLock stripe which protects #key
+
+            @param key <str> - The key
+
+            @return <NamedAtomicLock> - The stripe lock
+        '''
+        return self.getStripe(self.getStripeIndex(key))
+
+    def _acquireIndex(self, index, timeout):
+        stripe = self.getStripe(index)
+        if not stripe.held:
+            # Our hold count is stale if the stripe was released out from under us ( like by releaseAllHeldLocks, or after fork )
+            self._holdCounts[index] = 0
+
+        if not stripe.acquire(timeout=timeout):
+            return False
+
+        self._holdCounts[index] += 1
+        return True
+
+    def _releaseIndex(self, index, forceRelease=False):
+        if self._holdCounts[index] and not self.getStripe(index).held:
+            # Released out from under us ( see _acquireIndex )
+            self._holdCounts[index] = 0
+
+        if self._holdCounts[index] == 0:
+            if forceRelease:
+                return self.getStripe(index).release(forceRelease=True)
+            return False
+
+        self._holdCounts[index] -= 1
+        if self._holdCounts[index] == 0:
+            return self.getStripe(index).release(forceRelease=forceRelease)
+        return True
+
+    def acquire(self, key, timeout=None):
+        '''
+            acquire - Acquire the stripe protecting #key
+
+            @param key <str> - The key
+
+            @param timeout <None/float> - Max number of seconds to wait, or None to block ( see NamedAtomicLock.acquire )
+
+            @return <bool> - True if you got the lock, otherwise False
+        '''
+        return self._acquireIndex(self.getStripeIndex(key), timeout)
+
+    def release(self, key, forceRelease=False):
+        '''
+            release - Release the stripe protecting #key
+
+            @param key <str> - The key
+
+            @param forceRelease <bool> default False - If True, release the stripe even if we don't hold it
+
+            @return <bool> - True if released (or still held for another key on the same stripe), otherwise False
+        '''
+        return self._releaseIndex(self.getStripeIndex(key), forceRelease)
+
+    def _getIndexes(self, keys):
+        # De-duplicate, and always lock in ascending stripe order so that two processes locking overlapping sets cannot deadlock
+        return sorted(set( [ self.getStripeIndex(key) for key in keys ] ))
+
+    def acquireMany(self, keys, timeout=None):
+        '''
+            acquireMany - Acquire the stripes protecting all of #keys. Each stripe is acquired once, in a consistent order.
+
+                Either all are acquired, or none are.
+
+            @param keys list<str> - The keys
+
+            @param timeout <None/float> - Max number of seconds to wait for all stripes, or None to block
+
+            @return <bool> - True if you got all the locks, otherwise False
+        '''
+        if timeout is not None:
+            endTime = _monotonic() + timeout
+
+        acquiredIndexes = []
+        for index in self._getIndexes(keys):
+            if timeout is not None:
+                remaining = max(endTime - _monotonic(), 0)
+            else:
+                remaining = None
+
+            if not self._acquireIndex(index, remaining):
+                for acquiredIndex in reversed(acquiredIndexes):
+                    self._releaseIndex(acquiredIndex)
+                return False
+
+            acquiredIndexes.append(index)
+
+        return True
+
+    def releaseMany(self, keys, forceRelease=False):
+        '''
+            releaseMany - Release the stripes protecting all of #keys, as acquired by acquireMany
+
+            @param keys list<str> - The keys
+
+            @param forceRelease <bool> default False - If True, release the stripes even if we don't hold them
+
+            @return <bool> - True if all were released, otherwise False
+        '''
+        allReleased = True
+        for index in reversed(self._getIndexes(keys)):
+            if not self._releaseIndex(index, forceRelease):
+                allReleased = False
+
+        return allReleased
+
+
+# vim: set ts=4 sw=4 expandtab :
@@ -0,0 +1,407 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    Sync - Cross-process NamedBarrier and NamedEvent, using the same lockDir conventions as NamedAtomicLock
+
+      Waiters are woken through named pipes (FIFOs) rather than by polling, so a set or a tripped barrier is seen right away.
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+import errno
+import json
+import os
+import random
+import select
+import socket
+import tempfile
+import threading
+import time
+
+from . import NamedAtomicLock, _monotonic, _resolveLockDir, _isPidAlive
+
+__all__ = ('NamedBarrier', 'NamedEvent', 'MAX_WAIT_SLICE')
+
+# Waiters re-check state at least this often (seconds), even without a wakeup. Covers a notifier which crashed mid-notify.
+MAX_WAIT_SLICE = 1.0
+
+# maxLockAge of the lock guarding a barrier's state. It is only ever held for a read and write of a small file.
+BARRIER_STATE_LOCK_AGE = 10.0
+
+
+def _getDeadline(timeout):
+    if timeout is None:
+        return None
+    return _monotonic() + timeout
+
+
+def _getWaitSlice(endTime):
+    '''
+        _getWaitSlice - Get how long to block for the next wakeup
+
+        @return <None/float> - Seconds to wait, or None if the deadline has passed
+    '''
+    if endTime is None:
+        return MAX_WAIT_SLICE
+
+    remaining = endTime - _monotonic()
+    if remaining <= 0:
+        return None
+    return min(remaining, MAX_WAIT_SLICE)
+
+
+class _WaitArea(object):
+    '''
+        _WaitArea - A directory of FIFOs, one per waiter. Notifying writes a byte to every FIFO, waking each waiter from select.
+
+            Each waiter also holds its own FIFO open for writing, so it never sees end-of-file, and a notifier opening
+              a FIFO whose waiter has died gets ENXIO and removes it.
+    '''
+
+    def __init__(self, waitDir):
+        self.waitDir = waitDir
+
+    def open(self):
+        '''
+            open - Add a FIFO for the current waiter
+
+            @return tuple( <str>, <int>, <int> ) - The FIFO path, the read fd, and our own write fd
+        '''
+        fifoPath = '%s%s%d_%d_%d' %(self.waitDir, os.sep, os.getpid(), threading.current_thread().ident, random.randint(0, 2 ** 30))
+        while True:
+            try:
+                os.mkfifo(fifoPath, 0o600)
+                break
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+            try:
+                os.mkdir(self.waitDir)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+        readFd = os.open(fifoPath, os.O_RDONLY | os.O_NONBLOCK)
+        writeFd = os.open(fifoPath, os.O_WRONLY | os.O_NONBLOCK)
+        return (fifoPath, readFd, writeFd)
+
+    def wait(self, readFd, timeout):
+        '''
+            wait - Block until notified, or #timeout seconds pass
+        '''
+        (readable, writable, errored) = select.select([readFd], [], [], timeout)
+        if readable:
+            # Drain, so the next wait blocks again
+            try:
+                while os.read(readFd, 4096):
+                    pass
+            except OSError:
+                pass
+
+    def close(self, fifoPath, readFd, writeFd):
+        '''
+            close - Remove the current waiter's FIFO, and remove the wait directory if it is now empty
+        '''
+        os.close(writeFd)
+        os.close(readFd)
+        try:
+            os.remove(fifoPath)
+        except OSError:
+            pass
+
+        try:
+            os.rmdir(self.waitDir)
+        except OSError:
+            # Not empty, someone else is still waiting ( "open" recreates it if we remove it just as another waiter arrives )
+            pass
+
+    def notifyAll(self):
+        '''
+            notifyAll - Wake every waiter
+        '''
+        try:
+            fifoNames = os.listdir(self.waitDir)
+        except OSError:
+            return
+
+        for fifoName in fifoNames:
+            fifoPath = self.waitDir + os.sep + fifoName
+            try:
+                fd = os.open(fifoPath, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    # No reader, the waiter died without cleaning up
+                    try:
+                        os.remove(fifoPath)
+                    except OSError:
+                        pass
+                continue
+
+            try:
+                os.write(fd, b'!')
+            except OSError:
+                # EAGAIN - Pipe is full, so it already has a wakeup pending
+                pass
+            finally:
+                os.close(fd)
+
+    def waitFor(self, predicate, timeout):
+        '''
+            waitFor - Wait until #predicate() returns True
+
+            @param predicate <function> - Checked after registering (so a notify between the caller's check and now is not lost),
+                then after every wakeup
+
+            @param timeout <None/float> - Max number of seconds to wait, or None for no limit
+
+            @return <bool> - True if #predicate() became True, False on timeout
+        '''
+        endTime = _getDeadline(timeout)
+
+        (fifoPath, readFd, writeFd) = self.open()
+        try:
+            while True:
+                if predicate():
+                    return True
+
+                waitSlice = _getWaitSlice(endTime)
+                if waitSlice is None:
+                    return False
+
+                self.wait(readFd, waitSlice)
+        finally:
+            self.close(fifoPath, readFd, writeFd)
+
+
+class NamedEvent(object):
+    '''
+        NamedEvent - A cross-process event flag, like threading.Event.
+
+            The flag is a directory, #lockDir/#name.event , which exists while the event is set.
+    '''
+
+    def __init__(self, name, lockDir=None):
+        '''
+            __init__ - Create a NamedEvent
+
+            @param name <str> - The event name, Cannot contain directory seperator (like '/')
+
+            @param lockDir <None/str> - Directory in which to store the event ( see NamedAtomicLock )
+        '''
+        if os.sep in name:
+            raise ValueError('Name cannot contain "%s"' %(os.sep,))
+
+        lockDir = _resolveLockDir(lockDir)
+
+        self.name = name
+        self.lockDir = lockDir
+        self.eventPath = lockDir + os.sep + name + '.event'
+
+        self._waitArea = _WaitArea(self.eventPath + '.waiters')
+
+    def isSet(self):
+        '''
+            isSet - True if the event is set, otherwise False
+        '''
+        return os.path.isdir(self.eventPath)
+
+    is_set = isSet
+
+    def set(self):
+        '''
+            set - Set the event, waking all waiters
+        '''
+        try:
+            os.mkdir(self.eventPath)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        self._waitArea.notifyAll()
+
+    def clear(self):
+        '''
+            clear - Clear the event
+        '''
+        try:
+            os.rmdir(self.eventPath)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+    def wait(self, timeout=None):
+        '''
+            wait - Block until the event is set
+
+            @param timeout <None/float> - Max number of seconds to wait, or None to wait forever
+
+            @return <bool> - True if the event is set, False on timeout
+        '''
+        if self.isSet():
+            return True
+
+        return self._waitArea.waitFor(self.isSet, timeout)
+
+
+class NamedBarrier(object):
+    '''
+        NamedBarrier - A cross-process barrier, like threading.Barrier. "wait" blocks until #parties participants have called it,
+            then all are released and the barrier resets for the next round (the next "generation").
+
+            State is kept in #lockDir/#name.barrier , a small JSON file guarded by a NamedAtomicLock.
+
+            A participant on this host which arrived and then died (its pid no longer exists) is not counted. With #maxParticipantAge,
+              participants which have been waiting longer than that are not counted either, which covers hung processes
+              and participants on other hosts ( whose pids we cannot check ) which died.
+
+            A participant is a thread of a process, so threads of one process can each take part.
+    '''
+
+    def __init__(self, name, parties, lockDir=None, maxParticipantAge=None):
+        '''
+            __init__ - Create a NamedBarrier
+
+            @param name <str> - The barrier name, Cannot contain directory seperator (like '/')
+
+            @param parties <int> - Number of participants which must arrive to release the barrier
+
+            @param lockDir <None/str> - Directory in which to store the barrier ( see NamedAtomicLock )
+
+            @param maxParticipantAge <None/float> - If provided, a participant waiting longer than this many seconds is dropped
+        '''
+        if parties < 1:
+            raise ValueError('parties must be at least 1')
+
+        lockDir = _resolveLockDir(lockDir)
+
+        self.name = name
+        self.parties = parties
+        self.lockDir = lockDir
+        self.maxParticipantAge = maxParticipantAge
+
+        self.statePath = lockDir + os.sep + name + '.barrier'
+        self._stateLock = NamedAtomicLock(name + '.barrier.lock', lockDir=lockDir, maxLockAge=BARRIER_STATE_LOCK_AGE)
+        self._waitArea = _WaitArea(self.statePath + '.waiters')
+
+    def _getParticipantId(self):
+        # "host:pid:threadIdent". Hostnames cannot contain ':'
+        return '%s:%d:%d' %(socket.gethostname(), os.getpid(), threading.current_thread().ident)
+
+    def _lockState(self):
+        # Held only for a read and write, so poll with a short interval rather than DEFAULT_POLL_TIME
+        while not self._stateLock.acquire(timeout=.01):
+            pass
+
+    def _readState(self):
+        try:
+            with open(self.statePath, 'rt') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return { 'generation' : 0, 'arrived' : {} }
+
+    def _writeState(self, state):
+        (fd, tempPath) = tempfile.mkstemp(prefix='.' + self.name + '.barrier.tmp', dir=self.lockDir)
+        with os.fdopen(fd, 'wt') as f:
+            json.dump(state, f)
+        os.rename(tempPath, self.statePath)
+
+    def _purgeParticipants(self, state):
+        now = time.time()
+        hostname = socket.gethostname()
+        for (participantId, arrivedAt) in list(state['arrived'].items()):
+            (participantHost, pid, threadIdent) = participantId.rsplit(':', 2)
+
+            # We can only check pids on our own host. Others are only dropped by maxParticipantAge.
+            if participantHost == hostname and not _isPidAlive(int(pid)):
+                del state['arrived'][participantId]
+            elif self.maxParticipantAge and now - arrivedAt > self.maxParticipantAge:
+                del state['arrived'][participantId]
+
+    @property
+    def generation(self):
+        '''
+            generation - The number of times the barrier has been released
+        '''
+        return self._readState()['generation']
+
+    @property
+    def numWaiting(self):
+        '''
+            numWaiting - The number of live participants currently waiting at the barrier
+        '''
+        state = self._readState()
+        self._purgeParticipants(state)
+        return len(state['arrived'])
+
+    def wait(self, timeout=None):
+        '''
+            wait - Arrive at the barrier, and block until #parties participants have arrived
+
+            @param timeout <None/float> - Max number of seconds to wait, or None to wait forever.
+                On timeout, we are removed from the barrier (so do not count towards this round).
+
+            @return <bool> - True if the barrier was released, False on timeout
+        '''
+        participantId = self._getParticipantId()
+
+        self._lockState()
+        try:
+            state = self._readState()
+            self._purgeParticipants(state)
+
+            myGeneration = state['generation']
+            state['arrived'][participantId] = time.time()
+
+            isLast = bool(len(state['arrived']) >= self.parties)
+            if isLast:
+                state['generation'] += 1
+                state['arrived'] = {}
+
+            self._writeState(state)
+        finally:
+            self._stateLock.release()
+
+        if isLast:
+            self._waitArea.notifyAll()
+            return True
+
+        if self._waitArea.waitFor(lambda : self._readState()['generation'] != myGeneration, timeout):
+            return True
+
+        # Timed out. Leave the barrier, unless it was released just now.
+        self._lockState()
+        try:
+            state = self._readState()
+            if state['generation'] != myGeneration:
+                return True
+
+            state['arrived'].pop(participantId, None)
+            self._writeState(state)
+        finally:
+            self._stateLock.release()
+
+        return False
+
+    def reset(self):
+        '''
+            reset - Remove all waiting participants, and start a new generation.
+                Participants already waiting are released (their wait returns True).
+        '''
+        self._lockState()
+        try:
+            state = self._readState()
+            state['generation'] += 1
+            state['arrived'] = {}
+            self._writeState(state)
+        finally:
+            self._stateLock.release()
+
+        self._waitArea.notifyAll()
+
+
+# vim: set ts=4 sw=4 expandtab :
@@ -0,0 +1,188 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    Tracing - Hooks for tracing lock waits, holds, and contention events ( see "hooks" option of NamedAtomicLock )
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+import json
+import os
+import threading
+
+__all__ = ('LockHooks', 'ChromeTraceHooks')
+
+
+class LockHooks(object):
+    '''
+        LockHooks - Base class for tracing hooks. Pass an instance as the "hooks" argument of NamedAtomicLock.
+
+            Every method does nothing here, so subclasses need only override the events they care about.
+
+            Each is called in the thread using the lock, with the lock object ( use lockObj.name for the name ),
+              and the time of the event from time.time(). Durations are in seconds.
+
+            Hooks should be quick, and should not raise.
+    '''
+
+    def onAcquireStart(self, lockObj, timestamp):
+        '''
+            onAcquireStart - Called when acquire starts trying for a lock we do not already hold
+        '''
+        pass
+
+    def onAcquired(self, lockObj, timestamp, waitTime):
+        '''
+            onAcquired - Called when acquire gets the lock
+
+            @param waitTime <float> - Seconds spent in acquire
+        '''
+        pass
+
+    def onTimeout(self, lockObj, timestamp, waitTime):
+        '''
+            onTimeout - Called when acquire gives up without the lock
+
+            @param waitTime <float> - Seconds spent in acquire
+        '''
+        pass
+
+    def onAcquireError(self, lockObj, timestamp, waitTime, error):
+        '''
+            onAcquireError - Called when acquire raises an exception ( like DeadlockError ) after onAcquireStart, just before it propagates
+
+                By default, calls onTimeout, as acquire has given up without the lock.
+
+            @param waitTime <float> - Seconds spent in acquire
+
+            @param error <BaseException> - The exception being raised
+        '''
+        self.onTimeout(lockObj, timestamp, waitTime)
+
+    def onRelease(self, lockObj, timestamp, holdTime):
+        '''
+            onRelease - Called when a lock we held is released
+
+            @param holdTime <float/None> - Seconds the lock was held, or None if not known ( like a forceRelease of a lock we did not hold )
+        '''
+        pass
+
+    def onExpiredSteal(self, lockObj, timestamp):
+        '''
+            onExpiredSteal - Called when acquire removes someone else's lock because it is past maxLockAge
+        '''
+        pass
+
+    def onLost(self, lockObj, timestamp):
+        '''
+            onLost - Called when we find a lock we thought we held has expired or been removed
+        '''
+        pass
+
+
+class ChromeTraceHooks(LockHooks):
+    '''
+        ChromeTraceHooks - LockHooks which record events in Chrome's trace event format,
+          which can be opened in chrome://tracing or https://ui.perfetto.dev
+
+            Each acquire is recorded as a "wait <name>" span, and each hold as a "hold <name>" span, on the thread that used the lock.
+              Timeouts, acquire errors, expired steals, and lost locks are instant events.
+
+            Timestamps are wall clock, so traces from several processes can be merged by concatenating their "traceEvents".
+
+            One instance may be shared between any number of locks and threads.
+    '''
+
+    def __init__(self, outputPath=None, category='NamedAtomicLock'):
+        '''
+            __init__ - Create a ChromeTraceHooks
+
+            @param outputPath <None/str> default None - Default path for "save"
+
+            @param category <str> default 'NamedAtomicLock' - Category ( "cat" ) of every event
+        '''
+        self.outputPath = outputPath
+        self.category = category
+
+        self.events = []
+        self._eventsLock = threading.Lock()
+
+    def _addEvent(self, phase, eventName, timestamp, duration=None, args=None):
+        event = {
+            'name' : eventName,
+            'cat' : self.category,
+            'ph' : phase,
+            'ts' : timestamp * 1000000.0,
+            'pid' : os.getpid(),
+            'tid' : threading.current_thread().ident,
+        }
+        if duration is not None:
+            event['dur'] = duration * 1000000.0
+        if phase == 'i':
+            # Scope the instant to the thread
+            event['s'] = 't'
+        if args is not None:
+            event['args'] = args
+
+        with self._eventsLock:
+            self.events.append(event)
+
+    def onAcquired(self, lockObj, timestamp, waitTime):
+        self._addEvent('X', 'wait ' + lockObj.name, timestamp - waitTime, waitTime, { 'acquired' : True })
+
+    def onTimeout(self, lockObj, timestamp, waitTime):
+        self._addEvent('X', 'wait ' + lockObj.name, timestamp - waitTime, waitTime, { 'acquired' : False })
+        self._addEvent('i', 'timeout ' + lockObj.name, timestamp)
+
+    def onAcquireError(self, lockObj, timestamp, waitTime, error):
+        self._addEvent('X', 'wait ' + lockObj.name, timestamp - waitTime, waitTime, { 'acquired' : False, 'error' : type(error).__name__ })
+        self._addEvent('i', 'error ' + lockObj.name, timestamp, args={ 'error' : str(error) })
+
+    def onRelease(self, lockObj, timestamp, holdTime):
+        if holdTime is not None:
+            self._addEvent('X', 'hold ' + lockObj.name, timestamp - holdTime, holdTime)
+
+    def onExpiredSteal(self, lockObj, timestamp):
+        self._addEvent('i', 'expired steal ' + lockObj.name, timestamp)
+
+    def onLost(self, lockObj, timestamp):
+        self._addEvent('i', 'lost ' + lockObj.name, timestamp)
+
+    def getTrace(self):
+        '''
+            getTrace - Get the recorded events as a trace object
+
+            @return dict - { "traceEvents" : [ ... ] , "displayTimeUnit" : "ms" }
+        '''
+        with self._eventsLock:
+            events = list(self.events)
+
+        return { 'traceEvents' : events, 'displayTimeUnit' : 'ms' }
+
+    def save(self, outputPath=None):
+        '''
+            save - Write the recorded events as trace JSON
+
+            @param outputPath <None/str> default None - Path to write, or None to use the outputPath given at construction
+        '''
+        if outputPath is None:
+            outputPath = self.outputPath
+            if outputPath is None:
+                raise ValueError('No outputPath given to ChromeTraceHooks.save, and none set at construction.')
+
+        with open(outputPath, 'wt') as f:
+            json.dump(self.getTrace(), f)
+
+    def clear(self):
+        '''
+            clear - Discard all recorded events
+        '''
+        with self._eventsLock:
+            self.events = []
+
+
+# vim: set ts=4 sw=4 expandtab :
@@ -0,0 +1,237 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    WaitGraph - A cross-process wait-for graph of NamedAtomicLock holders and waiters, used for deadlock detection.
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+import errno
+import os
+import tempfile
+import threading
+
+from . import _isPidAlive
+
+__all__ = ('WaitGraph', 'DeadlockError', 'getWaitGraph', 'WAIT_GRAPH_DIR_NAME')
+
+# Name of the directory within lockDir which holds the wait-for graph records. Do not use this as a lock name.
+WAIT_GRAPH_DIR_NAME = '.NamedAtomicLock_waitGraph'
+
+
+class DeadlockError(Exception):
+    '''
+        DeadlockError - Raised from NamedAtomicLock.acquire (with detectDeadlocks=True) when waiting would deadlock.
+
+            Only one waiter in a deadlock cycle gets this error. It should release the locks it holds, so the others can proceed.
+
+            The "cycle" attribute is a list of ( holder, lockName ) tuples, where "holder" is "pid:threadIdent",
+              and each holder waits for the lock held by the next.
+    '''
+
+    def __init__(self, msg, cycle):
+        Exception.__init__(self, msg)
+        self.cycle = cycle
+
+
+def _getMyNode():
+    return '%d:%d' %(os.getpid(), threading.current_thread().ident)
+
+
+def _isNodeAlive(node):
+    return _isPidAlive(int(node.split(':', 1)[0]))
+
+
+class WaitGraph(object):
+    '''
+        WaitGraph - The wait-for graph for a lock directory.
+
+            Records are files within #lockDir/WAIT_GRAPH_DIR_NAME :
+
+                hold.<lockName>      - Contains the holder ( "pid:threadIdent" ) of lockName
+
+                wait.<pid>.<thread>  - Contains the name of the lock that thread is waiting on
+
+            Records left behind by dead processes are ignored.
+    '''
+
+    def __init__(self, lockDir):
+        '''
+            __init__ - Create a WaitGraph. You probably want getWaitGraph instead, which shares one per lockDir.
+
+            @param lockDir <str> - The lock directory
+        '''
+        self.lockDir = lockDir
+        self.graphDir = lockDir + os.sep + WAIT_GRAPH_DIR_NAME
+
+        try:
+            os.mkdir(self.graphDir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _writeRecord(self, recordName, contents):
+        (fd, tempPath) = tempfile.mkstemp(prefix='.tmp_', dir=self.graphDir)
+        try:
+            os.write(fd, contents.encode('utf-8'))
+        finally:
+            os.close(fd)
+        os.rename(tempPath, self.graphDir + os.sep + recordName)
+
+    def _readRecord(self, recordName):
+        try:
+            with open(self.graphDir + os.sep + recordName, 'rb') as f:
+                return f.read().decode('utf-8')
+        except (IOError, OSError):
+            return None
+
+    def _removeRecord(self, recordName):
+        try:
+            os.remove(self.graphDir + os.sep + recordName)
+        except OSError:
+            pass
+
+    def setHolder(self, lockName):
+        '''
+            setHolder - Record that the current thread holds #lockName
+        '''
+        self._writeRecord('hold.' + lockName, _getMyNode())
+
+    def clearHolder(self, lockName, force=False):
+        '''
+            clearHolder - Remove the holder record for #lockName, if it is ours
+
+            @param force <bool> default False - If True, remove the record even if it is not ours ( like on a forced release )
+        '''
+        if force or self._readRecord('hold.' + lockName) == _getMyNode():
+            self._removeRecord('hold.' + lockName)
+
+    def setWaiting(self, lockName):
+        '''
+            setWaiting - Record that the current thread is waiting on #lockName
+        '''
+        self._writeRecord('wait.' + _getMyNode().replace(':', '.'), lockName)
+
+    def clearWaiting(self):
+        '''
+            clearWaiting - Remove the record that the current thread is waiting on a lock
+        '''
+        self._removeRecord('wait.' + _getMyNode().replace(':', '.'))
+
+    def getHolder(self, lockName):
+        '''
+            getHolder - Get the live holder of #lockName
+
+            @return <None/str> - "pid:threadIdent" of the holder, or None if not held (or the holder is dead)
+        '''
+        holder = self._readRecord('hold.' + lockName)
+        if not holder or not _isNodeAlive(holder):
+            return None
+        return holder
+
+    def getWaiters(self):
+        '''
+            getWaiters - Get all live waiters
+
+            @return dict<str, str> - Map of waiter ( "pid:threadIdent" ) to the lock name it waits on
+        '''
+        waiters = {}
+        for recordName in os.listdir(self.graphDir):
+            if not recordName.startswith('wait.'):
+                continue
+
+            node = recordName[len('wait.'):].replace('.', ':', 1)
+            if not _isNodeAlive(node):
+                continue
+
+            lockName = self._readRecord(recordName)
+            if lockName:
+                waiters[node] = lockName
+
+        return waiters
+
+    def findCycle(self, lockName, node=None):
+        '''
+            findCycle - Find a cycle in the wait-for graph, starting from #node waiting on #lockName
+
+            @param lockName <str> - The lock #node is waiting on
+
+            @param node <None/str> - The waiter, default is the current thread
+
+            @return <None/list> - None if no cycle, otherwise list of ( holder, lockName ) starting with ( #node, #lockName )
+        '''
+        if node is None:
+            node = _getMyNode()
+
+        waiters = self.getWaiters()
+
+        path = [ (node, lockName) ]
+        seen = set( [node] )
+        while True:
+            holder = self.getHolder(path[-1][1])
+            if holder is None:
+                return None
+
+            if holder == node:
+                return path
+
+            if holder in seen:
+                # A cycle which does not involve us. Its own members will deal with it.
+                return None
+
+            # A thread waits on one lock at a time, so each holder has at most one outgoing edge
+            nextLockName = waiters.get(holder, None)
+            if nextLockName is None:
+                return None
+
+            seen.add(holder)
+            path.append( (holder, nextLockName) )
+
+    def checkDeadlock(self, lockName):
+        '''
+            checkDeadlock - Check if the current thread, waiting on #lockName, is part of a deadlock cycle.
+
+                Every member of the cycle finds the same cycle, so only one of them (the "greatest" holder) is chosen as the victim.
+
+            @param lockName <str> - The lock the current thread is waiting on
+
+            @raises DeadlockError - If there is a cycle and we are the chosen victim
+        '''
+        cycle = self.findCycle(lockName)
+        if not cycle:
+            return
+
+        myNode = cycle[0][0]
+
+        victim = max( [ tuple(int(x) for x in holder.split(':')) for (holder, cycleLockName) in cycle ] )
+        if '%d:%d' %victim != myNode:
+            return
+
+        raise DeadlockError('Deadlock detected waiting on lock "%s": %s' %(lockName,
+            ' -> '.join([ '%s waits for "%s"' %(holder, cycleLockName) for (holder, cycleLockName) in cycle ]) ),
+            cycle,
+        )
+
+
+_waitGraphs = {}
+
+def getWaitGraph(lockDir):
+    '''
+        getWaitGraph - Get the shared WaitGraph for a lock directory
+
+        @param lockDir <str> - The lock directory
+
+        @return <WaitGraph> - The wait graph for #lockDir
+    '''
+    try:
+        return _waitGraphs[lockDir]
+    except KeyError:
+        waitGraph = _waitGraphs[lockDir] = WaitGraph(lockDir)
+        return waitGraph
+
+
+# vim: set ts=4 sw=4 expandtab :
@@ -0,0 +1,220 @@
+'''
+    Copyright (c) 2016, 2017 Timothy Savannah All Rights Reserved under terms of LGPLv3.
+    You should have received a copy of this as LICENSE with the source distribution, or it is always available at
+    http://www.gnu.org/licenses/lgpl-3.0.en.html
+
+    See https://github.com/kata198/NamedAtomicLock for latest version
+
+    Watchdog - Catch holders which keep a NamedAtomicLock longer than their budget
+
+'''
+# vim: set ts=4 sw=4 expandtab :
+
+import ctypes
+import sys
+import threading
+import traceback
+
+from . import _monotonic
+
+__all__ = ('HoldWatchdog', 'HoldBudgetExceeded')
+
+
+class HoldBudgetExceeded(Exception):
+    '''
+        HoldBudgetExceeded - Raised into a holder's thread by HoldWatchdog ( with raiseInHolder=True ) when it holds a lock past its budget
+    '''
+    pass
+
+
+def _raiseInThread(threadIdent, exceptionType):
+    '''
+        _raiseInThread - Raise @exceptionType asynchronously in the thread with ident @threadIdent.
+            It is raised the next time that thread runs python code, so not while it is blocked in a system call ( like a sleep ).
+
+        @return <bool> - True if the thread was found
+    '''
+    numThreads = ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(threadIdent), ctypes.py_object(exceptionType))
+    if numThreads > 1:
+        # Should never happen, but undo it if it does
+        ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(threadIdent), None)
+        return False
+
+    return bool(numThreads == 1)
+
+
+class _WatchEntry(object):
+
+    __slots__ = ('lockObj', 'heldSince', 'deadline', 'callback', 'raiseInHolder', 'autoRelease', 'holderThread')
+
+    def __init__(self, lockObj, heldSince, deadline, callback, raiseInHolder, autoRelease, holderThread):
+        self.lockObj = lockObj
+        self.heldSince = heldSince
+        self.deadline = deadline
+        self.callback = callback
+        self.raiseInHolder = raiseInHolder
+        self.autoRelease = autoRelease
+        self.holderThread = holderThread
+
+
+class HoldWatchdog(object):
+    '''
+        HoldWatchdog - Watches held locks from a background thread, and acts when one is held longer than its budget.
+
+            Call "watch" right after acquiring a lock. The watch covers that one hold, and ends when the lock is released
+              ( or lost ). If the hold runs past its budget, in order:
+
+                * callback(lockObj, holdTime) is called ( in the watchdog thread )
+                * If autoRelease, the lock is released, so waiters get it back without waiting out maxLockAge.
+                    The holder's own release will then return False, as for a lock lost to maxLockAge.
+                * If raiseInHolder, HoldBudgetExceeded is raised in the holder's thread
+
+            Hold time is measured on the monotonic clock from when the lock was acquired, and is not reset by "refresh",
+              so a runaway holder is caught even if it keeps its lock alive with a heartbeat.
+
+            One watchdog may watch any number of locks, from any number of threads.
+    '''
+
+    def __init__(self, name='HoldWatchdog'):
+        '''
+            __init__ - Create a HoldWatchdog. The background thread starts on the first "watch".
+
+            @param name <str> default 'HoldWatchdog' - Name of the background thread
+        '''
+        self.name = name
+
+        self._entries = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def watch(self, lockObj, budget, callback=None, raiseInHolder=False, autoRelease=False, holderThread=None):
+        '''
+            watch - Watch the current hold of a lock
+
+            @param lockObj <NamedAtomicLock> - A lock we hold
+
+            @param budget <float> - Number of seconds ( since acquire ) the lock may be held before we act
+
+            @param callback <None/function> - Called as callback(lockObj, holdTime) when the budget is exceeded
+
+            @param raiseInHolder <bool> default False - If True, raise HoldBudgetExceeded in the holder's thread when the budget is exceeded
+
+            @param autoRelease <bool> default False - If True, release the lock when the budget is exceeded.
+                Choose a budget less than maxLockAge, so waiters get the lock sooner than they would by expiry.
+
+            @param holderThread <None/threading.Thread> default None - Thread to raise into. Default is the thread calling "watch"
+
+            @raises ValueError - If we do not hold #lockObj
+        '''
+        heldSince = lockObj._heldSince
+        if not lockObj.held or heldSince is None:
+            raise ValueError('Cannot watch lock "%s", as it is not held.' %(lockObj.name, ))
+
+        if holderThread is None:
+            holderThread = threading.current_thread()
+
+        entry = _WatchEntry(lockObj, heldSince, heldSince + budget, callback, raiseInHolder, autoRelease, holderThread.ident)
+
+        with self._condition:
+            self._entries[id(lockObj)] = entry
+
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name=self.name)
+                self._thread.daemon = True
+                self._thread.start()
+
+            self._condition.notify()
+
+    def unwatch(self, lockObj):
+        '''
+            unwatch - Stop watching a lock. Watches also end on their own when the lock is released.
+
+            @return <bool> - True if the lock was being watched
+        '''
+        with self._condition:
+            return self._entries.pop(id(lockObj), None) is not None
+
+    def stop(self, timeout=None):
+        '''
+            stop - Stop watching all locks, and stop the background thread
+
+            @param timeout <None/float> - Max number of seconds to wait for the background thread to exit
+        '''
+        with self._condition:
+            self._entries.clear()
+            self._stopping = True
+            self._condition.notify()
+            thread = self._thread
+            self._thread = None
+
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        '''
+            _run - Background thread. Sleep until the nearest deadline, and act on any holds past their budget.
+        '''
+        while True:
+            expiredEntries = []
+
+            with self._condition:
+                if self._stopping:
+                    return
+
+                now = _monotonic()
+                nextDeadline = None
+
+                for (key, entry) in list(self._entries.items()):
+                    lockObj = entry.lockObj
+                    if not lockObj.held or lockObj._heldSince != entry.heldSince:
+                        # Released ( or released and acquired again ) since we started watching
+                        del self._entries[key]
+                    elif now >= entry.deadline:
+                        del self._entries[key]
+                        expiredEntries.append(entry)
+                    elif nextDeadline is None or entry.deadline < nextDeadline:
+                        nextDeadline = entry.deadline
+
+                if not expiredEntries:
+                    if nextDeadline is None:
+                        self._condition.wait()
+                    else:
+                        self._condition.wait(nextDeadline - now)
+                    continue
+
+            # Act outside of our lock, so callbacks may call watch/unwatch
+            for entry in expiredEntries:
+                self._onBudgetExceeded(entry)
+
+    def _onBudgetExceeded(self, entry):
+        lockObj = entry.lockObj
+        if not lockObj.held or lockObj._heldSince != entry.heldSince:
+            # Released just as the budget ran out
+            return
+
+        holdTime = _monotonic() - entry.heldSince
+
+        if entry.callback is not None:
+            try:
+                entry.callback(lockObj, holdTime)
+            except Exception:
+                sys.stderr.write('HoldWatchdog: Exception in callback for lock "%s":\n%s\n' %(lockObj.name, traceback.format_exc()))
+
+        # Check again under the lock's state lock, as the holder may have released during the callback. Each step acts only on the
+        #  hold we were watching, and never races the holder's own release ( which could otherwise remove a waiter's freshly taken lock ).
+        with lockObj._stateLock:
+            isStillHeld = bool(lockObj.held and lockObj._heldSince == entry.heldSince)
+
+            if isStillHeld and entry.autoRelease is True:
+                try:
+                    lockObj.release()
+                except Exception:
+                    sys.stderr.write('HoldWatchdog: Exception releasing lock "%s":\n%s\n' %(lockObj.name, traceback.format_exc()))
+
+            if isStillHeld and entry.raiseInHolder is True:
+                _raiseInThread(entry.holderThread, HoldBudgetExceeded)
+
+
+# vim: set ts=4 sw=4 expandtab :
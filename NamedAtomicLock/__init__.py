@@ -11,12 +11,44 @@
 # vim: set ts=4 sw=4 expandtab :
 
 
+import errno
+import hashlib
 import os
+import random
+import struct
+import sys
 import tempfile
+import threading
 import time
 
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows. Fencing tokens are then only unique while the lock's mutual exclusion holds.
+    fcntl = None
+
+
+def _isPidAlive(pid):
+    '''
+        _isPidAlive - Check if a process exists on this host
+
+        NOTE: Defined before the submodule imports below, as some of them use it.
+    '''
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        # EPERM means it exists, but belongs to someone else
+        return bool(e.errno == errno.EPERM)
+    return True
+
 
-__all__ = ('NamedAtomicLock',)
+from .WaitGraph import WaitGraph, DeadlockError, getWaitGraph, WAIT_GRAPH_DIR_NAME
+from .Priority import PriorityWaiter
+from .Cleanup import getHeldLocks, releaseAllHeldLocks, setExitCleanup, enableSignalCleanup, _registerHeldLock, _unregisterHeldLock
+from .Tracing import LockHooks, ChromeTraceHooks
+
+
+__all__ = ('NamedAtomicLock', 'DeadlockError', 'getHeldLocks', 'releaseAllHeldLocks', 'setExitCleanup', 'enableSignalCleanup', 'SingleFlightCache', 'singleFlight', 'StripedNamedAtomicLock', 'LeaderElector', 'NamedLockExecutor', 'LockSet', 'acquireAny', 'NamedLockPool', 'NamedBarrier', 'NamedEvent', 'NamedRateLimiter', 'LockHooks', 'ChromeTraceHooks', 'HoldWatchdog', 'HoldBudgetExceeded', 'queryLocks', 'LockStatus')
 
 __version__ = '1.1.3'
 
@@ -24,14 +56,398 @@ __version_tuple__ = (1, 1, 3)
 
 DEFAULT_POLL_TIME = .1
 
+# Number of hex characters of the name digest used for each shard level. 2 means 256 subdirectories per level.
+SHARD_WIDTH = 2
+
 try:
     FileNotFoundError
 except:
     FileNotFoundError = OSError
 
+# Seconds between re-measuring the offset between the local clock and a filesystem's clock ( see FilesystemClock )
+FILESYSTEM_CLOCK_REFRESH = 30.0
+
+# Prefix of the short-lived probe files created within lockDir to read the filesystem's clock. Do not start lock names with this.
+FILESYSTEM_CLOCK_PROBE_NAME = '.NamedAtomicLock_clockProbe'
+
+# Suffix added to lockPath for the wait area directory used by acquire with a priority
+PRIORITY_WAITERS_SUFFIX = '.waiters'
+
+# Effective priority a waiter gains per second of waiting, so low priority waiters still get the lock eventually ( see acquire )
+PRIORITY_AGING_RATE = 1.0
+
+# Suffix added to lockPath for the file holding a lock's hold time statistics ( see "adaptivePoll" option of NamedAtomicLock )
+ADAPTIVE_STATS_SUFFIX = '.stats'
+
+# Layout of the hold time statistics file: average hold time in seconds <double>, number of holds recorded <uint32>
+ADAPTIVE_STATS_STRUCT = struct.Struct('<dI')
+
+# Weight of the newest hold time in the moving average
+ADAPTIVE_AVERAGE_WEIGHT = .2
+
+# Bounds on an adaptive poll interval, in seconds
+ADAPTIVE_MIN_POLL = .001
+ADAPTIVE_MAX_POLL = 1.0
+
+# Adaptive poll intervals are randomly varied by up to this fraction, so waiters do not all wake at once
+ADAPTIVE_JITTER = .1
+
+# Suffix added to lockPath for the file holding a lock's fencing token ( see "fencing" option of NamedAtomicLock )
+FENCING_TOKEN_SUFFIX = '.fence'
+
+# Suffix added to fencePath for the file locked ( with flock ) while issuing a fencing token
+FENCING_LOCK_SUFFIX = '.lock'
+
+# Pass as "lockDir" to NamedAtomicLock to use the fastest local lock directory. See getFastestLockDir
+FASTEST_LOCK_DIR = object()
+
+# Filesystem types which are memory-backed (no disk metadata I/O on mkdir/rmdir)
+MEMORY_FILESYSTEM_TYPES = ('tmpfs', 'ramfs')
+
+_monotonic = getattr(time, 'monotonic', time.time)
+
+# Errors from mkdir meaning the lock directory is full. These are raised from acquire, rather than waited out like contention.
+_NO_SPACE_ERRNOS = (errno.ENOSPC, getattr(errno, 'EDQUOT', errno.ENOSPC))
+
+# Average hold times recorded by this process, lockPath -> average seconds
+_localHoldTimes = {}
+
+# Shard directories we have already created (or seen), so acquire doesn't pay for an extra mkdir every time
+_knownShardDirs = set()
+
+
+def _nameDigest(name):
+    '''
+        _nameDigest - Get a stable (across processes and runs) hex digest of a lock name or key
+
+        @param name <str> - The name to hash
+
+        @return <str> - Hex digest
+    '''
+    if not isinstance(name, bytes):
+        name = str(name).encode('utf-8')
+    return hashlib.md5(name).hexdigest()
+
+
+def getShardDir(name, lockDir, shardLevels):
+    '''
+        getShardDir - Get the directory which would contain the lock #name when using a sharded layout.
+
+        @param name <str> - The lock name
+
+        @param lockDir <str> - The base lock directory
+
+        @param shardLevels <int> - Number of levels of hash-bucketed subdirectories. 0 means no sharding (returns lockDir)
+
+        @return <str> - The directory in which the lock directory for #name is created
+    '''
+    if not shardLevels:
+        return lockDir
+
+    digest = _nameDigest(name)
+
+    return os.sep.join( [lockDir] + [ digest[i * SHARD_WIDTH : (i+1) * SHARD_WIDTH] for i in range(shardLevels) ] )
+
+
+def _ensureShardDir(shardDir):
+    '''
+        _ensureShardDir - Make sure a shard directory exists, creating it (and parents) if we haven't seen it yet.
+    '''
+    if shardDir in _knownShardDirs:
+        return
+
+    try:
+        os.makedirs(shardDir)
+    except OSError as e:
+        # Someone else may have created it between our check and makedirs
+        if e.errno != errno.EEXIST:
+            raise
+
+    _knownShardDirs.add(shardDir)
+
+
+def _tryMakeLockDir(lockPath, shardDir, shardLevels, isExpired, onExpiredSteal=None):
+    '''
+        _tryMakeLockDir - Make a single non-blocking attempt to create a lock directory, taking it over if it has expired.
+            Shared by NamedAtomicLock and LockSet, so both treat every case the same way.
+
+        @param lockPath <str> - The lock directory to create
+
+        @param shardDir <str> - The directory containing #lockPath
+
+        @param shardLevels <int> - Sharded layout of lockDir. If nonzero, a removed #shardDir is recreated
+
+        @param isExpired <function> - Called as isExpired() when the lock exists, returns True if it is past maxLockAge
+
+        @param onExpiredSteal <None/function> - Called as onExpiredSteal() after we remove an expired lock
+
+        @return <bool> - True if we created the lock directory, otherwise False
+
+        @raises OSError - If lockDir is out of space or inodes ( ENOSPC / EDQUOT ), rather than treating that as contention
+    '''
+    try:
+        os.mkdir(lockPath)
+        return True
+    except OSError as e:
+        if e.errno in _NO_SPACE_ERRNOS:
+            raise
+
+        if e.errno == errno.ENOENT and shardLevels:
+            # Our shard directory was removed out from under us, forget it and recreate.
+            _knownShardDirs.discard(shardDir)
+            _ensureShardDir(shardDir)
+            try:
+                os.mkdir(lockPath)
+                return True
+            except OSError:
+                return False
+
+    if not isExpired():
+        return False
+
+    try:
+        os.rmdir(lockPath)
+    except OSError:
+        # If we did not remove the lock, someone else is at the same point and contending. Let them win.
+        return False
+
+    if onExpiredSteal is not None:
+        onExpiredSteal()
+
+    try:
+        os.mkdir(lockPath)
+        return True
+    except OSError:
+        return False
+
+
+def _resolveLockDir(lockDir, mustBeWritable=True):
+    '''
+        _resolveLockDir - Resolve and validate a "lockDir" argument, as taken by NamedAtomicLock and everything built on it.
+
+            None means tempfile.gettempdir(), FASTEST_LOCK_DIR means getFastestLockDir(), and a trailing separator is removed.
+
+        @param lockDir <None/str/FASTEST_LOCK_DIR> - The lockDir argument
+
+        @param mustBeWritable <bool> default True - If True, also require that we can write to the directory
+
+        @return <str> - The directory
+
+        @raises ValueError - If the directory does not exist, or #mustBeWritable and we cannot write to it
+    '''
+    if lockDir is FASTEST_LOCK_DIR:
+        lockDir = getFastestLockDir()
+    elif lockDir:
+        if lockDir[-1] == os.sep:
+            lockDir = lockDir[:-1]
+            if not lockDir:
+                raise ValueError('lockDir cannot be ' + os.sep)
+    else:
+        lockDir = tempfile.gettempdir()
+
+    if not os.path.isdir(lockDir):
+        raise ValueError('lockDir %s either does not exist or is not a directory.' %(lockDir,))
+
+    if mustBeWritable and not os.access(lockDir, os.W_OK):
+        raise ValueError('Cannot write to lock directory: %s' %(lockDir,))
+
+    return lockDir
+
+
+def _getMountFsType(path, mountsFile='/proc/mounts'):
+    '''
+        _getMountFsType - Get the filesystem type of the mount containing #path
+
+        @param path <str> - A path
+
+        @return <None/str> - The filesystem type (like "tmpfs"), or None if it could not be determined
+    '''
+    path = os.path.realpath(path)
+
+    try:
+        with open(mountsFile, 'rt') as f:
+            mountLines = f.readlines()
+    except (IOError, OSError):
+        return None
+
+    bestMountPoint = None
+    bestFsType = None
+    for line in mountLines:
+        lineSplit = line.split()
+        if len(lineSplit) < 3:
+            continue
+
+        # Spaces and such in mount points are octal-escaped in /proc/mounts
+        mountPoint = lineSplit[1].replace('\\040', ' ').replace('\\011', '\t')
+        if mountPoint != os.sep and not (path == mountPoint or path.startswith(mountPoint + os.sep)):
+            continue
+
+        # Longest matching mount point wins. Later entries with the same mount point are mounted over earlier ones.
+        if bestMountPoint is None or len(mountPoint) >= len(bestMountPoint):
+            bestMountPoint = mountPoint
+            bestFsType = lineSplit[2]
+
+    return bestFsType
+
+
+def _isUsableFastDir(path):
+    '''
+        _isUsableFastDir - Check if #path is a writable, memory-backed directory
+
+            Only checks properties which do not change from moment to moment ( type, permissions, read-only mount ), so every process
+              picks the same directory. A directory which is out of space or inodes must fail on acquire, not send some processes elsewhere.
+    '''
+    if not path or not os.path.isdir(path) or not os.access(path, os.W_OK | os.X_OK):
+        return False
+
+    if _getMountFsType(path) not in MEMORY_FILESYSTEM_TYPES:
+        return False
+
+    try:
+        vfsStat = os.statvfs(path)
+    except (AttributeError, OSError):
+        return True
+
+    if vfsStat.f_flag & getattr(os, 'ST_RDONLY', 1):
+        return False
+
+    return True
+
+
+_fastestLockDir = None
+
+def getFastestLockDir(refresh=False):
+    '''
+        getFastestLockDir - Get the fastest local directory to hold locks.
+
+            Prefers a memory-backed (tmpfs) directory, so that acquire/release do not cause journaled metadata writes to disk.
+
+            Checks, in order: /dev/shm , $XDG_RUNTIME_DIR . Each is used only if it is a writable tmpfs (as per /proc/mounts).
+            If none qualify, falls back to tempfile.gettempdir() ( the default lockDir ).
+
+            The result is cached for the life of the process.
+
+            NOTE: $XDG_RUNTIME_DIR is private to the current user. Locks shared between users should specify a lockDir explicitly.
+
+        @param refresh <bool> default False - If True, ignore the cached result and check again
+
+        @return <str> - The chosen directory
+    '''
+    global _fastestLockDir
+
+    if _fastestLockDir is not None and not refresh:
+        return _fastestLockDir
+
+    candidates = [ '/dev/shm', os.environ.get('XDG_RUNTIME_DIR', None) ]
+
+    chosenDir = None
+    for candidate in candidates:
+        if _isUsableFastDir(candidate):
+            chosenDir = candidate
+            break
+    else:
+        chosenDir = tempfile.gettempdir()
+
+    _fastestLockDir = chosenDir
+    return chosenDir
+
+
+class FilesystemClock(object):
+    '''
+        FilesystemClock - Measures "now" as seen by the filesystem holding a directory, rather than the local clock.
+
+            Lock expiration compares a lock directory's mtime, which is set by the filesystem (the server, for network filesystems),
+              against "now". Using the filesystem's notion of "now" keeps expiry decisions consistent across all hosts sharing the directory,
+              even when their local clocks are skewed.
+
+            The offset between the local clock and the filesystem clock is measured by creating a probe file of our own and reading back its mtime,
+              and is cached and re-measured every #refreshInterval seconds. Each process creates ( and removes ) its own probe file,
+              so this works in directories shared between users.
+
+            If the offset cannot be measured ( like a directory we cannot write to ), the last offset is kept, or the local clock is used
+              if there is none, and measurement is retried after #refreshInterval.
+    '''
+
+    def __init__(self, directory, refreshInterval=FILESYSTEM_CLOCK_REFRESH):
+        '''
+            __init__ - Create a FilesystemClock. You probably want getFilesystemClock instead, which shares one per directory.
+
+            @param directory <str> - The directory whose filesystem clock to use
+
+            @param refreshInterval <float> - Number of seconds after which the offset is re-measured
+        '''
+        self.directory = directory
+        self.refreshInterval = refreshInterval
+
+        self.offset = None
+        self.measuredAt = None
+
+    def measure(self):
+        '''
+            measure - Measure the offset between the local clock and the filesystem clock now.
+
+            @return <float> - The offset, in seconds, to add to the local time to get filesystem time
+
+            @raises OSError - If we cannot create a probe file in the directory
+        '''
+        before = time.time()
+
+        # A newly created file's mtime is "now" as determined by the filesystem (on NFS, the server time)
+        (fd, probePath) = tempfile.mkstemp(prefix=FILESYSTEM_CLOCK_PROBE_NAME + '.', dir=self.directory)
+        try:
+            mtime = os.fstat(fd).st_mtime
+        finally:
+            os.close(fd)
+            try:
+                os.unlink(probePath)
+            except OSError:
+                pass
+
+        after = time.time()
+
+        self.offset = mtime - ( (before + after) / 2.0 )
+        self.measuredAt = _monotonic()
+
+        return self.offset
+
+    def now(self):
+        '''
+            now - Get the current time according to the filesystem
+
+            @return <float> - Current filesystem time, as a unix timestamp
+        '''
+        if self.offset is None or _monotonic() - self.measuredAt >= self.refreshInterval:
+            try:
+                self.measure()
+            except OSError:
+                # Keep the last offset ( or use the local clock ), and try again after refreshInterval
+                if self.offset is None:
+                    self.offset = 0.0
+                self.measuredAt = _monotonic()
+
+        return time.time() + self.offset
+
+
+_filesystemClocks = {}
+
+def getFilesystemClock(directory):
+    '''
+        getFilesystemClock - Get the shared FilesystemClock for a directory
+
+        @param directory <str> - The directory
+
+        @return <FilesystemClock> - The clock for #directory
+    '''
+    try:
+        return _filesystemClocks[directory]
+    except KeyError:
+        clock = _filesystemClocks[directory] = FilesystemClock(directory)
+        return clock
+
+
 class NamedAtomicLock(object):
 
-    def __init__(self, name, lockDir=None, maxLockAge=None):
+    def __init__(self, name, lockDir=None, maxLockAge=None, shardLevels=0, useFilesystemClock=False, detectDeadlocks=False, fencing=False, adaptivePoll=False, hooks=None):
         '''
             NamedAtomicLock - Create a NamedAtomicLock.
                 This uses a named directory, which is defined by POSIX as an atomic operation.
@@ -39,92 +455,414 @@ class NamedAtomicLock(object):
             @param name <str> - The lock name, Cannot contain directory seperator (like '/')
 
             @param lockDir <None/str> - Directory in which to store locks. Defaults to tempdir
+                Pass FASTEST_LOCK_DIR to use the fastest local directory, as chosen by getFastestLockDir(). The chosen directory is available as "lockDir" attribute.
 
             @param maxLockAge <None/float> - Maximum number of seconds lock can be held before it is considered "too old" and fair game to be taken.
                 You should likely define this as a reasonable number, maybe 4x as long as you think the operation will take, so that the lock doesn't get
                 held by a dead process.
 
+            @param shardLevels <int> default 0 - If > 0, the lock is not created directly within #lockDir, but under #shardLevels levels of
+                subdirectories chosen by hashing the name ( each level has 16 ** SHARD_WIDTH = 256 buckets ). Use this when a very large number
+                of distinct lock names share one lockDir. All users of a given lock must use the same shardLevels.
+                The shard directories are created lazily on first acquire, and are not removed.
+
+            @param useFilesystemClock <bool> default False - If True, lock age (for maxLockAge) is measured against the clock of the filesystem
+                holding lockDir ( see FilesystemClock ), rather than the local clock. Use this when lockDir is shared between hosts (like NFS),
+                so that a host with a skewed clock does not steal live locks early or wait on dead ones too long.
+
+            @param detectDeadlocks <bool> default False - If True, holders and waiters record themselves in a wait-for graph within lockDir
+                ( see WaitGraph ), and acquire raises DeadlockError instead of waiting when waiting would deadlock.
+                Only one waiter in a deadlock cycle gets the error, and it should release the locks it holds.
+                All users of locks which may be involved in a deadlock should use this.
+
+            @param fencing <bool> default False - If True, every successful acquire increments a fencing token stored beside the lock
+                ( lockPath + FENCING_TOKEN_SUFFIX ), and sets it as the "fencingToken" attribute. Tokens for a lock name strictly increase,
+                even when a paused holder and the one which took over its expired lock both issue at once ( they are serialized with flock ), so storage downstream can reject writes carrying a token older than the newest it has seen, like from a holder whose lock
+                expired and was taken over while it was paused.
+
+            @param adaptivePoll <bool> default False - If True, each release records how long the lock was held, as a moving average kept
+                in this process and in a small shared file beside the lock ( lockPath + ADAPTIVE_STATS_SUFFIX ). While waiting, we sleep about
+                as long as the current holder is expected to keep the lock ( with +/- ADAPTIVE_JITTER ), rather than a fixed poll interval.
+                This polls less on long-held locks, and wakes sooner on short-held ones.
+
+            @param hooks <None/LockHooks> default None - If provided, an object ( see NamedAtomicLock.Tracing.LockHooks ) whose methods are called
+                on acquire start, acquired, timeout, release, taking over an expired lock, and finding our lock was lost, with the time of each
+                and the wait or hold duration. Use ChromeTraceHooks to record these as spans viewable in a trace viewer.
+                When None, the only cost is a check per event.
+
         '''
         self.name = name
         self.maxLockAge = maxLockAge
 
+        if shardLevels < 0 or shardLevels * SHARD_WIDTH > 32:
+            raise ValueError('shardLevels must be between 0 and %d' %(32 // SHARD_WIDTH, ))
+        self.shardLevels = shardLevels
+
         if os.sep in name:
             raise ValueError('Name cannot contain "%s"' %(os.sep,))
 
-        if lockDir:
-            if lockDir[-1] == os.sep:
-                lockDir = lockDir[:-1]
-                if not lockDir:
-                    raise ValueError('lockDir cannot be ' + os.sep)
+        self.lockDir = lockDir = _resolveLockDir(lockDir)
+
+        self.shardDir = getShardDir(name, lockDir, shardLevels)
+        self.lockPath = self.shardDir + os.sep + name
+
+        if useFilesystemClock:
+            self.filesystemClock = getFilesystemClock(lockDir)
         else:
-            lockDir = tempfile.gettempdir()
+            self.filesystemClock = None
 
-        self.lockDir = lockDir
+        self.fencing = fencing
+        self.fencingToken = None
 
-        if not os.path.isdir(lockDir):
-            raise ValueError('lockDir %s either does not exist or is not a directory.' %(lockDir,))
+        self.adaptivePoll = adaptivePoll
+        self._heldSince = None
+
+        self.hooks = hooks
+
+        if detectDeadlocks:
+            self.waitGraph = getWaitGraph(lockDir)
+        else:
+            self.waitGraph = None
 
-        if not os.access(lockDir, os.W_OK):
-            raise ValueError('Cannot write to lock directory: %s' %(lockDir,))
-        self.lockPath = lockDir + os.sep + name
-        
         self.held = False
         self.acquiredAt = None
 
-    def acquire(self, timeout=None):
+        # Guards held/acquiredAt changes in release, refresh and hasLock, which may be called from another thread ( like a HoldWatchdog's )
+        #  while the holder is in them. Reentrant, as hooks and signal cleanup may release from within them.
+        self._stateLock = threading.RLock()
+
+    def _getNow(self):
+        '''
+            _getNow - Get the current time used for expiration checks, either local or filesystem time ( see useFilesystemClock )
+
+            @return <float> - Current time as unix timestamp
+        '''
+        if self.filesystemClock is not None:
+            return self.filesystemClock.now()
+        return time.time()
+
+    def acquire(self, timeout=None, priority=None):
         '''
             acquire - Acquire given lock. Can be blocking or nonblocking by providing a timeout.
               Returns "True" if you got the lock, otherwise "False"
 
             @param timeout <None/float> - Max number of seconds to wait, or None to block until we can acquire it.
+                A timeout of 0 makes a single non-blocking attempt.
+
+                The deadline is measured on the monotonic clock, so it is not affected by changes to the wall clock,
+                  and the final sleep is clamped so we never wait past the deadline.
+
+            @param priority <None/float> - If provided, we register as a waiter with this priority in a wait area beside the lock
+                ( lockPath + PRIORITY_WAITERS_SUFFIX ), and hold back while another waiter with a higher effective priority is waiting.
+                Higher goes first. Effective priority grows by PRIORITY_AGING_RATE per second of waiting, so lower priority waiters still make progress.
+                Callers which do not pass a priority ignore the wait area, and contend as usual.
 
             @return  <bool> - True if you got the lock, otherwise False.
+
+            @raises DeadlockError - If detectDeadlocks=True, and waiting would deadlock
         '''
-        if self.held is True:
-            # NOTE: Without some type of in-directory marker (like a uuid) we cannot
-            #        refresh an expired lock accurately
-            if os.path.exists(self.lockPath):
-                return True
-            # Someone removed our lock
-            self.held = False
+        with self._stateLock:
+            if self.held is True:
+                # NOTE: Without some type of in-directory marker (like a uuid) we cannot
+                #        refresh an expired lock accurately
+                if os.path.exists(self.lockPath):
+                    return True
+                # Someone removed our lock
+                self.held = False
+                if self.hooks is not None:
+                    self.hooks.onLost(self, time.time())
+
+        hooks = self.hooks
+        if hooks is not None:
+            hookStartTime = time.time()
+            hooks.onAcquireStart(self, hookStartTime)
+
+        if timeout is not None:
+            endTime = _monotonic() + timeout
 
-        # If we aren't going to poll at least 5 times, give us a smaller interval
-        if timeout:
+            # If we aren't going to poll at least 5 times, give us a smaller interval
             if timeout / 5.0 < DEFAULT_POLL_TIME:
-                pollTime = timeout / 10.0
+                pollTime = max(timeout, 0) / 10.0
             else:
                 pollTime = DEFAULT_POLL_TIME
-            
-            endTime = time.time() + timeout
-            keepGoing = lambda : bool(time.time() < endTime)
         else:
+            endTime = None
             pollTime = DEFAULT_POLL_TIME
-            keepGoing = lambda : True
 
-                    
+        if self.shardLevels:
+            _ensureShardDir(self.shardDir)
+
+        waitGraph = self.waitGraph
+        isWaiting = False
+
+        if priority is not None:
+            priorityWaiter = PriorityWaiter(self.lockPath + PRIORITY_WAITERS_SUFFIX, priority, PRIORITY_AGING_RATE, self._getNow)
+        else:
+            priorityWaiter = None
 
         success = False
-        while keepGoing():
-            try:
-                os.mkdir(self.lockPath) 
-                success = True
-                break
-            except:
-                time.sleep(pollTime)
-                if self.maxLockAge:
-                    if os.path.exists(self.lockPath) and os.stat(self.lockPath).st_mtime < time.time() - self.maxLockAge:
-                        try:
-                            os.rmdir(self.lockPath)
-                        except:
-                            # If we did not remove the lock, someone else is at the same point and contending. Let them win.
-                            time.sleep(pollTime)
-        
+        try:
+            while True:
+                if priorityWaiter is None or not priorityWaiter.shouldYield():
+                    if self._tryAcquire():
+                        success = True
+                        break
+
+                if priorityWaiter is not None and not priorityWaiter.isRegistered:
+                    priorityWaiter.register()
+
+                if waitGraph is not None:
+                    if isWaiting is False:
+                        waitGraph.setWaiting(self.name)
+                        isWaiting = True
+                    waitGraph.checkDeadlock(self.name)
+
+                if self.adaptivePoll is True:
+                    sleepTime = self._getAdaptivePollTime(pollTime)
+                else:
+                    sleepTime = pollTime
+
+                if endTime is None:
+                    time.sleep(sleepTime)
+                    continue
+
+                remaining = endTime - _monotonic()
+                if remaining <= 0:
+                    break
+
+                time.sleep(min(sleepTime, remaining))
+        except:
+            # Like DeadlockError, so hooks still see the end of the wait they saw start
+            if hooks is not None:
+                hookNow = time.time()
+                hooks.onAcquireError(self, hookNow, hookNow - hookStartTime, sys.exc_info()[1])
+            raise
+        finally:
+            if isWaiting is True:
+                waitGraph.clearWaiting()
+            if priorityWaiter is not None:
+                priorityWaiter.unregister()
+
         if success is True:
-            self.acquiredAt = time.time()
+            with self._stateLock:
+                self.acquiredAt = self._getNow()
+                self._heldSince = _monotonic()
+            if waitGraph is not None:
+                waitGraph.setHolder(self.name)
+
+            if self.fencing is True:
+                try:
+                    self.fencingToken = self._nextFencingToken()
+                except:
+                    # Don't leave the lock held if we could not issue a token
+                    self.release(forceRelease=True)
+                    if hooks is not None:
+                        hookNow = time.time()
+                        hooks.onAcquireError(self, hookNow, hookNow - hookStartTime, sys.exc_info()[1])
+                    raise
+
+        with self._stateLock:
+            self.held = success
+            if success is True:
+                _registerHeldLock(self)
+            else:
+                _unregisterHeldLock(self)
+
+        if hooks is not None:
+            hookNow = time.time()
+            if success is True:
+                hooks.onAcquired(self, hookNow, hookNow - hookStartTime)
+            else:
+                hooks.onTimeout(self, hookNow, hookNow - hookStartTime)
 
-        self.held = success
         return success
 
+    def _tryAcquire(self):
+        '''
+            _tryAcquire - Make a single non-blocking attempt to create the lock directory.
+                If the lock is held but has expired (past maxLockAge), tries to take it over.
+
+                This does not update "held" or "acquiredAt"
+
+            @return <bool> - True if we created the lock directory, otherwise False
+
+            @raises OSError - If lockDir is out of space or inodes ( ENOSPC / EDQUOT ), rather than treating that as contention
+        '''
+        if self.hooks is not None:
+            onExpiredSteal = lambda : self.hooks.onExpiredSteal(self, time.time())
+        else:
+            onExpiredSteal = None
+
+        return _tryMakeLockDir(self.lockPath, self.shardDir, self.shardLevels, self.__checkExpiration, onExpiredSteal)
+
+    @property
+    def statsPath(self):
+        '''
+            statsPath - Path of the file holding this lock's shared hold time statistics ( see "adaptivePoll" option ).
+                Built on demand, like fencePath.
+        '''
+        return self.lockPath + ADAPTIVE_STATS_SUFFIX
+
+    def getAverageHoldTime(self):
+        '''
+            getAverageHoldTime - Get the moving average of how long this lock is held ( see "adaptivePoll" option ).
+                Uses the shared statistics if available, otherwise those recorded by this process.
+
+            @return <None/float> - Average hold time in seconds, or None if no holds have been recorded
+        '''
+        try:
+            with open(self.statsPath, 'rb') as f:
+                statsData = f.read(ADAPTIVE_STATS_STRUCT.size)
+            if len(statsData) == ADAPTIVE_STATS_STRUCT.size:
+                (averageHoldTime, numHolds) = ADAPTIVE_STATS_STRUCT.unpack(statsData)
+                if numHolds:
+                    return averageHoldTime
+        except (IOError, OSError):
+            pass
+
+        return _localHoldTimes.get(self.lockPath, None)
+
+    def _recordHoldTime(self, holdTime):
+        '''
+            _recordHoldTime - Add a hold time to the local and shared moving averages. Must be called while holding the lock.
+        '''
+        try:
+            with open(self.statsPath, 'rb') as f:
+                statsData = f.read(ADAPTIVE_STATS_STRUCT.size)
+            (averageHoldTime, numHolds) = ADAPTIVE_STATS_STRUCT.unpack(statsData)
+        except (IOError, OSError, struct.error):
+            # Shared stats are missing or corrupt. Continue the average this process has recorded, if any, rather than restarting it.
+            averageHoldTime = _localHoldTimes.get(self.lockPath, None)
+            numHolds = int(averageHoldTime is not None)
+
+        if numHolds:
+            averageHoldTime += (holdTime - averageHoldTime) * ADAPTIVE_AVERAGE_WEIGHT
+        else:
+            averageHoldTime = holdTime
+
+        _localHoldTimes[self.lockPath] = averageHoldTime
+
+        try:
+            fd = os.open(self.statsPath, os.O_WRONLY | os.O_CREAT, 0o666)
+            try:
+                os.write(fd, ADAPTIVE_STATS_STRUCT.pack(averageHoldTime, min(numHolds + 1, 0xFFFFFFFF)))
+            finally:
+                os.close(fd)
+        except OSError:
+            # Statistics are only a hint
+            pass
+
+    def _getAdaptivePollTime(self, defaultPollTime):
+        '''
+            _getAdaptivePollTime - Get how long to sleep before the next attempt, based on the expected remaining hold time
+
+            @param defaultPollTime <float> - Interval to use if there are no statistics
+
+            @return <float> - Seconds to sleep
+        '''
+        averageHoldTime = self.getAverageHoldTime()
+        if averageHoldTime is None:
+            return defaultPollTime
+
+        try:
+            lockAge = self._getNow() - os.stat(self.lockPath).st_mtime
+        except OSError:
+            # Just released, try again right away
+            return ADAPTIVE_MIN_POLL
+
+        expectedRemaining = averageHoldTime - lockAge
+        if expectedRemaining <= 0:
+            # Held longer than usual, check back at a fraction of the usual hold time
+            expectedRemaining = averageHoldTime / 4.0
+
+        pollTime = expectedRemaining * (1.0 + random.uniform(-ADAPTIVE_JITTER, ADAPTIVE_JITTER))
+
+        return min(max(pollTime, ADAPTIVE_MIN_POLL), ADAPTIVE_MAX_POLL)
+
+    def _forgetHeld(self):
+        '''
+            _forgetHeld - Forget that we hold the lock, without releasing it ( like in a forked child, where the parent still holds it )
+        '''
+        self.held = False
+        self.acquiredAt = None
+        self._heldSince = None
+
+        # Another thread in the parent may have been holding it at the time of fork
+        self._stateLock = threading.RLock()
+
+    @property
+    def fencePath(self):
+        '''
+            fencePath - Path of the file holding this lock's fencing token ( see "fencing" option ).
+                Built on demand, so locks which don't use fencing don't pay for storing it.
+        '''
+        return self.lockPath + FENCING_TOKEN_SUFFIX
+
+    def readFencingToken(self):
+        '''
+            readFencingToken - Read the most recently issued fencing token for this lock name ( see "fencing" option )
+
+            @return <int> - The latest token, or 0 if none has been issued
+        '''
+        try:
+            with open(self.fencePath, 'rt') as f:
+                return int(f.read().strip())
+        except (IOError, OSError) as e:
+            if getattr(e, 'errno', None) == errno.ENOENT:
+                return 0
+            raise
+
+    def _nextFencingToken(self):
+        '''
+            _nextFencingToken - Increment and durably store the fencing token. Called while holding the lock.
+
+                The lock alone does not make the read-increment-write atomic: a holder paused past maxLockAge may still be issuing
+                  when another takes over and issues too. So it is done under an exclusive flock on fencePath + FENCING_LOCK_SUFFIX.
+
+            @return <int> - The new token
+        '''
+        if fcntl is None:
+            return self._writeNextFencingToken()
+
+        lockFd = os.open(self.fencePath + FENCING_LOCK_SUFFIX, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(lockFd, fcntl.LOCK_EX)
+            return self._writeNextFencingToken()
+        finally:
+            # Closing releases the flock
+            os.close(lockFd)
+
+    def _writeNextFencingToken(self):
+        '''
+            _writeNextFencingToken - Read, increment, and durably store the fencing token ( see _nextFencingToken )
+
+            @return <int> - The new token
+        '''
+        token = self.readFencingToken() + 1
+
+        # Write to a temp file and rename over, so readers never see a partial token
+        tempPath = '%s.tmp%d' %(self.fencePath, os.getpid())
+        fd = os.open(tempPath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            os.write(fd, ('%d\n' %(token, )).encode('ascii'))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+        os.rename(tempPath, self.fencePath)
+
+        # Make the rename itself durable
+        try:
+            dirFd = os.open(self.shardDir, os.O_RDONLY)
+            try:
+                os.fsync(dirFd)
+            finally:
+                os.close(dirFd)
+        except OSError:
+            pass
+
+        return token
+
     def release(self, forceRelease=False):
         '''
             release - Release the lock.
@@ -133,33 +871,85 @@ class NamedAtomicLock(object):
 
             @return - True if lock is released, otherwise False
         '''
-        if not self.held:
-            if forceRelease is False:
-                return False # We were not holding the lock
+        # Serialized with other release/refresh/hasLock calls on this object, like the holder's own release racing a HoldWatchdog's
+        with self._stateLock:
+            _unregisterHeldLock(self)
+
+            wasHeld = self.held
+            if not self.held:
+                if forceRelease is False:
+                    return False # We were not holding the lock
+                else:
+                    self.held = True # If we have force release set, pretend like we held its
+
+            if self._heldSince is not None:
+                holdTime = _monotonic() - self._heldSince
+                self._heldSince = None
             else:
-                self.held = True # If we have force release set, pretend like we held its
+                holdTime = None
+
+            if self.waitGraph is not None:
+                self.waitGraph.clearHolder(self.name, force=forceRelease)
         
-        if not os.path.exists(self.lockPath):
-            self.held = False
+            if not os.path.exists(self.lockPath):
+                self.held = False
+                self.acquiredAt = None
+                if wasHeld is True and self.hooks is not None:
+                    self.hooks.onLost(self, time.time())
+                return True
+
+            if forceRelease is False:
+                # We waited too long and lost the lock
+                if self.maxLockAge and self._getNow() > self.acquiredAt + self.maxLockAge:
+                    self.held = False
+                    self.acquiredAt = None
+                    if self.hooks is not None:
+                        self.hooks.onLost(self, time.time())
+                    return False
+
             self.acquiredAt = None
+
+            if self.adaptivePoll is True and holdTime is not None:
+                # Record while we still hold the lock, so no one else is writing the stats
+                self._recordHoldTime(holdTime)
+
+            try:
+                os.rmdir(self.lockPath)
+                self.held = False
+            except:
+                self.held = False
+                return False
+
+            if self.hooks is not None:
+                self.hooks.onRelease(self, time.time(), holdTime)
+
             return True
 
-        if forceRelease is False:
-            # We waited too long and lost the lock
-            if self.maxLockAge and time.time() > self.acquiredAt + self.maxLockAge:
+    def refresh(self):
+        '''
+            refresh - Renew a lock we hold, resetting its age to 0 so that it does not expire (via maxLockAge) while we are still using it.
+
+                Call this periodically (well within maxLockAge) from a long-running holder, like a heartbeat.
+
+            @return <bool> - True if we held the lock and renewed it, False if we do not hold it (or have lost it)
+        '''
+        with self._stateLock:
+            if not self.hasLock:
+                return False
+
+            try:
+                os.utime(self.lockPath, None)
+            except OSError:
+                # Removed between our check and the touch
                 self.held = False
                 self.acquiredAt = None
+                _unregisterHeldLock(self)
+                if self.hooks is not None:
+                    self.hooks.onLost(self, time.time())
                 return False
 
-        self.acquiredAt = None
-
-        try:
-            os.rmdir(self.lockPath)
-            self.held = False
+            self.acquiredAt = self._getNow()
             return True
-        except:
-            self.held = False
-            return False
 
 
     def __checkExpiration(self, mtime=None):
@@ -179,7 +969,7 @@ class NamedAtomicLock(object):
             except FileNotFoundError as e:
                 return False
 
-        if mtime < time.time() - self.maxLockAge:
+        if mtime < self._getNow() - self.maxLockAge:
             return True
 
         return False
@@ -211,24 +1001,43 @@ class NamedAtomicLock(object):
 
             @return <bool> - True/False if we have the lock or not.
         '''
-        # If we don't hold it currently, return False
-        if self.held is False:
-            return False
+        with self._stateLock:
+            # If we don't hold it currently, return False
+            if self.held is False:
+                return False
         
-        # Otherwise if we think we hold it, but it is not held, we have lost it.
-        if not self.isHeld:
-            self.acquiredAt = None
-            self.held = False
-            return False
+            # Otherwise if we think we hold it, but it is not held, we have lost it.
+            if not self.isHeld:
+                self.acquiredAt = None
+                self.held = False
+                _unregisterHeldLock(self)
+                if self.hooks is not None:
+                    self.hooks.onLost(self, time.time())
+                return False
 
-        # Check if we expired
-        if self.__checkExpiration(self.acquiredAt):
-            self.acquiredAt = None
-            self.held = False
-            return False
+            # Check if we expired
+            if self.__checkExpiration(self.acquiredAt):
+                self.acquiredAt = None
+                self.held = False
+                _unregisterHeldLock(self)
+                if self.hooks is not None:
+                    self.hooks.onLost(self, time.time())
+                return False
 
 
-        return True
+            return True
+
 
+# These build on NamedAtomicLock, so must be imported after it is defined
+from .SingleFlight import SingleFlightCache, singleFlight
+from .Striped import StripedNamedAtomicLock
+from .LeaderElector import LeaderElector
+from .LockExecutor import NamedLockExecutor
+from .LockSet import LockSet
+from .Pool import acquireAny, NamedLockPool
+from .Sync import NamedBarrier, NamedEvent
+from .RateLimiter import NamedRateLimiter
+from .Watchdog import HoldWatchdog, HoldBudgetExceeded
+from .Query import queryLocks, LockStatus
 
 # vim: set ts=4 sw=4 expandtab :
@@ -0,0 +1,131 @@
+#!/usr/bin/env GoodTests.py
+'''
+    Adaptive poll unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import NamedAtomicLock
+
+class TestAdaptivePoll(object):
+    '''
+        TestAdaptivePoll - Tests for the adaptivePoll option of NamedAtomicLock
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_holdTimeStats(self):
+        '''
+            test_holdTimeStats - Test that releases record a moving average of hold times, shared between lock objects
+        '''
+        lockName = self.lockPrefix + 'test_AdaptivePoll_stats'
+
+        lock = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, adaptivePoll=True)
+
+        assert lock.getAverageHoldTime() is None , 'Expected no average hold time before any release'
+
+        assert lock.acquire(timeout=1) , 'Expected to acquire lock'
+        time.sleep(.2)
+        assert lock.release() , 'Expected to release lock'
+
+        averageHoldTime = lock.getAverageHoldTime()
+        assert averageHoldTime is not None and .15 < averageHoldTime < 1 , 'Expected average hold time of about .2 seconds, but got %s' %(repr(averageHoldTime), )
+
+        assert os.path.exists(lock.statsPath) , 'Expected stats file to be created at "%s"' %(lock.statsPath, )
+
+        otherLock = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, adaptivePoll=True)
+        assert otherLock.getAverageHoldTime() == averageHoldTime , 'Expected another lock object to read the shared average'
+
+        assert otherLock.acquire(timeout=1) , 'Expected to acquire lock'
+        assert otherLock.release() , 'Expected to release lock'
+
+        newAverageHoldTime = lock.getAverageHoldTime()
+        assert newAverageHoldTime < averageHoldTime , 'Expected a short hold to lower the average ( %f -> %f )' %(averageHoldTime, newAverageHoldTime)
+
+        # Missing or corrupt shared stats continue from this process's average, rather than restarting from one hold
+        for damage in ('remove', 'corrupt'):
+            if damage == 'remove':
+                os.remove(lock.statsPath)
+            else:
+                with open(lock.statsPath, 'wb') as f:
+                    f.write(b'x')
+
+            localAverageHoldTime = NamedAtomicLock._localHoldTimes[lock.lockPath]
+
+            assert lock.acquire(timeout=1) , 'Expected to acquire lock'
+            assert lock.release() , 'Expected to release lock'
+
+            seededAverageHoldTime = lock.getAverageHoldTime()
+            assert seededAverageHoldTime > localAverageHoldTime * ( 1 - NamedAtomicLock.ADAPTIVE_AVERAGE_WEIGHT ) * .99 , 'Expected average after %s stats to continue from the local average %f, but got %f' %(damage, localAverageHoldTime, seededAverageHoldTime)
+            assert seededAverageHoldTime < localAverageHoldTime , 'Expected a short hold to lower the average ( %f -> %f )' %(localAverageHoldTime, seededAverageHoldTime)
+
+        plainLock = NamedAtomicLock.NamedAtomicLock(self.lockPrefix + 'test_AdaptivePoll_plain', lockDir=self.lockDir)
+        assert plainLock.acquire(timeout=1) , 'Expected to acquire lock'
+        assert plainLock.release() , 'Expected to release lock'
+        assert not os.path.exists(plainLock.statsPath) , 'Expected no stats file without adaptivePoll'
+
+    def test_adaptiveWait(self):
+        '''
+            test_adaptiveWait - Test that a waiter sleeps about the expected remaining hold time, and still gets the lock promptly
+        '''
+        lockName = self.lockPrefix + 'test_AdaptivePoll_wait'
+
+        holder = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, adaptivePoll=True)
+        waiter = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, adaptivePoll=True)
+
+        for i in range(3):
+            assert holder.acquire(timeout=1) , 'Expected to acquire lock'
+            time.sleep(.3)
+            assert holder.release() , 'Expected to release lock'
+
+        assert holder.acquire(timeout=1) , 'Expected to acquire lock'
+
+        pollTime = waiter._getAdaptivePollTime(NamedAtomicLock.DEFAULT_POLL_TIME)
+        assert .15 < pollTime <= .35 , 'Expected poll time near the remaining hold time of about .3 seconds, but got %f' %(pollTime, )
+
+        releaseThread = threading.Timer(.3, holder.release)
+        releaseThread.start()
+
+        startTime = time.time()
+        assert waiter.acquire(timeout=2) , 'Expected waiter to acquire lock after holder released'
+        waitTime = time.time() - startTime
+
+        releaseThread.join()
+
+        assert waitTime < 1 , 'Expected waiter to get the lock soon after release, but waited %f seconds' %(waitTime, )
+        assert waiter.release() , 'Expected to release lock'
+
+        assert waiter._getAdaptivePollTime(NamedAtomicLock.DEFAULT_POLL_TIME) == NamedAtomicLock.ADAPTIVE_MIN_POLL , 'Expected minimum poll time when lock is free'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,198 @@
+#!/usr/bin/env GoodTests.py
+'''
+    Exit cleanup unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import NamedAtomicLock
+
+# Run in a child python, with lockDir and lockName as arguments
+CHILD_PREAMBLE = \
+'''
+import os, sys, signal, time
+sys.path.insert(0, %r)
+import NamedAtomicLock
+(lockDir, lockName) = sys.argv[1:3]
+lockObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=lockDir)
+assert lockObj.acquire(1)
+'''
+
+class TestCleanup(object):
+    '''
+        TestCleanup - Tests for releasing held locks on exit, on signals, and not releasing a parent's locks after fork
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+        self.modulePath = os.path.dirname(os.path.dirname(os.path.abspath(NamedAtomicLock.__file__)))
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+    def _startChild(self, lockName, code):
+        childCode = (CHILD_PREAMBLE %(self.modulePath, )) + code
+        return subprocess.Popen([sys.executable, '-c', childCode, self.lockDir, lockName], stdout=subprocess.PIPE)
+
+
+    def test_releaseOnExit(self):
+        '''
+            test_releaseOnExit - Test that locks held at normal exit are released
+        '''
+        lockName = self.lockPrefix + 'test_Cleanup_exit'
+
+        childProcess = self._startChild(lockName, 'sys.exit(0)\n')
+        assert childProcess.wait() == 0 , 'Child process failed'
+
+        lockObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir)
+        assert not lockObj.isHeld , 'Expected lock held by exiting process to be released at exit'
+
+        # And with cleanup disabled, the lock is left
+        childProcess = self._startChild(lockName, 'NamedAtomicLock.setExitCleanup(False)\nsys.exit(0)\n')
+        assert childProcess.wait() == 0 , 'Child process failed'
+
+        assert lockObj.isHeld , 'Expected lock to be left held with setExitCleanup(False)'
+        lockObj.release(forceRelease=True)
+
+
+    def test_releaseOnSignal(self):
+        '''
+            test_releaseOnSignal - Test that locks are released on SIGTERM with enableSignalCleanup, and the process still dies
+        '''
+        lockName = self.lockPrefix + 'test_Cleanup_signal'
+
+        childProcess = self._startChild(lockName, 'NamedAtomicLock.enableSignalCleanup()\nsys.stdout.write("ready\\n")\nsys.stdout.flush()\ntime.sleep(30)\n')
+
+        assert childProcess.stdout.readline().strip() == b'ready' , 'Child did not start'
+
+        lockObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir)
+        assert lockObj.isHeld , 'Expected child to hold lock'
+
+        childProcess.send_signal(signal.SIGTERM)
+        returnCode = childProcess.wait()
+
+        assert returnCode == -signal.SIGTERM , 'Expected child to still die from SIGTERM, but got return code %d' %(returnCode, )
+        assert not lockObj.isHeld , 'Expected lock to be released on SIGTERM'
+
+
+    def test_forkChild(self):
+        '''
+            test_forkChild - Test that a forked child does not think it holds, or release, its parent's locks
+        '''
+        if not hasattr(os, 'register_at_fork'):
+            return
+
+        lockName = self.lockPrefix + 'test_Cleanup_fork'
+
+        childCode = \
+'''
+pid = os.fork()
+if pid == 0:
+    sys.stdout.write('child held=%s hasLock=%s held=%d\\n' %(lockObj.held, lockObj.hasLock, len(NamedAtomicLock.getHeldLocks())))
+    sys.stdout.flush()
+    sys.exit(0)
+os.waitpid(pid, 0)
+sys.stdout.write('parent isHeld=%s hasLock=%s\\n' %(lockObj.isHeld, lockObj.hasLock))
+lockObj.release()
+'''
+        childProcess = self._startChild(lockName, childCode)
+        output = childProcess.communicate()[0].decode('utf-8')
+
+        assert 'child held=False hasLock=False held=0' in output , 'Expected forked child to not hold the parent lock. Output: ' + output
+        assert 'parent isHeld=True hasLock=True' in output , 'Expected parent to still hold its lock after child exits. Output: ' + output
+
+
+    def test_signalInCriticalSection(self):
+        '''
+            test_signalInCriticalSection - Test that a signal arriving while the main thread is updating the held lock registry
+                does not deadlock the cleanup handler
+        '''
+        lockName = self.lockPrefix + 'test_Cleanup_critical'
+
+        childCode = \
+'''
+from NamedAtomicLock import Cleanup
+NamedAtomicLock.enableSignalCleanup()
+with Cleanup._heldLocksLock:
+    os.kill(os.getpid(), signal.SIGTERM)
+    time.sleep(5)
+'''
+        childProcess = self._startChild(lockName, childCode)
+
+        endTime = time.time() + 10
+        while childProcess.poll() is None and time.time() < endTime:
+            time.sleep(.05)
+
+        if childProcess.poll() is None:
+            childProcess.kill()
+            childProcess.wait()
+            raise AssertionError('Expected child to die from SIGTERM, but it hung in the cleanup handler')
+
+        assert childProcess.returncode == -signal.SIGTERM , 'Expected child to die from SIGTERM, but got return code %d' %(childProcess.returncode, )
+
+        lockObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir)
+        assert not lockObj.isHeld , 'Expected lock to be released on SIGTERM'
+
+
+    def test_lockSet(self):
+        '''
+            test_lockSet - Test that LockSet locks are released at exit, and forgotten by a forked child
+        '''
+        lockName = self.lockPrefix + 'test_Cleanup_lockSet'
+        setNames = [ lockName + '_a', lockName + '_b' ]
+
+        childCode = \
+'''
+lockObj.release()
+lockSet = NamedAtomicLock.LockSet([lockName + '_a', lockName + '_b'], lockDir=lockDir)
+assert len(lockSet.acquire(timeout=1)) == 2
+assert lockSet in NamedAtomicLock.getHeldLocks()
+if hasattr(os, 'register_at_fork'):
+    pid = os.fork()
+    if pid == 0:
+        sys.stdout.write('child held=%s setHeld=%d registered=%d\\n' %(lockSet.held, len(lockSet.getHeld()), len(NamedAtomicLock.getHeldLocks())))
+        sys.stdout.flush()
+        os._exit(0)
+    os.waitpid(pid, 0)
+sys.stdout.write('parent setHeld=%d\\n' %(len(lockSet.getHeld()), ))
+sys.exit(0)
+'''
+        childProcess = self._startChild(lockName, childCode)
+        output = childProcess.communicate()[0].decode('utf-8')
+
+        assert childProcess.returncode == 0 , 'Child process failed. Output: ' + output
+        assert 'parent setHeld=2' in output , 'Expected parent to hold both LockSet locks. Output: ' + output
+        if hasattr(os, 'register_at_fork'):
+            assert 'child held=False setHeld=0 registered=0' in output , 'Expected forked child to forget the LockSet locks. Output: ' + output
+
+        for name in setNames:
+            assert not NamedAtomicLock.NamedAtomicLock(name, lockDir=self.lockDir).isHeld , 'Expected LockSet lock "%s" to be released at exit' %(name, )
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,125 @@
+#!/usr/bin/env GoodTests.py
+'''
+    Deadlock detection unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import NamedAtomicLock
+
+class TestDeadlock(object):
+    '''
+        TestDeadlock - Tests for detectDeadlocks / WaitGraph
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_detectDeadlock(self):
+        '''
+            test_detectDeadlock - Test that two holders acquiring in opposite orders get one fast DeadlockError, and the other proceeds
+        '''
+        lockNameA = self.lockPrefix + 'test_Deadlock_A'
+        lockNameB = self.lockPrefix + 'test_Deadlock_B'
+
+        bothHolding = threading.Barrier(2)
+        results = {}
+
+        hooks = NamedAtomicLock.ChromeTraceHooks()
+
+        def _worker(label, firstName, secondName):
+            firstLock = NamedAtomicLock.NamedAtomicLock(firstName, lockDir=self.lockDir, detectDeadlocks=True)
+            secondLock = NamedAtomicLock.NamedAtomicLock(secondName, lockDir=self.lockDir, detectDeadlocks=True, hooks=hooks)
+
+            assert firstLock.acquire(1)
+            bothHolding.wait()
+            try:
+                results[label] = secondLock.acquire(timeout=10)
+                secondLock.release()
+            except NamedAtomicLock.DeadlockError as e:
+                results[label] = e
+            finally:
+                firstLock.release()
+
+        threads = [
+            threading.Thread(target=_worker, args=('first', lockNameA, lockNameB)),
+            threading.Thread(target=_worker, args=('second', lockNameB, lockNameA)),
+        ]
+
+        startTime = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        timeTaken = time.time() - startTime
+
+        errors = [ result for result in results.values() if isinstance(result, NamedAtomicLock.DeadlockError) ]
+
+        assert len(errors) == 1 , 'Expected exactly one waiter to get a DeadlockError. Results: %s' %(repr(results), )
+        assert True in results.values() , 'Expected the other waiter to acquire after the victim released. Results: %s' %(repr(results), )
+        assert len(errors[0].cycle) == 2 , 'Expected a cycle of two holders. Got: %s' %(repr(errors[0].cycle), )
+        assert timeTaken < 5 , 'Expected deadlock to be detected fast rather than waiting for the timeout. Took %f seconds' %(timeTaken, )
+
+        errorEvents = [ event for event in hooks.getTrace()['traceEvents'] if event['name'].startswith('error ') ]
+        assert len(errorEvents) == 1 , 'Expected the DeadlockError to be traced as an acquire error. Events: %s' %(repr(hooks.getTrace()['traceEvents']), )
+
+        waitGraph = NamedAtomicLock.getWaitGraph(self.lockDir)
+        remainingRecords = [ recordName for recordName in os.listdir(waitGraph.graphDir) ]
+
+        assert not remainingRecords , 'Expected all wait graph records to be removed. Remaining: %s' %(repr(remainingRecords), )
+
+
+    def test_noFalsePositive(self):
+        '''
+            test_noFalsePositive - Test that plain contention (no cycle) just waits
+        '''
+        lockName = self.lockPrefix + 'test_Deadlock_contention'
+
+        lockObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, detectDeadlocks=True)
+
+        assert lockObj.acquire(1) , 'Expected to acquire lock'
+
+        results = []
+        def _waiter():
+            altObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, detectDeadlocks=True)
+            results.append( altObj.acquire(timeout=.3) )
+
+        waiterThread = threading.Thread(target=_waiter)
+        waiterThread.start()
+        waiterThread.join()
+
+        assert results == [False] , 'Expected waiter to time out without a DeadlockError. Got: %s' %(repr(results), )
+
+        assert lockObj.release() , 'Expected to release lock'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,119 @@
+#!/usr/bin/env GoodTests.py
+'''
+    Fencing token unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import NamedAtomicLock
+
+class TestFencing(object):
+    '''
+        TestFencing - Tests for the "fencing" option
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_increasingTokens(self):
+        '''
+            test_increasingTokens - Test that each acquire, by any object, gets a strictly greater token
+        '''
+        lockName = self.lockPrefix + 'test_Fencing_tokens'
+
+        lockObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, fencing=True)
+        altObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, fencing=True, maxLockAge=.2)
+
+        assert lockObj.fencingToken is None , 'Expected no fencing token before acquire'
+        assert lockObj.readFencingToken() == 0 , 'Expected stored token to be 0 before any acquire'
+
+        assert lockObj.acquire(1) , 'Expected to acquire lock'
+        assert lockObj.fencingToken == 1 , 'Expected first token to be 1, got: %s' %(repr(lockObj.fencingToken), )
+
+        # Re-acquire while held does not issue a new token
+        assert lockObj.acquire(1)
+        assert lockObj.fencingToken == 1 , 'Expected re-acquire while held to keep the same token'
+
+        # Let it expire, and have the alt object take it over
+        time.sleep(.3)
+        assert altObj.acquire(1) , 'Expected alt object to take over expired lock'
+
+        assert altObj.fencingToken == 2 , 'Expected takeover to get the next token, got: %s' %(repr(altObj.fencingToken), )
+        assert altObj.fencingToken > lockObj.fencingToken , 'Expected new holder token to be greater than the stale holder token'
+        assert lockObj.readFencingToken() == 2 , 'Expected stale holder to be able to see the newer stored token'
+
+        assert altObj.release() , 'Expected to release'
+
+        assert lockObj.acquire(1)
+        assert lockObj.fencingToken == 3 , 'Expected third acquire to get token 3, got: %s' %(repr(lockObj.fencingToken), )
+        assert lockObj.release()
+
+        noFencingObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir)
+        assert noFencingObj.acquire(1)
+        assert noFencingObj.fencingToken is None , 'Expected no token without fencing=True'
+        assert noFencingObj.release()
+
+    def test_concurrentIssue(self):
+        '''
+            test_concurrentIssue - Test that a paused holder and the one which took over, issuing tokens at once, get different tokens
+        '''
+        lockName = self.lockPrefix + 'test_Fencing_concurrent'
+
+        staleObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, fencing=True)
+        newObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, fencing=True)
+
+        readDone = threading.Event()
+        realReadFencingToken = staleObj.readFencingToken
+
+        def pausingReadFencingToken():
+            # Pause between reading the token and writing the next one
+            token = realReadFencingToken()
+            readDone.set()
+            time.sleep(.3)
+            return token
+
+        staleObj.readFencingToken = pausingReadFencingToken
+
+        staleTokens = []
+        staleThread = threading.Thread(target=lambda : staleTokens.append(staleObj._nextFencingToken()))
+        staleThread.start()
+
+        assert readDone.wait(2) , 'Expected stale holder to read the token'
+        newToken = newObj._nextFencingToken()
+
+        staleThread.join(2)
+
+        assert staleTokens and staleTokens[0] != newToken , 'Expected different tokens when issued at once, but both got: %s' %(repr(newToken), )
+        assert newObj.readFencingToken() == max(staleTokens[0], newToken) , 'Expected the stored token to be the greatest issued'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,100 @@
+#!/usr/bin/env GoodTests.py
+'''
+    Filesystem-clock expiration unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import NamedAtomicLock
+
+class TestFilesystemClock(object):
+    '''
+        TestFilesystemClock - Tests for useFilesystemClock / FilesystemClock
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_measure(self):
+        '''
+            test_measure - Test that the filesystem clock is measured and cached
+        '''
+        clock = NamedAtomicLock.getFilesystemClock(self.lockDir)
+
+        assert clock is NamedAtomicLock.getFilesystemClock(self.lockDir) , 'Expected getFilesystemClock to share one clock per directory'
+
+        fsNow = clock.now()
+
+        probeFiles = [ fname for fname in os.listdir(self.lockDir) if fname.startswith(NamedAtomicLock.FILESYSTEM_CLOCK_PROBE_NAME) ]
+        assert not probeFiles , 'Expected probe files to be removed after measuring, but found: %s' %(repr(probeFiles), )
+
+        # Local filesystem, so clocks should agree closely
+        assert abs(fsNow - time.time()) < 1.0 , 'Expected local filesystem clock to be near local time. Offset is: %f' %(fsNow - time.time(), )
+
+        measuredAt = clock.measuredAt
+        clock.now()
+
+        assert clock.measuredAt == measuredAt , 'Expected offset to be cached between calls to now()'
+
+        # A directory we cannot create a probe in falls back to the local clock, rather than raising
+        badClock = NamedAtomicLock.FilesystemClock(os.path.join(self.lockDir, 'doesNotExist'))
+        assert abs(badClock.now() - time.time()) < 1.0 , 'Expected unmeasurable filesystem clock to fall back to local time'
+
+
+    def test_skewedExpiration(self):
+        '''
+            test_skewedExpiration - Test that expiry decisions follow the filesystem clock rather than the local clock
+        '''
+        lockName = self.lockPrefix + 'test_FilesystemClock_skew'
+
+        lockObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, maxLockAge=30, useFilesystemClock=True)
+        altObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, maxLockAge=30, useFilesystemClock=True)
+
+        assert lockObj.filesystemClock is not None , 'Expected filesystemClock to be set with useFilesystemClock=True'
+
+        assert lockObj.acquire(1) , 'Expected to acquire lock'
+        assert altObj.isHeld , 'Expected alt object to see lock as held'
+
+        clock = lockObj.filesystemClock
+        try:
+            # Pretend the filesystem clock is a minute ahead of us, so the lock is past maxLockAge
+            clock.measure()
+            clock.offset += 60
+
+            assert altObj.isHeld is False , 'Expected lock to be expired according to the (skewed) filesystem clock'
+            assert altObj.acquire(1) , 'Expected to steal expired lock according to the filesystem clock'
+        finally:
+            clock.measure()
+
+        assert altObj.release() , 'Expected to release stolen lock'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
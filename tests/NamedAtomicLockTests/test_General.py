@@ -3,6 +3,7 @@
     General unit tests for NamedAtomicLock
 '''
 
+import errno
 import os
 import random
 import subprocess
@@ -87,6 +88,18 @@ class TestGeneral(object):
         assert str(gotException).startswith('lockDir /blargie_pie') , 'Got a ValueError passing a lockDir which does not exist, but the message is not expected (i.e. a ValueError was thrown by something unexpected).\nGot: ' + str(gotException)
 
 
+        # Everything built on NamedAtomicLock validates lockDir the same way
+        for (constructor, args) in ( (NamedAtomicLock.LockSet, ([LOCK_NAME], )), (NamedAtomicLock.SingleFlightCache, (LOCK_NAME, )), (NamedAtomicLock.NamedEvent, (LOCK_NAME, )), (NamedAtomicLock.NamedBarrier, (LOCK_NAME, 2)) ):
+            try:
+                constructor(*args, lockDir='/blargie_pie')
+            except ValueError as e:
+                assert str(e).startswith('lockDir /blargie_pie') , 'Got an unexpected ValueError from %s with a lockDir which does not exist: %s' %(constructor.__name__, str(e))
+            else:
+                raise AssertionError('Expected %s to throw a ValueError providing a lockDir which does not exist' %(constructor.__name__, ))
+
+        trailingLock = NamedAtomicLock.NamedAtomicLock(LOCK_NAME, lockDir=thisDir + os.sep)
+        assert trailingLock.lockDir == thisDir , 'Expected trailing separator to be stripped from lockDir. Got: %s' %(trailingLock.lockDir, )
+
         # Assert the maxLockAge attribute is setting
         myLock = NamedAtomicLock.NamedAtomicLock(LOCK_NAME)
 
@@ -96,6 +109,56 @@ class TestGeneral(object):
     
         assert myLock.maxLockAge == 3600 , 'Expected passing maxLockAge=3600 to set on the object. Got: %s' %(repr(myLock.maxLockAge), )
 
+    def test_fastestLockDir(self):
+        '''
+            test_fastestLockDir - Test the FASTEST_LOCK_DIR resolution mode
+        '''
+        LOCK_NAME = self.lockPrefix + 'test_general_fastest'
+
+        fastestDir = NamedAtomicLock.getFastestLockDir()
+
+        assert os.path.isdir(fastestDir) , 'Expected getFastestLockDir to return a directory. Got: %s' %(repr(fastestDir), )
+        assert NamedAtomicLock.getFastestLockDir() == fastestDir , 'Expected getFastestLockDir to return a consistent (cached) result'
+
+        myLock = NamedAtomicLock.NamedAtomicLock(LOCK_NAME, lockDir=NamedAtomicLock.FASTEST_LOCK_DIR)
+
+        assert myLock.lockDir == fastestDir , 'Expected lockDir attribute to report the chosen fastest directory. Expected "%s" but got "%s"' %(fastestDir, myLock.lockDir)
+
+        # Test mount type detection against a fake mounts file
+        fakeMountsFile = os.path.join(os.getcwd(), '.%s_mounts' %(LOCK_NAME, ))
+        with open(fakeMountsFile, 'wt') as f:
+            f.write('/dev/sda1 / ext4 rw 0 0\n')
+            f.write('tmpfs /dev/shm tmpfs rw 0 0\n')
+            f.write('/dev/sdb1 /dev/shmother xfs rw 0 0\n')
+
+        try:
+            fsType = NamedAtomicLock._getMountFsType('/dev/shm/something', mountsFile=fakeMountsFile)
+            assert fsType == 'tmpfs' , 'Expected /dev/shm/something to be on tmpfs, got: %s' %(repr(fsType), )
+
+            fsType = NamedAtomicLock._getMountFsType('/dev/shmother', mountsFile=fakeMountsFile)
+            assert fsType == 'xfs' , 'Expected /dev/shmother to not match the /dev/shm mount, got: %s' %(repr(fsType), )
+
+            fsType = NamedAtomicLock._getMountFsType('/var/tmp', mountsFile=fakeMountsFile)
+            assert fsType == 'ext4' , 'Expected /var/tmp to be on the root mount, got: %s' %(repr(fsType), )
+        finally:
+            os.remove(fakeMountsFile)
+
+        # A full lock directory must be an error, not look like contention ( and not send us to another directory )
+        def fullMkdir(path, *args):
+            raise OSError(errno.ENOSPC, 'No space left on device', path)
+
+        realMkdir = os.mkdir
+        os.mkdir = fullMkdir
+        try:
+            myLock.acquire(timeout=0)
+        except OSError as e:
+            assert e.errno == errno.ENOSPC , 'Expected ENOSPC from acquire on a full directory, but got: %s' %(str(e), )
+        else:
+            raise AssertionError('Expected acquire on a full directory to raise OSError')
+        finally:
+            os.mkdir = realMkdir
+
+        assert not myLock.held , 'Expected lock not to be held after a failed acquire'
 
 
 if __name__ == '__main__':
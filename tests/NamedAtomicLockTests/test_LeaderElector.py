@@ -0,0 +1,150 @@
+#!/usr/bin/env GoodTests.py
+'''
+    LeaderElector unit tests for NamedAtomicLock
+'''
+
+import errno
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import NamedAtomicLock
+
+class TestLeaderElector(object):
+    '''
+        TestLeaderElector - Tests for LeaderElector
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_electionAndFailover(self):
+        '''
+            test_electionAndFailover - Test that one elector leads, renews past its lease, and hands over on stop or lost lock
+        '''
+        lockName = self.lockPrefix + 'test_LeaderElector_election'
+
+        events = []
+
+        def _makeElector(label):
+            return NamedAtomicLock.LeaderElector(lockName, leaseTime=1, lockDir=self.lockDir, checkInterval=.05,
+                onElected=lambda elector : events.append( (label, 'elected') ),
+                onDemoted=lambda elector : events.append( (label, 'demoted') ),
+            )
+
+        electorA = _makeElector('A')
+        electorB = _makeElector('B')
+
+        try:
+            electorA.start()
+            assert electorA.waitUntilElected(1) , 'Expected the only elector to be elected'
+
+            electorB.start()
+
+            # Past the lease time, A should have renewed and still be leader
+            time.sleep(1.5)
+
+            assert electorA.isLeader , 'Expected leader to renew its lease and remain leader past leaseTime'
+            assert not electorB.isLeader , 'Expected standby to not be leader while leader renews'
+            assert events == [ ('A', 'elected') ] , 'Expected only A to have been elected. Events: %s' %(repr(events), )
+
+            # Graceful stop hands over to the standby
+            electorA.stop()
+
+            assert electorB.waitUntilElected(electorB.failoverTime) , 'Expected standby to take over after leader stops'
+            assert events == [ ('A', 'elected'), ('A', 'demoted'), ('B', 'elected') ] , 'Unexpected events after handover: %s' %(repr(events), )
+
+            # Someone removing the lock out from under the leader should demote it
+            NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir).release(forceRelease=True)
+
+            # Either isLeader or the campaign thread notices, and the campaign thread may immediately win it back
+            electorB.isLeader
+            assert ('B', 'demoted') in events , 'Expected onDemoted after lost lock. Events: %s' %(repr(events), )
+
+            assert electorB.waitUntilElected(electorB.failoverTime) , 'Expected elector to campaign again after losing the lock'
+        finally:
+            electorA.stop()
+            electorB.stop()
+
+        assert events[-1] == ('B', 'demoted') , 'Expected stop to demote the leader. Events: %s' %(repr(events), )
+        assert not electorB.lock.isHeld , 'Expected stop to release the lock'
+
+    def test_campaignError(self):
+        '''
+            test_campaignError - Test that an error campaigning ( like a full lockDir ) does not stop the elector, and it is elected once the error clears
+        '''
+        lockName = self.lockPrefix + 'test_LeaderElector_error'
+
+        elector = NamedAtomicLock.LeaderElector(lockName, leaseTime=1, lockDir=self.lockDir, checkInterval=.05)
+
+        def fullMkdir(path, *args):
+            raise OSError(errno.ENOSPC, 'No space left on device', path)
+
+        realMkdir = os.mkdir
+        try:
+            os.mkdir = fullMkdir
+            try:
+                elector.start()
+                time.sleep(.3)
+            finally:
+                os.mkdir = realMkdir
+
+            assert elector._thread.is_alive() , 'Expected the campaign thread to survive an error acquiring'
+            assert not elector.isLeader , 'Expected not to be leader while the lock directory is full'
+
+            assert elector.waitUntilElected(elector.failoverTime) , 'Expected to be elected once the lock directory recovered'
+        finally:
+            elector.stop()
+
+    def test_callbacksOutsideLock(self):
+        '''
+            test_callbacksOutsideLock - Test that a slow callback does not block isLeader
+        '''
+        lockName = self.lockPrefix + 'test_LeaderElector_slowCallback'
+
+        inCallback = threading.Event()
+
+        def slowOnElected(elector):
+            inCallback.set()
+            time.sleep(.5)
+
+        elector = NamedAtomicLock.LeaderElector(lockName, leaseTime=2, lockDir=self.lockDir, checkInterval=.05, onElected=slowOnElected)
+        try:
+            elector.start()
+            assert inCallback.wait(1) , 'Expected onElected to be called'
+
+            startTime = time.time()
+            assert elector.isLeader , 'Expected to be leader while onElected runs'
+            assert time.time() - startTime < .2 , 'Expected isLeader not to wait for onElected to return'
+        finally:
+            elector.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,132 @@
+#!/usr/bin/env GoodTests.py
+'''
+    NamedLockExecutor unit tests for NamedAtomicLock
+'''
+
+import errno
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import NamedAtomicLock
+
+class TestLockExecutor(object):
+    '''
+        TestLockExecutor - Tests for NamedLockExecutor
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_dispatchOrder(self):
+        '''
+            test_dispatchOrder - Test that tasks with busy locks wait, while tasks behind them run
+        '''
+        lockNameA = self.lockPrefix + 'test_LockExecutor_A'
+        lockNameB = self.lockPrefix + 'test_LockExecutor_B'
+        lockNameC = self.lockPrefix + 'test_LockExecutor_C'
+
+        timings = {}
+        def _task(label, sleepTime):
+            timings[label] = [time.time()]
+            time.sleep(sleepTime)
+            timings[label].append(time.time())
+            return label
+
+        # Held by "another process"
+        externalLock = NamedAtomicLock.NamedAtomicLock(lockNameC, lockDir=self.lockDir)
+        assert externalLock.acquire(1) , 'Expected to acquire external lock'
+
+        with NamedAtomicLock.NamedLockExecutor(ThreadPoolExecutor(2), lockDir=self.lockDir, pollInterval=.02) as executor:
+
+            firstFuture = executor.submit([lockNameA], _task, 'first', .3)
+            secondFuture = executor.submit([lockNameA, lockNameB], _task, 'second', 0)
+            thirdFuture = executor.submit(lockNameB, _task, 'third', .1)
+            externalFuture = executor.submit(lockNameC, _task, 'external', 0)
+            errorFuture = executor.submit([], lambda : 1 / 0)
+
+            assert thirdFuture.result(2) == 'third' , 'Expected result to be passed through the future'
+            assert not externalFuture.done() , 'Expected task needing externally-held lock to not run'
+
+            externalLock.release()
+
+            assert externalFuture.result(2) == 'external' , 'Expected task to run after external lock was released'
+            assert secondFuture.result(2) == 'second' , 'Expected blocked task to run once its locks were released'
+            assert firstFuture.result(2) == 'first'
+
+            gotException = False
+            try:
+                errorFuture.result(2)
+            except ZeroDivisionError:
+                gotException = True
+
+            assert gotException , 'Expected exception to be passed through the future'
+
+        assert timings['third'][0] < timings['first'][1] , 'Expected third task (free lock) to run while first task held lock A'
+        assert timings['second'][0] >= timings['first'][1] , 'Expected second task to only start after first task released lock A'
+        assert timings['second'][0] >= timings['third'][1] , 'Expected second task to only start after third task released lock B'
+
+        for lockName in (lockNameA, lockNameB, lockNameC):
+            assert not NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir).isHeld , 'Expected all task locks to be released. "%s" is held' %(lockName, )
+
+    def test_acquireError(self):
+        '''
+            test_acquireError - Test that an error acquiring a task's locks ( like a full lockDir ) fails that task, and the executor keeps running
+        '''
+        lockNameA = self.lockPrefix + 'test_LockExecutor_errorA'
+        lockNameB = self.lockPrefix + 'test_LockExecutor_errorB'
+
+        realMkdir = os.mkdir
+        def fullMkdir(path, *args):
+            if path.endswith(lockNameB):
+                raise OSError(errno.ENOSPC, 'No space left on device', path)
+            return realMkdir(path, *args)
+
+        with NamedAtomicLock.NamedLockExecutor(ThreadPoolExecutor(2), lockDir=self.lockDir, pollInterval=.02) as executor:
+            os.mkdir = fullMkdir
+            try:
+                errorFuture = executor.submit([lockNameA, lockNameB], lambda : 'ran')
+
+                try:
+                    errorFuture.result(2)
+                except OSError as e:
+                    assert e.errno == errno.ENOSPC , 'Expected ENOSPC from the future, but got: %s' %(str(e), )
+                else:
+                    raise AssertionError('Expected the acquire error to be passed through the future')
+            finally:
+                os.mkdir = realMkdir
+
+            assert not NamedAtomicLock.NamedAtomicLock(lockNameA, lockDir=self.lockDir).isHeld , 'Expected locks taken before the error to be released'
+
+            assert executor.submit([lockNameA, lockNameB], lambda : 'ran').result(2) == 'ran' , 'Expected executor to keep dispatching after an acquire error'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,151 @@
+#!/usr/bin/env GoodTests.py
+'''
+    LockSet unit tests for NamedAtomicLock
+'''
+
+import errno
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import NamedAtomicLock
+
+class TestLockSet(object):
+    '''
+        TestLockSet - Tests for LockSet
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_bulkAcquireRelease(self):
+        '''
+            test_bulkAcquireRelease - Test bulk acquire/release, and interoperability with NamedAtomicLock
+        '''
+        names = [ self.lockPrefix + 'test_LockSet_shard%d' %(i, ) for i in range(50) ]
+
+        lockSet = NamedAtomicLock.LockSet(names, lockDir=self.lockDir, shardLevels=1)
+
+        assert len(lockSet) == 50 , 'Expected 50 locks in set'
+        assert names[3] in lockSet , 'Expected name to be in set'
+
+        # Someone else holds one of them
+        otherLock = NamedAtomicLock.NamedAtomicLock(names[7], lockDir=self.lockDir, shardLevels=1)
+        assert otherLock.acquire(1)
+
+        assert lockSet[names[7]].lockPath == otherLock.lockPath , 'Expected LockSet to use the same lock paths as NamedAtomicLock'
+
+        acquiredNames = lockSet.acquire(timeout=.2)
+
+        assert len(acquiredNames) == 49 and names[7] not in acquiredNames , 'Expected all but the externally-held lock to be acquired. Got %d' %(len(acquiredNames), )
+        assert sorted(lockSet.getHeld()) == sorted(acquiredNames) , 'Expected getHeld to match acquired names'
+
+        entry = lockSet[names[0]]
+        assert entry.hasLock and entry.isHeld and entry.held , 'Expected entry view to report lock as held by us'
+        assert NamedAtomicLock.NamedAtomicLock(names[0], lockDir=self.lockDir, shardLevels=1).isHeld , 'Expected NamedAtomicLock to see lock held by LockSet'
+
+        otherEntry = lockSet[names[7]]
+        assert otherEntry.isHeld and not otherEntry.hasLock , 'Expected entry for externally-held lock to be held, but not by us'
+
+        assert otherLock.release()
+        assert otherEntry.acquire(.5) , 'Expected to acquire lock once released'
+
+        releasedNames = lockSet.release()
+        assert len(releasedNames) == 50 , 'Expected all 50 locks to be released, got %d' %(len(releasedNames), )
+        assert not lockSet.getHeld() , 'Expected nothing held after release'
+        assert not entry.isHeld , 'Expected lock to not be held after release'
+
+
+    def test_expiry(self):
+        '''
+            test_expiry - Test bulk expiry checks
+        '''
+        names = [ self.lockPrefix + 'test_LockSet_expire%d' %(i, ) for i in range(5) ]
+
+        lockSet = NamedAtomicLock.LockSet(lockDir=self.lockDir, maxLockAge=.3)
+        for name in names:
+            lockSet.add(name)
+
+        assert len(lockSet.acquire(names[:3], timeout=0)) == 3 , 'Expected to acquire 3 locks'
+        assert lockSet.getExpired() == [] , 'Expected nothing expired right after acquire'
+
+        time.sleep(.4)
+
+        assert lockSet.getExpired() == names[:3] , 'Expected the 3 held locks to be expired. Got: %s' %(repr(lockSet.getExpired()), )
+        assert not lockSet[names[0]].hasLock , 'Expected hasLock to be False after expiry'
+
+        otherSet = NamedAtomicLock.LockSet(names, lockDir=self.lockDir, maxLockAge=.3)
+        assert len(otherSet.acquire(timeout=0)) == 5 , 'Expected other set to take over expired locks'
+        otherSet.release()
+
+    def test_shardDirRemoved(self):
+        '''
+            test_shardDirRemoved - Test that a non-blocking acquire recreates a shard directory which was removed out from under us
+        '''
+        lockDir = tempfile.mkdtemp(prefix='sharded_', dir=self.lockDir)
+        names = [ self.lockPrefix + 'test_LockSet_shard%d' %(i, ) for i in range(5) ]
+
+        lockSet = NamedAtomicLock.LockSet(names, lockDir=lockDir, shardLevels=1)
+        assert len(lockSet.acquire(timeout=0)) == 5 , 'Expected to acquire all locks'
+        lockSet.release()
+
+        # Remove the (now empty) shard directories, which are still cached as known
+        for shardName in os.listdir(lockDir):
+            os.rmdir(os.path.join(lockDir, shardName))
+
+        acquired = lockSet.acquire(timeout=0)
+        assert len(acquired) == 5 , 'Expected to acquire all locks after shard directories were removed, but got: %s' %(repr(acquired), )
+        lockSet.release()
+
+    def test_fullLockDir(self):
+        '''
+            test_fullLockDir - Test that a full lock directory raises, like NamedAtomicLock, rather than looking like contention
+        '''
+        names = [ self.lockPrefix + 'test_LockSet_full%d' %(i, ) for i in range(3) ]
+
+        lockSet = NamedAtomicLock.LockSet(names, lockDir=self.lockDir)
+
+        def fullMkdir(path, *args):
+            raise OSError(errno.ENOSPC, 'No space left on device', path)
+
+        realMkdir = os.mkdir
+        os.mkdir = fullMkdir
+        try:
+            lockSet.acquire(timeout=.3)
+        except OSError as e:
+            assert e.errno == errno.ENOSPC , 'Expected ENOSPC from acquire on a full directory, but got: %s' %(str(e), )
+        else:
+            raise AssertionError('Expected acquire on a full directory to raise OSError')
+        finally:
+            os.mkdir = realMkdir
+
+        assert not lockSet.getHeld() , 'Expected no locks to be held after a failed acquire'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -228,6 +228,46 @@ class TestLocking(object):
         assert not altObj.hasLock , 'Expected hasLock=False on orig object after forced-release on alt obj for alt obj'
 
 
+    def test_timeouts(self):
+        '''
+            test_timeouts - Test that timeout=0 is a single non-blocking attempt, and that short timeouts are not overslept
+        '''
+        lockObj = self.lockObj
+
+        altObj  = NamedAtomicLock.NamedAtomicLock(lockObj.name)
+
+        # timeout=0 on a free lock should acquire it
+        didAcquire = lockObj.acquire(timeout=0)
+
+        assert didAcquire is True , 'Expected acquire(timeout=0) on a free lock to succeed'
+
+        # timeout=0 on a held lock should return immediately
+        startTime = time.time()
+        didAcquire = altObj.acquire(timeout=0)
+        timeTaken = time.time() - startTime
+
+        assert didAcquire is False , 'Expected acquire(timeout=0) on a held lock to fail'
+        assert timeTaken < .05 , 'Expected acquire(timeout=0) to not block, but took %f seconds' %(timeTaken, )
+
+        # Short timeouts should not overshoot the deadline by a poll interval
+        for timeout in (.001, .03, .25):
+            startTime = time.time()
+            didAcquire = altObj.acquire(timeout=timeout)
+            timeTaken = time.time() - startTime
+
+            assert didAcquire is False , 'Expected acquire(timeout=%f) on a held lock to fail' %(timeout, )
+            assert timeTaken >= timeout , 'Expected acquire(timeout=%f) to wait the full timeout, but took %f seconds' %(timeout, timeTaken)
+            assert timeTaken < timeout + .05 , 'Expected acquire(timeout=%f) to not oversleep the deadline, but took %f seconds' %(timeout, timeTaken)
+
+        assert lockObj.release() , 'Expected to release lock'
+
+        # Negative timeout is treated as a single attempt
+        didAcquire = altObj.acquire(timeout=-1)
+
+        assert didAcquire is True , 'Expected acquire with negative timeout on a free lock to make one attempt and succeed'
+
+        assert altObj.release() , 'Expected to release lock'
+
 
 
 if __name__ == '__main__':
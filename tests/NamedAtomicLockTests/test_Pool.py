@@ -0,0 +1,106 @@
+#!/usr/bin/env GoodTests.py
+'''
+    Acquire-any / pool unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import NamedAtomicLock
+
+class TestPool(object):
+    '''
+        TestPool - Tests for acquireAny and NamedLockPool
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_acquireAny(self):
+        '''
+            test_acquireAny - Test getting the free member, timing out when none are free, and waiting for a release
+        '''
+        names = [ self.lockPrefix + 'test_Pool_any%d' %(i, ) for i in range(3) ]
+
+        otherLocks = [ NamedAtomicLock.NamedAtomicLock(name, lockDir=self.lockDir) for name in names ]
+        assert otherLocks[0].acquire(1) and otherLocks[2].acquire(1)
+
+        candidates = [ NamedAtomicLock.NamedAtomicLock(name, lockDir=self.lockDir) for name in names ]
+
+        wonLock = NamedAtomicLock.acquireAny(candidates, timeout=0)
+
+        assert wonLock is not None and wonLock.name == names[1] , 'Expected to win the only free lock. Got: %s' %(repr(wonLock and wonLock.name), )
+        assert wonLock.hasLock , 'Expected won lock to be held'
+
+        startTime = time.time()
+        assert NamedAtomicLock.acquireAny(candidates, timeout=.2) is None , 'Expected None when no candidate is free'
+        assert time.time() - startTime < .3 , 'Expected one overall timeout, not one per candidate'
+
+        releaseTimer = threading.Timer(.2, otherLocks[2].release)
+        releaseTimer.start()
+
+        wonLock = NamedAtomicLock.acquireAny(candidates, timeout=2)
+        releaseTimer.join()
+
+        assert wonLock is not None and wonLock.name == names[2] , 'Expected to win the lock which was released while waiting'
+
+        otherLocks[0].release()
+        for candidate in candidates:
+            candidate.release()
+
+
+    def test_poolLru(self):
+        '''
+            test_poolLru - Test NamedLockPool with least-recently-used ordering
+        '''
+        names = [ self.lockPrefix + 'test_Pool_lru%d' %(i, ) for i in range(3) ]
+
+        pool = NamedAtomicLock.NamedLockPool(names, lockDir=self.lockDir, order=NamedAtomicLock.Pool.ORDER_LRU)
+
+        wonNames = []
+        for i in range(6):
+            wonLock = pool.acquire(timeout=0)
+            assert wonLock is not None , 'Expected to acquire a free member'
+            wonNames.append(wonLock.name)
+            assert pool.release(wonLock) , 'Expected to release member'
+
+        assert wonNames == names + names , 'Expected least recently used member to be chosen each time. Got: %s' %(repr(wonNames), )
+
+        heldLocks = [ pool.acquire(timeout=0) for i in range(3) ]
+        assert None not in heldLocks , 'Expected to acquire every member'
+        assert pool.acquire(timeout=0) is None , 'Expected None with every member held'
+        assert len(pool.getHeld()) == 3 , 'Expected getHeld to report all members'
+
+        assert pool.release() , 'Expected to release all held members'
+        assert not pool.getHeld() , 'Expected no members held after release'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
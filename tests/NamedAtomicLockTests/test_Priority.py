@@ -0,0 +1,105 @@
+#!/usr/bin/env GoodTests.py
+'''
+    Priority acquisition unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import NamedAtomicLock
+
+class TestPriority(object):
+    '''
+        TestPriority - Tests for acquire with a priority
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+    def _runWaiters(self, lockName, priorities):
+        '''
+            _runWaiters - Hold #lockName, start a waiter thread per priority (in order), then release and record the order they got the lock
+        '''
+        holder = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir)
+        assert holder.acquire(1)
+
+        order = []
+        def _waiter(priority):
+            lockObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir)
+            if lockObj.acquire(timeout=5, priority=priority):
+                order.append(priority)
+                time.sleep(.05)
+                lockObj.release()
+
+        threads = []
+        for priority in priorities:
+            thread = threading.Thread(target=_waiter, args=(priority, ))
+            thread.start()
+            threads.append(thread)
+            # Let each register before the next
+            time.sleep(.15)
+
+        holder.release()
+        for thread in threads:
+            thread.join()
+
+        return order
+
+
+    def test_priorityOrder(self):
+        '''
+            test_priorityOrder - Test that a higher priority waiter gets the lock before an earlier, lower priority waiter
+        '''
+        lockName = self.lockPrefix + 'test_Priority_order'
+
+        order = self._runWaiters(lockName, [0, 5, 10])
+
+        assert order == [10, 5, 0] , 'Expected waiters to get the lock in priority order. Got: %s' %(repr(order), )
+        assert not os.path.exists(NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir).lockPath + NamedAtomicLock.PRIORITY_WAITERS_SUFFIX) , 'Expected wait area to be removed once empty'
+
+
+    def test_aging(self):
+        '''
+            test_aging - Test that a long-waiting low priority waiter ages past a newer higher priority one
+        '''
+        lockName = self.lockPrefix + 'test_Priority_aging'
+
+        oldAgingRate = NamedAtomicLock.PRIORITY_AGING_RATE
+        NamedAtomicLock.PRIORITY_AGING_RATE = 100.0
+        try:
+            # The batch waiter has waited .3s longer, worth 30 priority
+            order = self._runWaiters(lockName, [0, 10, 10])
+        finally:
+            NamedAtomicLock.PRIORITY_AGING_RATE = oldAgingRate
+
+        assert order[0] == 0 , 'Expected aged low priority waiter to go first. Got: %s' %(repr(order), )
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
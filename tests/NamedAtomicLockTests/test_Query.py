@@ -0,0 +1,120 @@
+#!/usr/bin/env GoodTests.py
+'''
+    queryLocks unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import NamedAtomicLock
+
+class TestQuery(object):
+    '''
+        TestQuery - Tests for queryLocks
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def _checkStatuses(self, lockDir, shardLevels, numThreads):
+        '''
+            _checkStatuses - Create held, expired, and missing locks in #lockDir, and check queryLocks reports each correctly
+        '''
+        heldNames = [ self.lockPrefix + 'held_%d' %(i, ) for i in range(5) ]
+        expiredNames = [ self.lockPrefix + 'expired_%d' %(i, ) for i in range(5) ]
+        missingNames = [ self.lockPrefix + 'missing_%d' %(i, ) for i in range(5) ]
+
+        locks = []
+        for name in heldNames + expiredNames:
+            lock = NamedAtomicLock.NamedAtomicLock(name, lockDir=lockDir, maxLockAge=60, shardLevels=shardLevels)
+            assert lock.acquire(timeout=0) , 'Expected to acquire lock "%s"' %(name, )
+            locks.append(lock)
+
+        oldTime = time.time() - 120
+        for lock in locks[len(heldNames):]:
+            os.utime(lock.lockPath, (oldTime, oldTime))
+
+        queryNames = missingNames[:2] + heldNames + expiredNames + missingNames[2:]
+        statuses = NamedAtomicLock.queryLocks(queryNames, lockDir=lockDir, maxLockAge=60, shardLevels=shardLevels, numThreads=numThreads)
+
+        assert [ status.name for status in statuses ] == queryNames , 'Expected statuses in the order of the names given'
+
+        for status in statuses:
+            if status.name in heldNames:
+                assert status.held and not status.expired , 'Expected "%s" to be held, but got: %s' %(status.name, repr(status))
+                assert 0 <= status.age < 10 , 'Expected a small age for "%s", but got %s' %(status.name, repr(status.age))
+            elif status.name in expiredNames:
+                assert not status.held and status.expired , 'Expected "%s" to be expired, but got: %s' %(status.name, repr(status))
+                assert 110 < status.age < 130 , 'Expected an age of about 120 for "%s", but got %s' %(status.name, repr(status.age))
+            else:
+                assert not status.held and not status.expired and status.age is None , 'Expected "%s" to be missing, but got: %s' %(status.name, repr(status))
+
+            assert status.held == NamedAtomicLock.NamedAtomicLock(status.name, lockDir=lockDir, maxLockAge=60, shardLevels=shardLevels).isHeld , \
+                'Expected held to match isHeld for "%s"' %(status.name, )
+
+        for lock in locks:
+            lock.release(forceRelease=True)
+
+    def test_scan(self):
+        '''
+            test_scan - Test queryLocks where most of the directory is queried, so it is listed once
+        '''
+        lockDir = tempfile.mkdtemp(prefix='scan_', dir=self.lockDir)
+
+        self._checkStatuses(lockDir, 0, NamedAtomicLock.Query.QUERY_THREADS)
+
+    def test_stat(self):
+        '''
+            test_stat - Test queryLocks where few names of a large directory are queried, so each is stat'd, serially and from threads
+        '''
+        lockDir = tempfile.mkdtemp(prefix='stat_', dir=self.lockDir)
+        for i in range(200):
+            os.mkdir(os.path.join(lockDir, 'other_%d' %(i, )))
+
+        self._checkStatuses(lockDir, 0, 1)
+
+        # Enough names to use the thread pool
+        names = [ 'other_%d' %(i, ) for i in range(NamedAtomicLock.Query.QUERY_PARALLEL_MIN) ] + [ 'missing_%d' %(i, ) for i in range(NamedAtomicLock.Query.QUERY_PARALLEL_MIN) ]
+        for i in range(1000):
+            os.mkdir(os.path.join(lockDir, 'more_%d' %(i, )))
+
+        statuses = NamedAtomicLock.queryLocks(names, lockDir=lockDir, numThreads=4)
+        assert [ status.held for status in statuses ] == [ name.startswith('other_') for name in names ] , 'Expected only the existing names to be held'
+
+    def test_sharded(self):
+        '''
+            test_sharded - Test queryLocks with a sharded layout, including shard directories which do not exist
+        '''
+        lockDir = tempfile.mkdtemp(prefix='sharded_', dir=self.lockDir)
+
+        self._checkStatuses(lockDir, 2, NamedAtomicLock.Query.QUERY_THREADS)
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,107 @@
+#!/usr/bin/env GoodTests.py
+'''
+    NamedRateLimiter unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import NamedAtomicLock
+
+class TestRateLimiter(object):
+    '''
+        TestRateLimiter - Tests for NamedRateLimiter
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_sharedBucket(self):
+        '''
+            test_sharedBucket - Test that limiters sharing a name share tokens, and that waits are sized to the refill
+        '''
+        limiterName = self.lockPrefix + 'test_RateLimiter_shared'
+
+        limiter = NamedAtomicLock.NamedRateLimiter(limiterName, rate=10, capacity=5, lockDir=self.lockDir)
+        otherLimiter = NamedAtomicLock.NamedRateLimiter(limiterName, rate=10, capacity=5, lockDir=self.lockDir)
+
+        try:
+            assert limiter.tryTake(3) , 'Expected new bucket to start full'
+            assert otherLimiter.tryTake(2) , 'Expected other limiter to take the rest'
+            assert not limiter.tryTake(1) , 'Expected empty shared bucket to refuse'
+
+            waitTime = otherLimiter.timeUntilAvailable(1)
+            assert 0 < waitTime <= .1 , 'Expected about .1s until the next token at rate=10, got %f' %(waitTime, )
+
+            startTime = time.time()
+            assert limiter.take(2, timeout=1) , 'Expected take to wait for the refill'
+            timeTaken = time.time() - startTime
+
+            assert .15 <= timeTaken < .3 , 'Expected take(2) to wait about .2s for the refill, took %f' %(timeTaken, )
+
+            assert limiter.take(5, timeout=.1) is False , 'Expected take to give up when the refill cannot happen before the timeout'
+
+            gotException = False
+            try:
+                limiter.tryTake(6)
+            except ValueError:
+                gotException = True
+
+            assert gotException , 'Expected taking more than capacity to raise ValueError'
+        finally:
+            limiter.close()
+            otherLimiter.close()
+
+
+    def test_batching(self):
+        '''
+            test_batching - Test that batchSize reserves tokens locally
+        '''
+        limiterName = self.lockPrefix + 'test_RateLimiter_batch'
+
+        with NamedAtomicLock.NamedRateLimiter(limiterName, rate=1, capacity=10, lockDir=self.lockDir, batchSize=4) as limiter:
+            assert limiter.tryTake(1) , 'Expected to take a token'
+            assert limiter.reserved == 3 , 'Expected 3 tokens to be held in reserve, got %s' %(repr(limiter.reserved), )
+
+            # Hold the bucket lock elsewhere, so the reserve must be used without it
+            blocker = NamedAtomicLock.NamedAtomicLock(limiterName + '.bucket.lock', lockDir=self.lockDir)
+            assert blocker.acquire(1)
+            try:
+                for i in range(3):
+                    assert limiter.tryTake(1) , 'Expected to take from reserve without the lock'
+            finally:
+                blocker.release()
+
+            with NamedAtomicLock.NamedRateLimiter(limiterName, rate=1, capacity=10, lockDir=self.lockDir) as otherLimiter:
+                assert otherLimiter.tryTake(6) , 'Expected 6 tokens left in the shared bucket'
+                assert not otherLimiter.tryTake(1) , 'Expected shared bucket to be empty'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,105 @@
+#!/usr/bin/env GoodTests.py
+'''
+    Sharded layout unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import NamedAtomicLock
+
+class TestSharding(object):
+    '''
+        TestSharding - Tests for the hash-bucketed (shardLevels) layout
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_shardedPath(self):
+        '''
+            test_shardedPath - Test that the lock path is placed within hashed subdirectories
+        '''
+        lockName = self.lockPrefix + 'test_Sharding_path'
+
+        lockObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, shardLevels=2)
+
+        assert lockObj.lockPath.endswith(os.sep + lockName) , 'Expected lockPath to end with the lock name. Got: ' + lockObj.lockPath
+
+        relPath = lockObj.lockPath[len(self.lockDir) + 1:]
+        pathParts = relPath.split(os.sep)
+
+        assert len(pathParts) == 3 , 'Expected two shard levels plus the lock name, got: %s' %(repr(pathParts), )
+        assert len(pathParts[0]) == len(pathParts[1]) == NamedAtomicLock.SHARD_WIDTH , 'Expected each shard level to be SHARD_WIDTH characters. Got: %s' %(repr(pathParts), )
+
+        sameObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, shardLevels=2)
+        assert sameObj.lockPath == lockObj.lockPath , 'Expected the same name to always map to the same shard'
+
+        unshardedObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir)
+        assert unshardedObj.lockPath == self.lockDir + os.sep + lockName , 'Expected default (shardLevels=0) to not change the lock path'
+
+        gotException = False
+        try:
+            NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, shardLevels=-1)
+        except ValueError:
+            gotException = True
+
+        assert gotException , 'Expected negative shardLevels to raise a ValueError'
+
+
+    def test_shardedAcquireRelease(self):
+        '''
+            test_shardedAcquireRelease - Test acquire/release with a sharded layout, including after the shard dir is removed
+        '''
+        lockName = self.lockPrefix + 'test_Sharding_acquire'
+
+        lockObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, shardLevels=2)
+        altObj = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, shardLevels=2)
+
+        assert not os.path.isdir(lockObj.shardDir) , 'Expected shard directory to not be created until acquire'
+        assert not altObj.isHeld , 'Expected fresh lock to not be held'
+
+        assert lockObj.acquire(1) , 'Expected to acquire sharded lock'
+        assert os.path.isdir(lockObj.shardDir) , 'Expected shard directory to be created on acquire'
+
+        assert altObj.isHeld , 'Expected alt object to see sharded lock as held'
+        assert altObj.acquire(.2) is False , 'Expected alt object to not be able to acquire held sharded lock'
+
+        assert lockObj.release() , 'Expected to release sharded lock'
+        assert not altObj.isHeld , 'Expected alt object to see sharded lock as released'
+
+        # Remove the shard directory out from under the cache, acquire should recreate it
+        shutil.rmtree(os.path.join(self.lockDir, os.path.relpath(lockObj.shardDir, self.lockDir).split(os.sep)[0]))
+
+        assert altObj.acquire(1) , 'Expected to acquire after shard directory was removed'
+        assert altObj.release() , 'Expected to release after reacquire'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
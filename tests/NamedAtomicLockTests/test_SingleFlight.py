@@ -0,0 +1,121 @@
+#!/usr/bin/env GoodTests.py
+'''
+    SingleFlight unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import NamedAtomicLock
+
+class TestSingleFlight(object):
+    '''
+        TestSingleFlight - Tests for SingleFlightCache and singleFlight
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_singleComputation(self):
+        '''
+            test_singleComputation - Test that concurrent callers for the same key compute the result only once
+        '''
+        cache = NamedAtomicLock.SingleFlightCache(self.lockPrefix + 'test_SingleFlight_single', lockDir=self.lockDir)
+
+        callCount = [0]
+        def _compute(value):
+            callCount[0] += 1
+            time.sleep(.3)
+            return value * 2
+
+        results = []
+        def _runGet():
+            results.append( cache.get('theKey', _compute, 21) )
+
+        threads = [ threading.Thread(target=_runGet) for i in range(5) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert callCount[0] == 1 , 'Expected result to be computed once, but was computed %d times' %(callCount[0], )
+        assert results == [42] * 5 , 'Expected every caller to get the computed result. Got: %s' %(repr(results), )
+
+        # A new cache object with the same name shares the stored result
+        otherCache = NamedAtomicLock.SingleFlightCache(cache.name, lockDir=self.lockDir)
+        result = otherCache.get('theKey', _compute, 1)
+
+        assert result == 42 , 'Expected stored result to be shared, got: %s' %(repr(result), )
+        assert callCount[0] == 1 , 'Expected stored result to not be recomputed'
+
+        otherCache.invalidate('theKey')
+        result = otherCache.get('theKey', _compute, 1)
+
+        assert result == 2 , 'Expected result to be recomputed after invalidate, got: %s' %(repr(result), )
+
+
+    def test_ttlAndEviction(self):
+        '''
+            test_ttlAndEviction - Test ttl expiry and LRU eviction via the decorator
+        '''
+        callArgs = []
+
+        @NamedAtomicLock.singleFlight(self.lockPrefix + 'test_SingleFlight_evict', lockDir=self.lockDir, ttl=.5, maxEntries=2)
+        def _compute(value):
+            callArgs.append(value)
+            return value + 1
+
+        assert _compute(1) == 2 , 'Expected decorated function to return its result'
+        assert _compute(1) == 2 , 'Expected decorated function to return stored result'
+        assert callArgs == [1] , 'Expected second call to use stored result. Calls: %s' %(repr(callArgs), )
+
+        # Give entries distinct mtimes for LRU
+        time.sleep(.05)
+        _compute(2)
+        time.sleep(.05)
+        _compute(1)
+        time.sleep(.05)
+        _compute(3)
+
+        storedEntries = [ entryName for entryName in os.listdir(_compute.cache.storeDir) if not entryName.startswith('.') ]
+        assert len(storedEntries) == 2 , 'Expected maxEntries=2 to bound the store, but found %d entries' %(len(storedEntries), )
+
+        # 2 was least recently used, so should have been evicted
+        _compute(1)
+        _compute(2)
+        assert callArgs == [1, 2, 3, 2] , 'Expected least recently used entry to be evicted. Calls: %s' %(repr(callArgs), )
+
+        time.sleep(.6)
+        _compute(1)
+        assert callArgs[-1] == 1 , 'Expected result to be recomputed after ttl. Calls: %s' %(repr(callArgs), )
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,130 @@
+#!/usr/bin/env GoodTests.py
+'''
+    Lock striping unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import NamedAtomicLock
+
+class TestStriped(object):
+    '''
+        TestStriped - Tests for StripedNamedAtomicLock
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_stripeMapping(self):
+        '''
+            test_stripeMapping - Test that keys map onto a bounded, consistent set of stripes
+        '''
+        lockName = self.lockPrefix + 'test_Striped_mapping'
+
+        striped = NamedAtomicLock.StripedNamedAtomicLock(lockName, numStripes=8, lockDir=self.lockDir)
+        otherStriped = NamedAtomicLock.StripedNamedAtomicLock(lockName, numStripes=8, lockDir=self.lockDir)
+
+        indexes = set()
+        for customerId in range(1000):
+            index = striped.getStripeIndex(customerId)
+            assert index == otherStriped.getStripeIndex(customerId) , 'Expected key to map to the same stripe on every object'
+            indexes.add(index)
+
+        assert indexes == set(range(8)) , 'Expected 1000 keys to spread over all 8 stripes, got: %s' %(repr(sorted(indexes)), )
+
+        assert striped.getLock(5).name == lockName + '.stripe%d' %(striped.getStripeIndex(5), ) , 'Expected stripe lock to be named after the stripe index'
+
+        gotException = False
+        try:
+            NamedAtomicLock.StripedNamedAtomicLock(lockName, numStripes=0, lockDir=self.lockDir)
+        except ValueError:
+            gotException = True
+
+        assert gotException , 'Expected numStripes=0 to raise ValueError'
+
+
+    def test_acquireMany(self):
+        '''
+            test_acquireMany - Test single and multi-key acquisition, and per-stripe hold counting
+        '''
+        lockName = self.lockPrefix + 'test_Striped_many'
+
+        striped = NamedAtomicLock.StripedNamedAtomicLock(lockName, numStripes=4, lockDir=self.lockDir)
+        otherStriped = NamedAtomicLock.StripedNamedAtomicLock(lockName, numStripes=4, lockDir=self.lockDir)
+
+        # Find two distinct keys on the same stripe, and one on another stripe
+        keysByStripe = {}
+        for key in range(100):
+            keysByStripe.setdefault(striped.getStripeIndex(key), []).append(key)
+
+        (sameStripeKey1, sameStripeKey2) = keysByStripe[0][:2]
+        otherStripeKey = keysByStripe[1][0]
+
+        assert striped.acquireMany([sameStripeKey1, sameStripeKey2, otherStripeKey], timeout=1) , 'Expected acquireMany to succeed on free stripes'
+        assert striped._holdCounts[0] == 1 , 'Expected acquireMany to de-duplicate stripes'
+
+        assert otherStriped.acquire(sameStripeKey2, timeout=.1) is False , 'Expected other object to not be able to acquire held stripe'
+        assert otherStriped.acquireMany([keysByStripe[2][0], otherStripeKey], timeout=.1) is False , 'Expected acquireMany to fail when any stripe is held'
+        assert not otherStriped.getStripe(2).isHeld , 'Expected failed acquireMany to release stripes it did get'
+
+        assert striped.releaseMany([sameStripeKey1, sameStripeKey2, otherStripeKey]) , 'Expected releaseMany to succeed'
+        assert not striped.getStripe(0).isHeld and not striped.getStripe(1).isHeld , 'Expected stripes to be released'
+
+        # Two separate acquires on the same stripe are counted
+        assert striped.acquire(sameStripeKey1, timeout=1) , 'Expected to acquire key'
+        assert striped.acquire(sameStripeKey2, timeout=1) , 'Expected to acquire second key on same stripe'
+
+        assert striped.release(sameStripeKey1) , 'Expected to release first key'
+        assert striped.getStripe(0).isHeld , 'Expected stripe to stay held while second key is held'
+
+        assert striped.release(sameStripeKey2) , 'Expected to release second key'
+        assert not striped.getStripe(0).isHeld , 'Expected stripe to be released once all keys are released'
+
+    def test_releasedOutFromUnder(self):
+        '''
+            test_releasedOutFromUnder - Test that hold counts reset when a stripe is released by cleanup ( releaseAllHeldLocks )
+        '''
+        lockName = self.lockPrefix + 'test_Striped_cleanup'
+
+        striped = NamedAtomicLock.StripedNamedAtomicLock(lockName, numStripes=4, lockDir=self.lockDir)
+
+        assert striped.acquire('key', timeout=1) , 'Expected to acquire stripe'
+        assert NamedAtomicLock.releaseAllHeldLocks() >= 1 , 'Expected cleanup to release the stripe'
+        assert not striped.getLock('key').isHeld , 'Expected stripe to be released by cleanup'
+
+        assert not striped.release('key') , 'Expected release of a stripe released by cleanup to fail'
+
+        assert striped.acquire('key', timeout=1) , 'Expected to acquire stripe again'
+        assert striped.release('key') , 'Expected to release stripe'
+        assert not striped.getLock('key').isHeld , 'Expected one release to free the stripe, as the old hold count was reset'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,169 @@
+#!/usr/bin/env GoodTests.py
+'''
+    NamedBarrier and NamedEvent unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import NamedAtomicLock
+
+class TestSync(object):
+    '''
+        TestSync - Tests for NamedBarrier and NamedEvent
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_event(self):
+        '''
+            test_event - Test set/clear/wait, and that waiters wake promptly on set
+        '''
+        eventName = self.lockPrefix + 'test_Sync_event'
+
+        event = NamedAtomicLock.NamedEvent(eventName, lockDir=self.lockDir)
+        otherEvent = NamedAtomicLock.NamedEvent(eventName, lockDir=self.lockDir)
+
+        assert not event.isSet() , 'Expected new event to not be set'
+        assert event.wait(.1) is False , 'Expected wait on unset event to time out'
+
+        wokeAt = []
+        def _waiter():
+            if otherEvent.wait(5):
+                wokeAt.append(time.time())
+
+        waiterThread = threading.Thread(target=_waiter)
+        waiterThread.start()
+
+        time.sleep(.2)
+        setAt = time.time()
+        event.set()
+        waiterThread.join()
+
+        assert wokeAt , 'Expected waiter to see the event set'
+        assert wokeAt[0] - setAt < .05 , 'Expected waiter to wake promptly after set, took %f seconds' %(wokeAt[0] - setAt, )
+
+        assert otherEvent.isSet() , 'Expected event to be set for every object sharing the name'
+        assert otherEvent.wait(0) , 'Expected wait on set event to return right away'
+
+        event.clear()
+        assert not otherEvent.isSet() , 'Expected event to be cleared'
+
+        assert not os.path.exists(event.eventPath + '.waiters') , 'Expected the waiters directory to be removed after the last waiter left'
+
+
+    def test_barrier(self):
+        '''
+            test_barrier - Test that the barrier releases all parties together, and resets for the next generation
+        '''
+        barrierName = self.lockPrefix + 'test_Sync_barrier'
+
+        results = []
+        releasedAt = []
+        def _participant(delay):
+            barrier = NamedAtomicLock.NamedBarrier(barrierName, 3, lockDir=self.lockDir)
+            time.sleep(delay)
+            results.append( barrier.wait(5) )
+            releasedAt.append(time.time())
+
+        for generation in range(2):
+            threads = [ threading.Thread(target=_participant, args=(delay, )) for delay in (0, .1, .3) ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert results == [True] * 6 , 'Expected every participant to be released. Got: %s' %(repr(results), )
+
+        for generationStart in (0, 3):
+            spread = max(releasedAt[generationStart:generationStart+3]) - min(releasedAt[generationStart:generationStart+3])
+            assert spread < .05 , 'Expected all parties to be released together, but spread was %f seconds' %(spread, )
+
+        barrier = NamedAtomicLock.NamedBarrier(barrierName, 3, lockDir=self.lockDir)
+        assert barrier.generation == 2 , 'Expected two generations to have completed, got %d' %(barrier.generation, )
+
+        assert barrier.wait(.1) is False , 'Expected a lone participant to time out'
+        assert barrier.numWaiting == 0 , 'Expected timed out participant to leave the barrier'
+
+
+    def test_deadParticipant(self):
+        '''
+            test_deadParticipant - Test that a participant which died while waiting is not counted
+        '''
+        barrierName = self.lockPrefix + 'test_Sync_dead'
+
+        modulePath = os.path.dirname(os.path.dirname(os.path.abspath(NamedAtomicLock.__file__)))
+        childCode = 'import sys; sys.path.insert(0, %r); import NamedAtomicLock; NamedAtomicLock.NamedBarrier(%r, 2, lockDir=%r).wait(30)' %(modulePath, barrierName, self.lockDir)
+
+        childProcess = subprocess.Popen([sys.executable, '-c', childCode])
+
+        barrier = NamedAtomicLock.NamedBarrier(barrierName, 2, lockDir=self.lockDir)
+        for i in range(100):
+            if barrier.numWaiting == 1:
+                break
+            time.sleep(.05)
+
+        assert barrier.numWaiting == 1 , 'Expected child process to be waiting at the barrier'
+
+        childProcess.kill()
+        childProcess.wait()
+
+        assert barrier.numWaiting == 0 , 'Expected dead participant to not be counted'
+        assert barrier.wait(.2) is False , 'Expected barrier to not be released by a dead participant'
+
+    def test_remoteParticipant(self):
+        '''
+            test_remoteParticipant - Test that a participant on another host ( whose pid we cannot check ) is counted until maxParticipantAge
+        '''
+        barrierName = self.lockPrefix + 'test_Sync_remote'
+
+        barrier = NamedAtomicLock.NamedBarrier(barrierName, 3, lockDir=self.lockDir, maxParticipantAge=.5)
+
+        # Arrived on another host, with a pid which does not exist here
+        barrier._lockState()
+        try:
+            state = barrier._readState()
+            state['arrived']['otherhost.example.com:%d:1' %(2 ** 22 + 1, )] = time.time()
+            barrier._writeState(state)
+        finally:
+            barrier._stateLock.release()
+
+        assert barrier.numWaiting == 1 , 'Expected participant on another host to be counted'
+
+        time.sleep(.6)
+        assert barrier.numWaiting == 0 , 'Expected participant on another host to be dropped after maxParticipantAge'
+
+        assert barrier.wait(.1) is False , 'Expected a lone participant to time out'
+        assert not os.path.exists(barrier.statePath + '.waiters') , 'Expected the waiters directory to be removed after the last waiter left'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,179 @@
+#!/usr/bin/env GoodTests.py
+'''
+    Tracing hooks unit tests for NamedAtomicLock
+'''
+
+import errno
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import NamedAtomicLock
+
+class TestTracing(object):
+    '''
+        TestTracing - Tests for the "hooks" option of NamedAtomicLock, and ChromeTraceHooks
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_hookEvents(self):
+        '''
+            test_hookEvents - Test that each hook is called at the right point, with sensible durations
+        '''
+
+        class RecordingHooks(NamedAtomicLock.LockHooks):
+
+            def __init__(self):
+                self.events = []
+
+            def onAcquireStart(self, lockObj, timestamp):
+                self.events.append( ('acquireStart', lockObj.name) )
+
+            def onAcquired(self, lockObj, timestamp, waitTime):
+                self.events.append( ('acquired', lockObj.name, waitTime) )
+
+            def onTimeout(self, lockObj, timestamp, waitTime):
+                self.events.append( ('timeout', lockObj.name, waitTime) )
+
+            def onRelease(self, lockObj, timestamp, holdTime):
+                self.events.append( ('release', lockObj.name, holdTime) )
+
+            def onExpiredSteal(self, lockObj, timestamp):
+                self.events.append( ('expiredSteal', lockObj.name) )
+
+            def onLost(self, lockObj, timestamp):
+                self.events.append( ('lost', lockObj.name) )
+
+        lockName = self.lockPrefix + 'test_Tracing_events'
+
+        hooks = RecordingHooks()
+
+        lock = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, maxLockAge=1, hooks=hooks)
+        otherLock = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, maxLockAge=1, hooks=hooks)
+
+        assert lock.acquire(timeout=1) , 'Expected to acquire lock'
+        time.sleep(.1)
+        assert lock.release() , 'Expected to release lock'
+
+        assert [ event[0] for event in hooks.events ] == ['acquireStart', 'acquired', 'release'] , 'Expected acquireStart, acquired, release but got: %s' %(repr(hooks.events), )
+        assert hooks.events[1][1] == lockName , 'Expected hooks to be given the lock, with its name'
+        assert .09 < hooks.events[2][2] < 1 , 'Expected hold time of about .1 seconds, but got %s' %(repr(hooks.events[2][2]), )
+
+        hooks.events = []
+        assert lock.acquire(timeout=1) , 'Expected to acquire lock'
+        assert not otherLock.acquire(timeout=.2) , 'Expected acquire of held lock to time out'
+
+        assert [ event[0] for event in hooks.events ] == ['acquireStart', 'acquired', 'acquireStart', 'timeout'] , 'Expected a timeout event but got: %s' %(repr(hooks.events), )
+        assert .15 < hooks.events[3][2] < 1 , 'Expected wait time of about .2 seconds, but got %s' %(repr(hooks.events[3][2]), )
+
+        # Let it expire, and have the other lock take it over
+        hooks.events = []
+        time.sleep(1.1)
+        assert otherLock.acquire(timeout=1) , 'Expected to take over expired lock'
+        assert 'expiredSteal' in [ event[0] for event in hooks.events ] , 'Expected an expiredSteal event but got: %s' %(repr(hooks.events), )
+
+        hooks.events = []
+        assert not lock.release() , 'Expected release of an expired lock to fail'
+        assert [ event[0] for event in hooks.events ] == ['lost'] , 'Expected a lost event but got: %s' %(repr(hooks.events), )
+
+        assert otherLock.release() , 'Expected to release lock'
+
+        # An error out of acquire ( like DeadlockError, or a full lockDir ) still ends the wait, as a timeout by default
+        def failingTryAcquire():
+            raise OSError(errno.ENOSPC, 'No space left on device', lock.lockPath)
+
+        hooks.events = []
+        lock._tryAcquire = failingTryAcquire
+        try:
+            lock.acquire(timeout=1)
+        except OSError:
+            pass
+        else:
+            raise AssertionError('Expected acquire to raise the error from _tryAcquire')
+        finally:
+            del lock._tryAcquire
+
+        assert [ event[0] for event in hooks.events ] == ['acquireStart', 'timeout'] , 'Expected acquireStart, timeout on an acquire error but got: %s' %(repr(hooks.events), )
+
+    def test_chromeTrace(self):
+        '''
+            test_chromeTrace - Test that ChromeTraceHooks writes wait and hold spans as trace event JSON
+        '''
+        lockName = self.lockPrefix + 'test_Tracing_chrome'
+
+        tracePath = os.path.join(self.lockDir, 'trace.json')
+        hooks = NamedAtomicLock.ChromeTraceHooks(tracePath)
+
+        lock = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, hooks=hooks)
+        otherLock = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, hooks=hooks)
+
+        assert lock.acquire(timeout=1) , 'Expected to acquire lock'
+        assert not otherLock.acquire(timeout=.1) , 'Expected acquire of held lock to time out'
+        assert lock.release() , 'Expected to release lock'
+
+        def failingTryAcquire():
+            raise OSError(errno.ENOSPC, 'No space left on device', lock.lockPath)
+
+        otherLock._tryAcquire = failingTryAcquire
+        try:
+            otherLock.acquire(timeout=1)
+        except OSError:
+            pass
+        else:
+            raise AssertionError('Expected acquire to raise the error from _tryAcquire')
+
+        hooks.save()
+
+        with open(tracePath, 'rt') as f:
+            trace = json.load(f)
+
+        events = trace['traceEvents']
+        eventNames = [ event['name'] for event in events ]
+
+        assert eventNames.count('wait ' + lockName) == 3 , 'Expected three wait spans, but got: %s' %(repr(eventNames), )
+        assert 'error ' + lockName in eventNames , 'Expected an error instant, but got: %s' %(repr(eventNames), )
+        assert 'timeout ' + lockName in eventNames , 'Expected a timeout instant, but got: %s' %(repr(eventNames), )
+        assert 'hold ' + lockName in eventNames , 'Expected a hold span, but got: %s' %(repr(eventNames), )
+
+        for event in events:
+            assert event['pid'] == os.getpid() , 'Expected pid on every event'
+            if event['ph'] == 'X':
+                assert event['dur'] >= 0 , 'Expected non-negative duration'
+
+        holdEvent = [ event for event in events if event['name'] == 'hold ' + lockName ][0]
+        assert holdEvent['dur'] >= 100000 , 'Expected hold span to cover the .1 second timed out wait, but got %f us' %(holdEvent['dur'], )
+
+        hooks.clear()
+        assert hooks.getTrace()['traceEvents'] == [] , 'Expected no events after clear'
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,238 @@
+#!/usr/bin/env GoodTests.py
+'''
+    HoldWatchdog unit tests for NamedAtomicLock
+'''
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import NamedAtomicLock
+
+class TestWatchdog(object):
+    '''
+        TestWatchdog - Tests for HoldWatchdog
+    '''
+
+    def setup_class(self):
+        '''
+            setup_class - Called once to setup this class for testing.
+
+                Sets the following attributes:
+
+                  self.lockPrefix - A unique prefix based on the uid, unix timestamp, and random numbers
+
+                  self.lockDir - A private lock directory, removed on teardown_class
+        '''
+        
+        randomNumbers = [ random.randint(1000, 9999) for i in range(3) ]
+
+        self.lockPrefix = "%d_%d_%s__" %( os.getuid(), int(time.time()), ','.join([str(num) for num in randomNumbers]))
+
+        self.lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockTests_')
+
+    def teardown_class(self):
+        '''
+            teardown_class - Remove the private lock directory
+        '''
+        shutil.rmtree(self.lockDir, ignore_errors=True)
+
+
+    def test_callbackAndAutoRelease(self):
+        '''
+            test_callbackAndAutoRelease - Test that a hold past its budget runs the callback and is released, and one within budget is left alone
+        '''
+        lockName = self.lockPrefix + 'test_Watchdog_autoRelease'
+
+        watchdog = NamedAtomicLock.HoldWatchdog()
+        try:
+            exceeded = []
+            def onExceeded(lockObj, holdTime):
+                exceeded.append( (lockObj.name, holdTime) )
+
+            lock = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, maxLockAge=10)
+            otherLock = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, maxLockAge=10)
+
+            # Released within budget
+            assert lock.acquire(timeout=1) , 'Expected to acquire lock'
+            watchdog.watch(lock, .3, callback=onExceeded, autoRelease=True)
+            assert lock.release() , 'Expected to release lock within budget'
+            time.sleep(.5)
+            assert not exceeded , 'Expected no callback for a hold released within budget, but got: %s' %(repr(exceeded), )
+
+            # Runaway hold
+            assert lock.acquire(timeout=1) , 'Expected to acquire lock'
+            watchdog.watch(lock, .3, callback=onExceeded, autoRelease=True)
+
+            startTime = time.time()
+            assert otherLock.acquire(timeout=2) , 'Expected waiter to get the lock after the watchdog released it'
+            waitTime = time.time() - startTime
+
+            assert waitTime < 1.5 , 'Expected the lock back well before maxLockAge, but waited %f seconds' %(waitTime, )
+            assert len(exceeded) == 1 and exceeded[0][0] == lockName , 'Expected one callback for the lock, but got: %s' %(repr(exceeded), )
+            assert exceeded[0][1] >= .3 , 'Expected reported hold time past the budget, but got %f' %(exceeded[0][1], )
+
+            assert not lock.release() , 'Expected holder release to fail after the watchdog released its lock'
+            assert otherLock.release() , 'Expected to release lock'
+
+            assert lock.acquire(timeout=1) , 'Expected to acquire lock'
+            try:
+                watchdog.watch(otherLock, 1)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError('Expected ValueError watching a lock which is not held')
+            assert lock.release() , 'Expected to release lock'
+        finally:
+            watchdog.stop()
+
+    def test_releaseRace(self):
+        '''
+            test_releaseRace - Test that the holder's release racing an autoRelease neither errors, nor removes a waiter's lock
+        '''
+        lockName = self.lockPrefix + 'test_Watchdog_race'
+
+        watchdog = NamedAtomicLock.HoldWatchdog()
+        try:
+            lock = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, maxLockAge=10)
+            otherLock = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir, maxLockAge=10)
+
+            holderThread = threading.current_thread()
+            watchdogInRelease = threading.Event()
+            holderReleased = threading.Event()
+
+            def _getNowPausingWatchdog():
+                # Pause the watchdog in the middle of its release, and have the holder release in that window
+                if threading.current_thread() is not holderThread and not watchdogInRelease.is_set():
+                    watchdogInRelease.set()
+                    holderReleased.wait(.5)
+                return time.time()
+
+            assert lock.acquire(timeout=1) , 'Expected to acquire lock'
+            lock._getNow = _getNowPausingWatchdog
+            watchdog.watch(lock, .1, autoRelease=True)
+
+            assert watchdogInRelease.wait(2) , 'Expected the watchdog to release the lock'
+
+            released = lock.release()
+            holderReleased.set()
+
+            assert released is False , 'Expected holder release to fail, as the watchdog released its lock first'
+
+            assert otherLock.acquire(timeout=1) , 'Expected waiter to acquire the released lock'
+            time.sleep(.2)
+
+            assert watchdog._thread.is_alive() , 'Expected the watchdog thread to survive the race'
+            assert otherLock.hasLock , 'Expected the waiter to keep the lock it took, but it was removed'
+            assert otherLock.release() , 'Expected to release lock'
+        finally:
+            watchdog.stop()
+
+    def test_raiseInHolder(self):
+        '''
+            test_raiseInHolder - Test that HoldBudgetExceeded is raised in the holder's thread
+        '''
+        lockName = self.lockPrefix + 'test_Watchdog_raise'
+
+        watchdog = NamedAtomicLock.HoldWatchdog()
+        results = []
+
+        def holder():
+            lock = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir)
+            assert lock.acquire(timeout=1) , 'Expected to acquire lock'
+            try:
+                watchdog.watch(lock, .2, raiseInHolder=True)
+                endTime = time.time() + 3
+                while time.time() < endTime:
+                    time.sleep(.01)
+                results.append('finished')
+            except NamedAtomicLock.HoldBudgetExceeded:
+                results.append('raised')
+            finally:
+                lock.release()
+
+        try:
+            holderThread = threading.Thread(target=holder)
+            holderThread.start()
+            holderThread.join(5)
+
+            assert results == ['raised'] , 'Expected HoldBudgetExceeded in the holder thread, but got: %s' %(repr(results), )
+        finally:
+            watchdog.stop()
+
+    def test_releasedDuringCallback(self):
+        '''
+            test_releasedDuringCallback - Test that a holder which releases while the callback runs does not get HoldBudgetExceeded later
+        '''
+        lockName = self.lockPrefix + 'test_Watchdog_releasedDuringCallback'
+
+        watchdog = NamedAtomicLock.HoldWatchdog()
+        results = []
+        inCallback = threading.Event()
+
+        def slowCallback(lockObj, holdTime):
+            inCallback.set()
+            time.sleep(.3)
+
+        def holder():
+            lock = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir)
+            assert lock.acquire(timeout=1) , 'Expected to acquire lock'
+            try:
+                watchdog.watch(lock, .1, callback=slowCallback, raiseInHolder=True)
+                inCallback.wait(2)
+                lock.release()
+
+                # Unrelated work, after the lock is released
+                endTime = time.time() + .6
+                while time.time() < endTime:
+                    time.sleep(.01)
+                results.append('finished')
+            except NamedAtomicLock.HoldBudgetExceeded:
+                results.append('raised')
+
+        try:
+            holderThread = threading.Thread(target=holder)
+            holderThread.start()
+            holderThread.join(5)
+
+            assert results == ['finished'] , 'Expected no HoldBudgetExceeded after the holder released, but got: %s' %(repr(results), )
+        finally:
+            watchdog.stop()
+
+    def test_releaseError(self):
+        '''
+            test_releaseError - Test that an error in autoRelease does not stop the watchdog watching other locks
+        '''
+        lockName = self.lockPrefix + 'test_Watchdog_releaseError'
+
+        class FailingHooks(NamedAtomicLock.LockHooks):
+            def onRelease(self, lockObj, timestamp, holdTime):
+                raise IOError('Hook failed')
+
+        watchdog = NamedAtomicLock.HoldWatchdog()
+        try:
+            failingLock = NamedAtomicLock.NamedAtomicLock(lockName + '_failing', lockDir=self.lockDir, hooks=FailingHooks())
+            lock = NamedAtomicLock.NamedAtomicLock(lockName, lockDir=self.lockDir)
+
+            assert failingLock.acquire(timeout=1) , 'Expected to acquire lock'
+            watchdog.watch(failingLock, .1, autoRelease=True)
+
+            time.sleep(.3)
+            assert watchdog._thread.is_alive() , 'Expected the watchdog thread to survive an error releasing a lock'
+
+            assert lock.acquire(timeout=1) , 'Expected to acquire lock'
+            watchdog.watch(lock, .1, autoRelease=True)
+
+            time.sleep(.3)
+            assert not lock.isHeld , 'Expected the watchdog to still release locks after an earlier error'
+        finally:
+            watchdog.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(subprocess.Popen('GoodTests.py -n1 "%s" %s' %(sys.argv[0], ' '.join(['"%s"' %(arg.replace('"', '\\"'), ) for arg in sys.argv[1:]]) ), shell=True).wait())
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+'''
+    chaosHarness.py - Stress harness which repeatedly SIGKILLs lock holders, to measure how each configuration recovers.
+
+      Several worker processes loop acquiring a NamedAtomicLock, holding it for a random time, and releasing it.
+      Meanwhile, a controller kills workers at random points in that cycle ( mostly the current holder ) and starts replacements.
+
+      For each configuration, reports:
+
+        * Time to reacquire - from when a holder was killed, to when another worker acquired the lock
+        * Mutual exclusion violations - times a worker acquired the lock while a live worker still held it
+            ( e.g. a hold ran past maxLockAge without a heartbeat, and the lock was taken over )
+
+      Every worker appends ACQ/REL events to a shared log ( opened O_APPEND, so lines are not interleaved ) right after acquiring
+        and right before releasing, and the controller appends KILL events. The log is replayed afterwards to compute the results.
+
+      This is not part of the unit tests ( it runs for minutes, and its results are measurements rather than pass/fail ).
+
+      Usage: ./chaosHarness.py [options]   ( see --help )
+'''
+
+import argparse
+import os
+import random
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import NamedAtomicLock
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    import NamedAtomicLock
+
+# Same clock across processes on Linux ( CLOCK_MONOTONIC is system-wide )
+_monotonic = getattr(time, 'monotonic', time.time)
+
+LOCK_NAME = 'chaosHarness'
+
+EVENT_LOG_NAME = 'events.log'
+
+
+class ChaosConfig(object):
+    '''
+        ChaosConfig - One configuration to run the harness against
+    '''
+
+    def __init__(self, label, maxLockAge, heartbeat=False, useFilesystemClock=False, shardLevels=0, fastestLockDir=False):
+        '''
+            @param label <str> - Name shown in the results
+
+            @param maxLockAge <float> - maxLockAge for the lock
+
+            @param heartbeat <bool> default False - If True, holders call refresh every maxLockAge / 3 seconds while holding
+
+            @param useFilesystemClock <bool> default False - Passed to NamedAtomicLock
+
+            @param shardLevels <int> default 0 - Passed to NamedAtomicLock
+
+            @param fastestLockDir <bool> default False - If True, put the lock in getFastestLockDir() ( tmpfs, where available )
+                instead of the system temp directory
+        '''
+        self.label = label
+        self.maxLockAge = maxLockAge
+        self.heartbeat = heartbeat
+        self.useFilesystemClock = useFilesystemClock
+        self.shardLevels = shardLevels
+        self.fastestLockDir = fastestLockDir
+
+
+def _appendEvent(logFd, *fields):
+    '''
+        _appendEvent - Append one event line to the shared log
+    '''
+    os.write(logFd, (' '.join([str(field) for field in fields]) + '\n').encode('ascii'))
+
+
+def _heartbeat(lockObj, interval, stopEvent):
+    '''
+        _heartbeat - Refresh @lockObj every @interval seconds until @stopEvent is set
+    '''
+    while not stopEvent.wait(interval):
+        lockObj.refresh()
+
+
+def runWorker(config, lockDir, logPath, maxHoldTime):
+    '''
+        runWorker - Body of a worker process. Loops acquiring, holding, and releasing the lock until killed.
+    '''
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    random.seed()
+
+    logFd = os.open(logPath, os.O_WRONLY | os.O_APPEND)
+    myPid = os.getpid()
+
+    lockObj = NamedAtomicLock.NamedAtomicLock(LOCK_NAME, lockDir=lockDir, maxLockAge=config.maxLockAge, shardLevels=config.shardLevels, useFilesystemClock=config.useFilesystemClock)
+
+    while True:
+        lockObj.acquire()
+        _appendEvent(logFd, 'ACQ', myPid, '%.6f' %(_monotonic(), ))
+
+        stopEvent = None
+        if config.heartbeat is True:
+            stopEvent = threading.Event()
+            heartbeatThread = threading.Thread(target=_heartbeat, args=(lockObj, config.maxLockAge / 3.0, stopEvent))
+            heartbeatThread.daemon = True
+            heartbeatThread.start()
+
+        time.sleep(random.uniform(0, maxHoldTime))
+
+        if stopEvent is not None:
+            stopEvent.set()
+            heartbeatThread.join()
+
+        _appendEvent(logFd, 'REL', myPid, '%.6f' %(_monotonic(), ))
+        lockObj.release()
+
+        # Give the waiters a chance
+        time.sleep(random.uniform(0, maxHoldTime / 10.0))
+
+
+def startWorker(config, lockDir, logPath, maxHoldTime):
+    '''
+        startWorker - Fork a worker process
+
+        @return <int> - pid of the worker
+    '''
+    pid = os.fork()
+    if pid == 0:
+        try:
+            runWorker(config, lockDir, logPath, maxHoldTime)
+        finally:
+            os._exit(0)
+
+    return pid
+
+
+class _LogFollower(object):
+    '''
+        _LogFollower - Follow the event log as it grows, tracking which worker currently holds the lock
+    '''
+
+    def __init__(self, logPath):
+        self.logFile = open(logPath, 'r')
+        self.partial = ''
+        self.currentHolder = None
+
+    def update(self):
+        data = self.partial + self.logFile.read()
+        lines = data.split('\n')
+        self.partial = lines.pop()
+
+        for line in lines:
+            fields = line.split()
+            if len(fields) != 3:
+                continue
+
+            if fields[0] == 'ACQ':
+                self.currentHolder = int(fields[1])
+            elif fields[0] in ('REL', 'KILL') and self.currentHolder == int(fields[1]):
+                self.currentHolder = None
+
+    def close(self):
+        self.logFile.close()
+
+
+def analyzeLog(logPath):
+    '''
+        analyzeLog - Replay the event log
+
+        @return dict - 'acquisitions' <int>, 'violations' <int>, 'holderKills' <int>, 'otherKills' <int>,
+            'reacquireTimes' <list<float>> ( seconds from each holder kill to the next acquisition )
+    '''
+    results = { 'acquisitions' : 0, 'violations' : 0, 'holderKills' : 0, 'otherKills' : 0, 'reacquireTimes' : [] }
+
+    currentHolder = None
+    killedHolderAt = None
+
+    with open(logPath, 'r') as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) != 3:
+                # Only the last line can be partial, if a worker was killed mid-write
+                continue
+
+            (event, pid, when) = (fields[0], int(fields[1]), float(fields[2]))
+
+            if event == 'ACQ':
+                results['acquisitions'] += 1
+                if currentHolder is not None:
+                    results['violations'] += 1
+                currentHolder = pid
+
+                if killedHolderAt is not None:
+                    results['reacquireTimes'].append(when - killedHolderAt)
+                    killedHolderAt = None
+
+            elif event == 'REL':
+                if currentHolder == pid:
+                    currentHolder = None
+
+            elif event == 'KILL':
+                if currentHolder == pid:
+                    results['holderKills'] += 1
+                    currentHolder = None
+                    killedHolderAt = when
+                else:
+                    results['otherKills'] += 1
+
+    return results
+
+
+def runConfig(config, numWorkers, duration, maxHoldTime, killInterval, holderKillChance):
+    '''
+        runConfig - Run the harness for one configuration
+
+        @return dict - see analyzeLog
+    '''
+    workDir = tempfile.mkdtemp(prefix='NamedAtomicLockChaos_')
+    if config.fastestLockDir is True:
+        lockDir = tempfile.mkdtemp(prefix='NamedAtomicLockChaos_', dir=NamedAtomicLock.getFastestLockDir())
+    else:
+        lockDir = os.path.join(workDir, 'locks')
+        os.mkdir(lockDir)
+
+    logPath = os.path.join(workDir, EVENT_LOG_NAME)
+    logFd = os.open(logPath, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    workers = [ startWorker(config, lockDir, logPath, maxHoldTime) for i in range(numWorkers) ]
+
+    follower = _LogFollower(logPath)
+    try:
+        endTime = _monotonic() + duration
+        while _monotonic() < endTime:
+            time.sleep(random.uniform(0, killInterval * 2))
+
+            follower.update()
+            if follower.currentHolder in workers and random.random() < holderKillChance:
+                victim = follower.currentHolder
+            else:
+                victim = random.choice(workers)
+
+            os.kill(victim, signal.SIGKILL)
+            os.waitpid(victim, 0)
+            _appendEvent(logFd, 'KILL', victim, '%.6f' %(_monotonic(), ))
+
+            workers.remove(victim)
+            workers.append(startWorker(config, lockDir, logPath, maxHoldTime))
+
+        # Let the last kill recover before stopping
+        time.sleep(config.maxLockAge + maxHoldTime)
+    finally:
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+        follower.close()
+        os.close(logFd)
+
+    try:
+        return analyzeLog(logPath)
+    finally:
+        shutil.rmtree(workDir, ignore_errors=True)
+        shutil.rmtree(lockDir, ignore_errors=True)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def getDefaultConfigs(maxLockAges):
+    '''
+        getDefaultConfigs - Every maxLockAge with and without a heartbeat, plus the filesystem clock,
+          sharded, and tmpfs variants at the first maxLockAge
+    '''
+    configs = []
+    for maxLockAge in maxLockAges:
+        configs.append( ChaosConfig('maxLockAge=%g' %(maxLockAge, ), maxLockAge) )
+        configs.append( ChaosConfig('maxLockAge=%g heartbeat' %(maxLockAge, ), maxLockAge, heartbeat=True) )
+
+    maxLockAge = maxLockAges[0]
+    configs.append( ChaosConfig('maxLockAge=%g heartbeat filesystemClock' %(maxLockAge, ), maxLockAge, heartbeat=True, useFilesystemClock=True) )
+    configs.append( ChaosConfig('maxLockAge=%g heartbeat shardLevels=1' %(maxLockAge, ), maxLockAge, heartbeat=True, shardLevels=1) )
+    configs.append( ChaosConfig('maxLockAge=%g heartbeat fastestLockDir' %(maxLockAge, ), maxLockAge, heartbeat=True, fastestLockDir=True) )
+
+    return configs
+
+
+def main(args):
+
+    parser = argparse.ArgumentParser(description='SIGKILL NamedAtomicLock holders at random, and measure recovery time and mutual exclusion violations per configuration.')
+    parser.add_argument('--maxLockAge', type=float, action='append', help='maxLockAge to test ( may be given more than once ). Default: .5 and 2')
+    parser.add_argument('--workers', type=int, default=4, help='Number of worker processes. Default: 4')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds to run each configuration. Default: 20')
+    parser.add_argument('--maxHoldTime', type=float, default=1.0, help='Workers hold the lock for a random time up to this many seconds. Default: 1')
+    parser.add_argument('--killInterval', type=float, default=1.0, help='Average seconds between kills. Default: 1')
+    parser.add_argument('--holderKillChance', type=float, default=.75, help='Chance each kill targets the current holder rather than a random worker. Default: .75')
+
+    options = parser.parse_args(args)
+
+    configs = getDefaultConfigs(options.maxLockAge or [.5, 2.0])
+
+    print ( 'workers=%d duration=%gs maxHoldTime=%gs killInterval=%gs\n' %(options.workers, options.duration, options.maxHoldTime, options.killInterval) )
+    print ( '%-45s %6s %6s %6s %6s   %s' %('config', 'acq', 'viol', 'hkill', 'okill', 'reacquire seconds min / median / p95 / max') )
+
+    for config in configs:
+        results = runConfig(config, options.workers, options.duration, options.maxHoldTime, options.killInterval, options.holderKillChance)
+
+        reacquireTimes = results['reacquireTimes']
+        if reacquireTimes:
+            reacquireStr = '%.3f / %.3f / %.3f / %.3f' %(min(reacquireTimes), _percentile(reacquireTimes, .5), _percentile(reacquireTimes, .95), max(reacquireTimes))
+        else:
+            reacquireStr = '-'
+
+        print ( '%-45s %6d %6d %6d %6d   %s' %(config.label, results['acquisitions'], results['violations'], results['holderKills'], results['otherKills'], reacquireStr) )
+        sys.stdout.flush()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))